@@ -0,0 +1,282 @@
+"""
+This module contains the asynchronous (ASGI) front end of the route search, next to the Flask app.
+A request of the Flask app holds a thread while it waits for Nominatim and OSRM. Here the waiting
+is done on one event loop: the two addresses of a request are geocoded at the same time, the OSRM
+geometry is fetched while the search runs, and all of it goes through one async HTTP client with
+pooled keep-alive connections, so one process can have hundreds of requests in flight.
+The search itself (pure Python) runs on a thread pool, or on the route worker processes when
+ROUTE_PROCESSES is set. The caches, rate limiter and road graph are the ones of shortest_path.py.
+It needs the httpx package and an ASGI server, for example:
+
+    uvicorn asgi_app:app
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import shortest_path
+from geocache import normalize_address, MISSING
+from osrm import route_url, route_geometry
+from path_geometry import pathgeometry, PATH_FORMATS
+from route_executor import saturated, ALGORITHMS
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# pooled connections of the HTTP client, and threads that run the searches
+ASYNC_CONNECTIONS = int(os.environ.get('ASYNC_CONNECTIONS', '100'))
+ASYNC_SEARCH_THREADS = int(os.environ.get('ASYNC_SEARCH_THREADS', '4'))
+# largest request body that is read
+MAX_BODY_BYTES = 64 * 1024
+
+
+class routeapp:
+    """
+    ASGI application with one endpoint:
+        POST /api/route  {"start": address, "end": address, "algorithm": "ida_star",
+                          "format": "coordinates"}
+    the answer is {"start": [lat, lon], "end": [lat, lon], "distance": meters, the path in
+    the format ("path" and "segments", "polyline" and "segments" or "geojson"),
+    "geometry": [[lat, lon], ...]}, geometry is the OSRM route, null when OSRM failed.
+    client is an httpx.AsyncClient (or an object with the same async get()), made at startup
+    when not given. in_flight is the number of requests being answered.
+    """
+    def __init__(self, client=None, search_threads=ASYNC_SEARCH_THREADS,
+                 connections=ASYNC_CONNECTIONS):
+        self.client = client
+        self.search_threads = search_threads
+        self.connections = connections
+        self.in_flight = 0
+        self.search_pool = None
+        self._own_client = False
+        # normalized address -> task of its Nominatim call, requests for the same address share it
+        self._geocoding = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def startup(self):
+        """
+        make the HTTP client and the search threads, the server calls this before any request
+        """
+        if self.client is None:
+            if httpx is None:
+                raise ImportError("the ASGI app needs the httpx package (pip install httpx)")
+            limits = httpx.Limits(max_connections=self.connections,
+                                  max_keepalive_connections=self.connections)
+            # connection errors are tried again, like the retries of the OSRM client
+            self.client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(retries=3, limits=limits),
+                timeout=shortest_path.GEOCODE_TIMEOUT,
+                headers={'User-Agent': 'shortest_path_app'})
+            self._own_client = True
+        if self.search_pool is None:
+            self.search_pool = ThreadPoolExecutor(self.search_threads,
+                                                  thread_name_prefix='search')
+
+    async def shutdown(self):
+        """
+        close the connections and stop the search threads
+        """
+        if self._own_client:
+            await self.client.aclose()
+            self.client = None
+            self._own_client = False
+        if self.search_pool is not None:
+            self.search_pool.shutdown(wait=False)
+            self.search_pool = None
+
+    async def route(self, start_address, end_address, algorithm='ida_star',
+                    path_format='coordinates'):
+        """
+        (HTTP status, JSON answer) of a route between two addresses,
+        the path in path_format (see path_geometry.pathgeometry.output())
+        """
+        with shortest_path.stage_seconds.time('geocode'):
+            start, end = await self.geocode_many([start_address, end_address])
+        if start is None or end is None:
+            shortest_path.route_requests.inc('geocoding_failed')
+            return 404, {'error': "Unable to find coordinates for addresses."}
+
+        # the OSRM call waits while the search runs
+        loop = asyncio.get_running_loop()
+        search = loop.run_in_executor(self.search_pool, shortest_path.find_route, start, end,
+                                      algorithm)
+        geometry = asyncio.ensure_future(self.osrm_route(start, end))
+        try:
+            path, distance = await search
+        except saturated:
+            geometry.cancel()
+            return 503, {'error': "Too many route searches at the moment, please try again."}
+        except TimeoutError:
+            geometry.cancel()
+            return 504, {'error': "The route search took too long."}
+        if path is None:
+            geometry.cancel()
+            shortest_path.route_requests.inc('no_path')
+            return 404, {'error': "Unable to find a path."}
+        shortest_path.route_requests.inc('ok')
+        answer = {'start': start, 'end': end, 'distance': distance}
+        answer.update(pathgeometry(path).output(path_format))
+        answer['geometry'] = await geometry
+        return 200, answer
+
+    async def geocode_many(self, addresses, timeout=None):
+        """
+        coordinates of the addresses, geocoded at the same time. None for an address that
+        failed or was not ready within timeout seconds (GEOCODE_TIMEOUT by default)
+        """
+        if timeout is None:
+            timeout = shortest_path.GEOCODE_TIMEOUT
+        tasks = [asyncio.ensure_future(self.geocode(address)) for address in addresses]
+        _, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        return [None if task in not_done else task.result() for task in tasks]
+
+    async def geocode(self, address):
+        """
+        coordinates of an address from the geocoding cache or Nominatim, None if it failed
+        """
+        key = normalize_address(address)
+        coordinates = shortest_path.geocode_cache.get(key)
+        if coordinates is not MISSING:
+            return coordinates
+        task = self._geocoding.get(key)
+        if task is None:
+            task = self._geocoding[key] = asyncio.ensure_future(self._nominatim(key, address))
+            task.add_done_callback(lambda done: self._geocoded(key, done))
+        try:
+            # a waiter that gives up does not cancel the call the others wait for
+            return await asyncio.shield(task)
+        except Exception as ex:
+            # logged and counted like the geocoding of the Flask app
+            shortest_path.external_errors.inc('nominatim')
+            shortest_path.app.logger.warning("Geocoding failed for address %r: %s", address, ex)
+            return None
+
+    async def osrm_route(self, start, end):
+        """
+        OSRM route geometry, from the cache of the OSRM client when it is there.
+        None if OSRM failed
+        """
+        osrm_client = shortest_path.osrm_client
+        coordinates = osrm_client.cached(start, end)
+        if coordinates is not None:
+            return coordinates
+        try:
+            with shortest_path.stage_seconds.time('osrm'):
+                response = await self.client.get(route_url(osrm_client.base_url, start, end),
+                                                 timeout=osrm_client.timeout)
+                coordinates = route_geometry(response.json())
+        except Exception as ex:
+            shortest_path.external_errors.inc('osrm')
+            shortest_path.app.logger.warning("OSRM route failed: %s", ex)
+            return None
+        osrm_client.remember(start, end, coordinates)
+        return coordinates
+
+    async def _nominatim(self, key, address):
+        # the same rate limit as the Flask app, waited without blocking the loop
+        await asyncio.sleep(shortest_path.geocode_limiter.reserve())
+        response = await self.client.get(shortest_path.GEOCODE_API_URL,
+                                         params={'q': address, 'format': 'json', 'limit': 1})
+        response.raise_for_status()
+        results = response.json()
+        coordinates = (float(results[0]['lat']), float(results[0]['lon'])) if results else None
+        shortest_path.geocode_cache.put(key, coordinates)
+        return coordinates
+
+    def _geocoded(self, key, task):
+        if self._geocoding.get(key) is task:
+            del self._geocoding[key]
+        # every waiter may have given up, the error is logged by geocode() otherwise
+        if not task.cancelled():
+            task.exception()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as ex:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(ex)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        if scope['path'] != '/api/route':
+            await _send_json(send, 404, {'error': "Not found."})
+            return
+        if scope['method'] != 'POST':
+            await _send_json(send, 405, {'error': "Use POST."}, [(b'allow', b'POST')])
+            return
+        if self.client is None or self.search_pool is None:
+            # servers without lifespan events
+            await self.startup()
+
+        body = await _read_body(receive)
+        try:
+            if body is None:
+                raise ValueError("the body is too large")
+            data = json.loads(body)
+            start_address = data['start']
+            end_address = data['end']
+            algorithm = data.get('algorithm', 'ida_star')
+            if not isinstance(start_address, str) or not isinstance(end_address, str) \
+                    or not start_address or not end_address:
+                raise ValueError("start and end must be addresses")
+            if algorithm not in ALGORITHMS:
+                raise ValueError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+            path_format = data.get('format', 'coordinates')
+            if path_format not in PATH_FORMATS:
+                raise ValueError(f"format must be one of {', '.join(PATH_FORMATS)}")
+        except (ValueError, KeyError, TypeError, AttributeError) as ex:
+            shortest_path.route_requests.inc('missing_address')
+            await _send_json(send, 400, {'error': str(ex)})
+            return
+
+        self.in_flight += 1
+        try:
+            status, answer = await self.route(start_address, end_address, algorithm,
+                                              path_format)
+        finally:
+            self.in_flight -= 1
+        headers = [(b'retry-after', b'1')] if status == 503 else []
+        await _send_json(send, status, answer, headers)
+
+
+async def _read_body(receive):
+    # the whole request body, None if it is larger than MAX_BODY_BYTES
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get('more_body', False):
+            return body
+
+
+async def _send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode('ascii'))] + list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# the application for the ASGI server
+app = routeapp()
@@ -0,0 +1,519 @@
+"""
+This module is not part of the program, but for checking performance.
+It runs the algorithms on generated graphs, so no network access is needed.
+Run "python benchmark.py graph" to compare the networkx graph with the csrgraph,
+"python benchmark.py heap" to compare the priority queues,
+"python benchmark.py ch" for the contraction hierarchy preprocessing and queries,
+and "python benchmark.py alt" for the landmark heuristic.
+"python benchmark.py suite" runs every engine on grid and random geometric graphs of 1k to 1M
+nodes (fixed seeds, so every run measures the same queries) and writes a JSON and a table
+report, "python benchmark.py report old.json new.json" compares two of them.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import networkx
+import numpy
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra, binaryheap, daryheap
+from ida_star import ida_star
+from contraction import contract, ch_query
+from landmarks import select_landmarks
+from search_stats import searchstats
+
+# graph sizes of the suite, in nodes
+SUITE_SIZES = (1000, 10000, 100000, 1000000)
+SUITE_KINDS = ('grid', 'geometric')
+# nodes of a random geometric graph per unit square, nodes closer than one unit are joined,
+# so a node has about pi * GEOMETRIC_DENSITY neighbors
+GEOMETRIC_DENSITY = 2
+# edges of a geometric graph are this much longer than the straight line at most
+GEOMETRIC_DETOUR = 1.3
+# nodes per batch when joining geometric graph nodes
+GEOMETRIC_BATCH = 65536
+
+
+def grid_graph(side, seed=1):
+    """
+    side x side grid of nodes labelled by (row, column), with random edge weights.
+    the 'pos' attribute is a made up (lat, lon) around Helsinki, 0.001 degrees apart.
+    """
+    rng = random.Random(seed)
+    graph = networkx.Graph()
+    for row in range(side):
+        for column in range(side):
+            graph.add_node((row, column), pos=(60.0 + row * 0.001, 24.0 + column * 0.001))
+    for row in range(side):
+        for column in range(side):
+            if row + 1 < side:
+                graph.add_edge((row, column), (row + 1, column), weight=rng.uniform(1, 2))
+            if column + 1 < side:
+                graph.add_edge((row, column), (row, column + 1), weight=rng.uniform(1, 2))
+    return graph
+
+
+def query_pairs(graph, count, seed=1):
+    """
+    random (start, end) node pairs
+    """
+    rng = random.Random(seed)
+    nodes = list(graph.nodes) if isinstance(graph, networkx.Graph) else list(graph.labels)
+    return [(rng.choice(nodes), rng.choice(nodes)) for _ in range(count)]
+
+
+def time_queries(algorithm, graph, pairs, repeat=3):
+    """
+    best total time (seconds) of running the algorithm on all pairs, out of repeat runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for start, end in pairs:
+            algorithm(graph, start, end)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def build_memory(builder, *args):
+    """
+    returns the built object and the memory (bytes) allocated while building it
+    """
+    tracemalloc.start()
+    result = builder(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def benchmark_graphs(side=100, queries=50, ida_side=30, ida_queries=20):
+    """
+    compare dijkstra() and ida_star() on the networkx graph and on the csrgraph
+    """
+    nx_graph, nx_bytes = build_memory(grid_graph, side)
+    csr, csr_bytes = build_memory(csrgraph.from_networkx, nx_graph)
+    print(f"grid {side}x{side}: {len(csr)} nodes, {csr.edge_count()} directed edges")
+    print(f"memory: networkx {nx_bytes / 1e6:.1f} MB, csrgraph {csr_bytes / 1e6:.1f} MB")
+
+    pairs = query_pairs(nx_graph, queries)
+    nx_time = time_queries(dijkstra, nx_graph, pairs)
+    csr_time = time_queries(dijkstra, csr, pairs)
+    print(f"dijkstra, {queries} queries: networkx {nx_time * 1000:.1f} ms, "
+          f"csrgraph {csr_time * 1000:.1f} ms, speedup {nx_time / csr_time:.2f}x")
+    both_time = time_queries(bidirectional_dijkstra, csr, pairs)
+    print(f"bidirectional_dijkstra, {queries} queries: csrgraph {both_time * 1000:.1f} ms")
+
+    # IDA* is exponential on large graphs, so it gets a small grid
+    small = grid_graph(ida_side)
+    small_csr = csrgraph.from_networkx(small)
+    pairs = query_pairs(small, ida_queries)
+    nx_time = time_queries(ida_star, small, pairs)
+    csr_time = time_queries(ida_star, small_csr, pairs)
+    print(f"ida_star, {ida_queries} queries on {ida_side}x{ida_side}: "
+          f"networkx {nx_time * 1000:.1f} ms, csrgraph {csr_time * 1000:.1f} ms, "
+          f"speedup {nx_time / csr_time:.2f}x")
+
+
+def heap_operations(make_heap, count, seed=1):
+    """
+    times count pushes, count // 2 decrease-keys and count pops on a new heap.
+    returns the operations per second of each kind
+    """
+    rng = random.Random(seed)
+    keys = [rng.random() for _ in range(count)]
+    decreased = rng.sample(range(count), count // 2)
+    heap = make_heap()
+
+    started = time.perf_counter()
+    for node in range(count):
+        heap.push(node, keys[node])
+    push_time = time.perf_counter() - started
+
+    # decrease-keys before any pop, the only order the old binaryheap.update() handles
+    started = time.perf_counter()
+    for node in decreased:
+        keys[node] /= 2
+        heap.update(node, keys[node])
+    update_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    while not heap.is_empty():
+        heap.pop()
+    pop_time = time.perf_counter() - started
+
+    return count / push_time, len(decreased) / update_time, count / pop_time
+
+
+def benchmark_heaps(count=200000):
+    """
+    compare binaryheap with daryheap of arity 2, 4 and 8
+    """
+    heaps = [
+        ("binaryheap", binaryheap),
+        ("daryheap(2)", lambda: daryheap(2)),
+        ("daryheap(4)", lambda: daryheap(4)),
+        ("daryheap(8)", lambda: daryheap(8)),
+        ("daryheap(4, capacity)", lambda: daryheap(4, capacity=count)),
+    ]
+    print(f"{count} nodes, operations per second")
+    print(f"{'heap':<24}{'push':>12}{'decrease-key':>14}{'pop':>12}")
+    for name, make_heap in heaps:
+        pushes, updates, pops = heap_operations(make_heap, count)
+        print(f"{name:<24}{pushes:>12,.0f}{updates:>14,.0f}{pops:>12,.0f}")
+
+
+def benchmark_contraction(side=60, queries=200):
+    """
+    contraction hierarchy preprocessing, and its queries against dijkstra()
+    """
+    csr = csrgraph.from_networkx(grid_graph(side))
+    hierarchy = contract(csr)
+    print(f"grid {side}x{side}: preprocessing {hierarchy.preprocessing_time:.2f} s, "
+          f"{hierarchy.shortcut_count} shortcuts for {csr.edge_count()} directed edges")
+
+    pairs = query_pairs(csr, queries)
+    dijkstra_time = time_queries(dijkstra, csr, pairs)
+    ch_time = time_queries(ch_query, hierarchy, pairs)
+    print(f"{queries} queries: dijkstra {dijkstra_time * 1000:.1f} ms, "
+          f"ch_query {ch_time * 1000:.1f} ms, speedup {dijkstra_time / ch_time:.2f}x")
+
+
+def benchmark_landmarks(side=100, queries=50, count=8):
+    """
+    dijkstra() against A* with the landmark heuristic: time and nodes reached
+    """
+    csr = csrgraph.from_networkx(grid_graph(side))
+    started = time.perf_counter()
+    landmarks = select_landmarks(csr, count)
+    print(f"grid {side}x{side}: {count} landmarks selected in "
+          f"{time.perf_counter() - started:.2f} s")
+
+    pairs = query_pairs(csr, queries)
+    for name, heuristic_function in (("dijkstra", None), ("A* + landmarks", landmarks)):
+        reached = 0
+        started = time.perf_counter()
+        for start, end in pairs:
+            result = dijkstra(csr, start, end, heuristic_function)
+            if result:
+                reached += len(result[1])
+        elapsed = time.perf_counter() - started
+        print(f"{name:<16} {elapsed * 1000:8.1f} ms, "
+              f"{reached / queries:8.0f} nodes reached per query")
+
+
+def grid_arrays(count, seed=1):
+    """
+    csrgraph of about count nodes in a square grid, node (row, column) has id
+    row * side + column and position (row, column), edge weights are random between 1 and 2
+    (never shorter than the straight line, so the IDA* estimate stays a lower bound)
+    """
+    rng = numpy.random.default_rng(seed)
+    side = max(2, int(round(count ** 0.5)))
+    ids = numpy.arange(side * side, dtype=numpy.int64).reshape(side, side)
+    sources = numpy.concatenate((ids[:-1, :].ravel(), ids[:, :-1].ravel()))
+    targets = numpy.concatenate((ids[1:, :].ravel(), ids[:, 1:].ravel()))
+    weights = rng.uniform(1, 2, len(sources))
+    rows, columns = numpy.divmod(numpy.arange(side * side), side)
+    return csrgraph.from_arrays(list(range(side * side)), numpy.concatenate((sources, targets)),
+                                numpy.concatenate((targets, sources)),
+                                numpy.concatenate((weights, weights)),
+                                rows.astype(numpy.float64), columns.astype(numpy.float64),
+                                directed=False)
+
+
+def geometric_arrays(count, seed=1):
+    """
+    csrgraph of a random geometric graph: count nodes at random positions in a square,
+    joined when closer than one unit. an edge is up to GEOMETRIC_DETOUR times longer than
+    the straight line, like a road
+    """
+    rng = numpy.random.default_rng(seed)
+    side = max(1, int(round((count / GEOMETRIC_DENSITY) ** 0.5)))
+    points = rng.random((count, 2)) * side
+    # the nodes of each unit cell, -1 fills the rows of the table
+    cells = numpy.minimum(points.astype(numpy.int64), side - 1)
+    cell_ids = cells[:, 0] * side + cells[:, 1]
+    order = numpy.argsort(cell_ids, kind='stable')
+    counts = numpy.bincount(cell_ids, minlength=side * side)
+    starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    table = numpy.full((side * side, max(1, counts.max())), -1, dtype=numpy.int64)
+    table[cell_ids[order], numpy.arange(count) - starts[cell_ids[order]]] = order
+
+    # nodes closer than one unit are in the same or a neighboring cell
+    steps = numpy.array([(row, column) for row in (-1, 0, 1) for column in (-1, 0, 1)])
+    sources, targets, lengths = [], [], []
+    for begin in range(0, count, GEOMETRIC_BATCH):
+        nodes = numpy.arange(begin, min(count, begin + GEOMETRIC_BATCH))
+        rows = cells[nodes, 0][:, None] + steps[:, 0]
+        columns = cells[nodes, 1][:, None] + steps[:, 1]
+        inside = (rows >= 0) & (rows < side) & (columns >= 0) & (columns < side)
+        candidates = table[numpy.where(inside, rows * side + columns, 0)]
+        candidates = numpy.where(inside[:, :, None], candidates, -1).reshape(len(nodes), -1)
+        offsets = points[candidates] - points[nodes][:, None, :]
+        distances = numpy.hypot(offsets[:, :, 0], offsets[:, :, 1])
+        # each pair once, from the smaller id
+        joined = (candidates > nodes[:, None]) & (distances < 1.0)
+        rows, columns = numpy.nonzero(joined)
+        sources.append(nodes[rows])
+        targets.append(candidates[rows, columns])
+        lengths.append(distances[rows, columns])
+    sources = numpy.concatenate(sources)
+    targets = numpy.concatenate(targets)
+    weights = numpy.concatenate(lengths) * rng.uniform(1, GEOMETRIC_DETOUR, len(sources))
+    return csrgraph.from_arrays(list(range(count)), numpy.concatenate((sources, targets)),
+                                numpy.concatenate((targets, sources)),
+                                numpy.concatenate((weights, weights)),
+                                points[:, 0], points[:, 1], directed=False)
+
+
+def path_length(graph, path):
+    """
+    sum of the edge weights along a path of csrgraph labels (the ids of the suite graphs)
+    """
+    length = 0.0
+    for u, v in zip(path, path[1:]):
+        length += min(weight for target, weight in graph.edges_from(u) if target == v)
+    return length
+
+
+def _prepare_none(graph):
+    return graph
+
+
+def _prepare_landmarks(graph):
+    return graph, select_landmarks(graph)
+
+
+def _run_path(result):
+    # dijkstra() returns (path, predecessors), or [] when there is no path
+    return result[0] if result else []
+
+
+def _query_dijkstra(graph, start, end, stats=None):
+    return _run_path(dijkstra(graph, start, end, stats=stats))
+
+
+def _query_bidirectional(graph, start, end, stats=None):
+    return _run_path(bidirectional_dijkstra(graph, start, end, stats=stats))
+
+
+def _query_ida_star(graph, start, end, stats=None):
+    return ida_star(graph, start, end, stats=stats)
+
+
+def _query_landmarks(prepared, start, end, stats=None):
+    return _run_path(dijkstra(prepared[0], start, end, prepared[1], stats=stats))
+
+
+def _query_contraction(hierarchy, start, end, stats=None):
+    return _run_path(ch_query(hierarchy, start, end, stats=stats))
+
+
+# name -> (preparation (graph -> what the query function gets), query function returning a
+# path, largest graph in nodes it runs on). IDA* and the contraction get smaller graphs only
+SUITE_ENGINES = {
+    'dijkstra': (_prepare_none, _query_dijkstra, None),
+    'bidirectional': (_prepare_none, _query_bidirectional, None),
+    'ida_star': (_prepare_none, _query_ida_star, 10000),
+    'alt': (_prepare_landmarks, _query_landmarks, 100000),
+    'ch': (contract, _query_contraction, 10000),
+}
+
+
+def measure_engine(name, graph, pairs, repeat=3):
+    """
+    one engine on one graph: the preparation, repeat timed runs of all query pairs
+    (perf_counter, the best time of each query counts), one run under tracemalloc for the
+    peak memory of a query and one that counts the work (search_stats). returns a dict of the
+    results, 'work' has the counters per query
+    """
+    prepare, query, _ = SUITE_ENGINES[name]
+    started = time.perf_counter()
+    prepared = prepare(graph)
+    prepare_seconds = time.perf_counter() - started
+
+    best = [float("inf")] * len(pairs)
+    paths = []
+    for _ in range(repeat):
+        paths = []
+        for i, (start, end) in enumerate(pairs):
+            started = time.perf_counter()
+            path = query(prepared, start, end)
+            best[i] = min(best[i], time.perf_counter() - started)
+            paths.append(path)
+
+    # tracing slows the queries down, so the memory is measured in a run of its own
+    peak = 0
+    tracemalloc.start()
+    for start, end in pairs:
+        tracemalloc.reset_peak()
+        query(prepared, start, end)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    # the counting is not free either, so it is not in the timed runs
+    stats = searchstats()
+    for start, end in pairs:
+        query(prepared, start, end, stats)
+
+    found = [path for path in paths if path]
+    return {
+        'engine': name,
+        'prepare_seconds': prepare_seconds,
+        'queries': len(pairs),
+        'repeat': repeat,
+        'found': len(found),
+        'total_length': sum(path_length(graph, path) for path in found),
+        'mean_seconds': statistics.fmean(best),
+        'median_seconds': statistics.median(best),
+        'p95_seconds': sorted(best)[min(len(best) - 1, int(0.95 * len(best)))],
+        'max_seconds': max(best),
+        'peak_bytes': peak,
+        'work': stats.per_search() if stats.searches else None,
+    }
+
+
+def benchmark_suite(sizes=SUITE_SIZES, kinds=SUITE_KINDS, engines=None, queries=20, repeat=3,
+                    seed=1, output=None):
+    """
+    run the engines on every kind and size of graph, print the table and
+    write the JSON and table reports to output (a file name without suffix) if given.
+    returns the report dict
+    """
+    builders = {'grid': grid_arrays, 'geometric': geometric_arrays}
+    engines = list(engines or SUITE_ENGINES)
+    report = {'environment': _environment(), 'seed': seed, 'results': []}
+    for kind in kinds:
+        for size in sizes:
+            tracemalloc.start()
+            started = time.perf_counter()
+            graph = builders[kind](size, seed)
+            build_seconds = time.perf_counter() - started
+            build_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            pairs = query_pairs(graph, queries, seed)
+            for name in engines:
+                largest = SUITE_ENGINES[name][2]
+                if largest is not None and len(graph) > largest:
+                    continue
+                result = {'graph': kind, 'nodes': len(graph), 'edges': graph.edge_count(),
+                          'build_seconds': build_seconds, 'build_peak_bytes': build_bytes,
+                          'graph_bytes': graph.nbytes()}
+                result.update(measure_engine(name, graph, pairs, repeat))
+                report['results'].append(result)
+                print(format_row(result), flush=True)
+    table = format_table(report['results'])
+    if output:
+        with open(output + '.json', 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        with open(output + '.txt', 'w', encoding='utf-8') as file:
+            file.write(table + '\n')
+        print(f"wrote {output}.json and {output}.txt")
+    return report
+
+
+TABLE_HEADER = (f"{'graph':<10}{'nodes':>9}{'engine':>15}{'prepare s':>11}{'found':>7}"
+                f"{'median ms':>11}{'p95 ms':>10}{'peak MB':>9}{'settled':>10}{'relaxed':>10}")
+
+
+def format_row(result):
+    """
+    one line of the table
+    """
+    return (f"{result['graph']:<10}{result['nodes']:>9}{result['engine']:>15}"
+            f"{result['prepare_seconds']:>11.2f}{result['found']:>3}/{result['queries']:<3}"
+            f"{result['median_seconds'] * 1000:>11.2f}{result['p95_seconds'] * 1000:>10.2f}"
+            f"{result['peak_bytes'] / 1e6:>9.2f}{_work(result, 'settled'):>10}"
+            f"{_work(result, 'relaxed'):>10}")
+
+
+def _work(result, name):
+    # a counter per query for the table, - when the engine does not count its work
+    work = result.get('work')
+    return '-' if not work else f"{work[name]:.0f}"
+
+
+def format_table(results):
+    """
+    the results as a text table
+    """
+    return '\n'.join([TABLE_HEADER] + [format_row(result) for result in results])
+
+
+def compare_reports(old_path, new_path):
+    """
+    median query time of two JSON reports side by side, for the runs that are in both
+    """
+    with open(old_path, encoding='utf-8') as file:
+        old = {(r['graph'], r['nodes'], r['engine']): r for r in json.load(file)['results']}
+    with open(new_path, encoding='utf-8') as file:
+        new = json.load(file)['results']
+    print(f"{'graph':<10}{'nodes':>9}{'engine':>15}{'old ms':>10}{'new ms':>10}{'speedup':>9}")
+    for result in new:
+        before = old.get((result['graph'], result['nodes'], result['engine']))
+        if before is None:
+            continue
+        old_ms = before['median_seconds'] * 1000
+        new_ms = result['median_seconds'] * 1000
+        print(f"{result['graph']:<10}{result['nodes']:>9}{result['engine']:>15}"
+              f"{old_ms:>10.2f}{new_ms:>10.2f}{old_ms / new_ms if new_ms else 0:>8.2f}x")
+
+
+def _environment():
+    # what the numbers depend on, so reports of different runs can be told apart
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine()}
+
+
+def suite_arguments(arguments):
+    """
+    options of "python benchmark.py suite"
+    """
+    parser = argparse.ArgumentParser(prog='benchmark.py suite')
+    parser.add_argument('--sizes', default=','.join(map(str, SUITE_SIZES)),
+                        help="graph sizes in nodes, comma separated")
+    parser.add_argument('--kinds', default=','.join(SUITE_KINDS),
+                        help="graph kinds: grid, geometric")
+    parser.add_argument('--engines', default=','.join(SUITE_ENGINES),
+                        help="engines: " + ', '.join(SUITE_ENGINES))
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=time.strftime('benchmark_%Y%m%d_%H%M%S'),
+                        help="report file name without .json/.txt")
+    options = parser.parse_args(arguments)
+    return {'sizes': [int(size) for size in options.sizes.split(',')],
+            'kinds': options.kinds.split(','), 'engines': options.engines.split(','),
+            'queries': options.queries, 'repeat': options.repeat, 'seed': options.seed,
+            'output': options.output}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'graph':
+        benchmark_graphs()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'heap':
+        benchmark_heaps()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'ch':
+        benchmark_contraction()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'alt':
+        benchmark_landmarks()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'suite':
+        print(TABLE_HEADER)
+        benchmark_suite(**suite_arguments(sys.argv[2:]))
+    elif len(sys.argv) == 4 and sys.argv[1] == 'report':
+        compare_reports(sys.argv[2], sys.argv[3])
+    else:
+        print("usage: python benchmark.py graph|heap|ch|alt|suite [options]|report old new")
@@ -0,0 +1,305 @@
+"""
+This module contains Contraction Hierarchies: an offline preprocessing step and a fast query.
+contract() orders the nodes by importance, removes them one by one and adds shortcut edges,
+so that shortest distances between the remaining nodes stay the same.
+ch_query() then runs a bidirectional Dijkstra that only goes up in the order,
+and unpacks the shortcuts back into the original nodes.
+"""
+import heapq
+import pickle
+import time
+import networkx
+from csr_graph import csrgraph
+from dijkstra import daryheap
+from search_stats import countedheap
+from search_workspace import workspace
+
+# witness searches stop after settling this many nodes, a missed witness only adds a shortcut
+DEFAULT_WITNESS_LIMIT = 50
+
+
+class contractionhierarchy:
+    """
+    result of contract(): the upward graphs of the query and the middle node of every shortcut.
+    rank[node id] is the contraction order, a higher rank is a more important node.
+    """
+    def __init__(self, labels, rank, upward, downward, middle,
+                 preprocessing_time, shortcut_count):
+        self.labels = labels
+        self.index = {label: node_id for node_id, label in enumerate(labels)}
+        self.rank = rank
+        # upward[u]: edges u -> w with rank[w] > rank[u], for the forward search
+        self.upward = upward
+        # downward[w]: edges u -> w with rank[u] > rank[w], reversed, for the backward search
+        self.downward = downward
+        # (u, w) -> node v, when the edge u -> w is the shortcut u -> v -> w
+        self.middle = middle
+        self.preprocessing_time = preprocessing_time
+        self.shortcut_count = shortcut_count
+
+    def save(self, file_path):
+        """
+        write the hierarchy to a file
+        """
+        with open(file_path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        read a hierarchy written by save()
+        """
+        with open(file_path, 'rb') as file:
+            hierarchy = pickle.load(file)
+        if not isinstance(hierarchy, cls):
+            raise ValueError(f"{file_path} does not contain a contraction hierarchy")
+        return hierarchy
+
+
+def contract(graph, witness_limit=DEFAULT_WITNESS_LIMIT):
+    """
+    build the contraction hierarchy of a networkx graph or csrgraph
+    """
+    started = time.perf_counter()
+    if isinstance(graph, networkx.Graph):
+        graph = csrgraph.from_networkx(graph)
+    node_count = len(graph)
+
+    # the remaining graph, kept as dicts because contraction adds and removes edges
+    out_edges = [{} for _ in range(node_count)]
+    in_edges = [{} for _ in range(node_count)]
+    for node in range(node_count):
+        for neighbor, weight in graph.edges_from(node):
+            if neighbor != node and weight < out_edges[node].get(neighbor, float("inf")):
+                out_edges[node][neighbor] = weight
+                in_edges[neighbor][node] = weight
+    # every edge ever added, original and shortcut, with the best weight
+    all_edges = {(u, w): weight for u in range(node_count) for w, weight in out_edges[u].items()}
+
+    contracted = [False] * node_count
+    contracted_neighbors = [0] * node_count
+    rank = [0] * node_count
+    middle = {}
+
+    def priority(node):
+        shortcuts = _shortcuts(node, out_edges, in_edges, contracted, witness_limit)
+        edge_difference = len(shortcuts) - len(out_edges[node]) - len(in_edges[node])
+        return edge_difference + contracted_neighbors[node]
+
+    queue = daryheap(capacity=node_count)
+    for node in range(node_count):
+        queue.push(node, priority(node))
+
+    order = 0
+    while not queue.is_empty():
+        _, node = queue.pop()
+        # lazy update: the priority may be old, put the node back if it is no longer the smallest
+        current = priority(node)
+        if not queue.is_empty() and current > queue.peek()[0]:
+            queue.push(node, current)
+            continue
+
+        for u, w, weight in _shortcuts(node, out_edges, in_edges, contracted, witness_limit):
+            if weight < out_edges[u].get(w, float("inf")):
+                out_edges[u][w] = weight
+                in_edges[w][u] = weight
+            if weight < all_edges.get((u, w), float("inf")):
+                all_edges[(u, w)] = weight
+                middle[(u, w)] = node
+
+        contracted[node] = True
+        rank[node] = order
+        order += 1
+        neighbors = set(out_edges[node]) | set(in_edges[node])
+        for neighbor in out_edges[node]:
+            del in_edges[neighbor][node]
+        for neighbor in in_edges[node]:
+            del out_edges[neighbor][node]
+        out_edges[node] = {}
+        in_edges[node] = {}
+        # the neighbors' priorities are not recomputed here, the lazy update above catches them
+        # when they come out of the queue, which is much cheaper than a witness search each
+        for neighbor in neighbors:
+            contracted_neighbors[neighbor] += 1
+
+    # split the edges by direction in the order
+    upward_edges = []
+    downward_edges = []
+    for (u, w), weight in all_edges.items():
+        if rank[u] < rank[w]:
+            upward_edges.append((u, w, weight))
+        else:
+            downward_edges.append((w, u, weight))
+
+    return contractionhierarchy(
+        graph.labels, rank, _id_graph(graph, upward_edges), _id_graph(graph, downward_edges),
+        middle, time.perf_counter() - started, len(middle))
+
+
+def _shortcuts(node, out_edges, in_edges, contracted, witness_limit):
+    """
+    shortcuts (u, w, weight) needed when node is removed: one for every u -> node -> w
+    that has no other path (a witness) that is as short.
+    """
+    shortcuts = []
+    targets = out_edges[node]
+    if not targets:
+        return shortcuts
+    for u, weight_in in in_edges[node].items():
+        limit = weight_in + max(targets.values())
+        distances = _witness_search(u, node, targets, limit, out_edges, contracted,
+                                    witness_limit)
+        for w, weight_out in targets.items():
+            if w == u:
+                continue
+            via_node = weight_in + weight_out
+            if distances.get(w, float("inf")) > via_node:
+                shortcuts.append((u, w, via_node))
+    return shortcuts
+
+
+def _witness_search(source, skipped, targets, limit, out_edges, contracted, witness_limit):
+    # small Dijkstra from source that does not go through the skipped node.
+    # it runs thousands of times during contraction, so it uses the C heapq with lazy deletion.
+    distances = {source: 0}
+    queue = [(0, source)]
+    settled = 0
+    remaining = len(targets)
+    while queue and settled < witness_limit and remaining:
+        current_distance, current_node = heapq.heappop(queue)
+        if current_distance > distances[current_node]:
+            continue
+        if current_distance > limit:
+            break
+        settled += 1
+        if current_node in targets:
+            remaining -= 1
+        for neighbor, weight in out_edges[current_node].items():
+            if neighbor == skipped or contracted[neighbor]:
+                continue
+            distance = current_distance + weight
+            if distance < distances.get(neighbor, float("inf")):
+                distances[neighbor] = distance
+                heapq.heappush(queue, (distance, neighbor))
+    return distances
+
+
+def _id_graph(graph, edges):
+    # directed csrgraph over the same ids (and labels) as graph
+    sources = [u for u, _, _ in edges]
+    targets = [w for _, w, _ in edges]
+    weights = [weight for _, _, weight in edges]
+    positions = None
+    if graph.lat is not None:
+        positions = list(zip(graph.lat, graph.lon))
+    return csrgraph._build(graph.labels, sources, targets, weights, positions, True)
+
+
+def ch_query(hierarchy, start_coordinates, end_coordinates, stats=None):
+    """
+    shortest path query on a contraction hierarchy.
+    returns (path, predecessors) like dijkstra(), the path has all shortcuts unpacked,
+    or [] if there is no path.
+    stats is an optional search_stats.searchstats, both upward searches are added to it.
+    """
+    if start_coordinates not in hierarchy.index or end_coordinates not in hierarchy.index:
+        if stats is not None:
+            stats.searches += 1
+        return []
+    start = hierarchy.index[start_coordinates]
+    end = hierarchy.index[end_coordinates]
+    if start == end:
+        if stats is not None:
+            stats.searches += 1
+        return [start_coordinates], {}
+
+    infinity = float("inf")
+    node_count = len(hierarchy.labels)
+    graphs = (hierarchy.upward, hierarchy.downward)
+    distances = ({start: 0}, {end: 0})
+    predecessors = ({}, {})
+    # the heap positions are kept in the thread's workspaces, not in new lists of every node
+    with workspace(node_count) as up, workspace(node_count) as down:
+        queues = (daryheap(position=up.position), daryheap(position=down.position))
+        up.heap, down.heap = queues
+        if stats is not None:
+            queues = (countedheap(queues[0], stats), countedheap(queues[1], stats))
+        queues[0].push(start, 0)
+        queues[1].push(end, 0)
+        best = infinity
+        meeting_node = None
+
+        # both searches only go up, so a side can stop when its smallest distance reaches best
+        while True:
+            active = [side for side in (0, 1)
+                      if not queues[side].is_empty() and queues[side].peek()[0] < best]
+            if not active:
+                break
+            side = min(active, key=lambda s: queues[s].peek()[0])
+            current_distance, current_node = queues[side].pop()
+            other = distances[1 - side]
+            if current_node in other and current_distance + other[current_node] < best:
+                best = current_distance + other[current_node]
+                meeting_node = current_node
+
+            up_graph = graphs[side]
+            own = distances[side]
+            queue = queues[side]
+            targets = up_graph.targets
+            weights = up_graph.weights
+            for i in range(up_graph.offsets[current_node], up_graph.offsets[current_node + 1]):
+                neighbor = targets[i]
+                distance = current_distance + weights[i]
+                if distance < own.get(neighbor, infinity):
+                    own[neighbor] = distance
+                    predecessors[side][neighbor] = current_node
+                    if neighbor in queue:
+                        queue.update(neighbor, distance)
+                    else:
+                        queue.push(neighbor, distance)
+
+    if stats is not None:
+        # every popped node had its upward edges looked at, on both sides
+        stats.searches += 1
+        for side in (0, 1):
+            offsets = graphs[side].offsets
+            stats.settled += len(queues[side].popped)
+            stats.relaxed += sum(offsets[node + 1] - offsets[node]
+                                 for node in queues[side].popped)
+
+    if meeting_node is None:
+        return []
+
+    # nodes of the path in the hierarchy, from start up to the meeting node and down to the end
+    up_part = [meeting_node]
+    while up_part[-1] != start:
+        up_part.append(predecessors[0][up_part[-1]])
+    up_part.reverse()
+    down_part = []
+    node = meeting_node
+    while node != end:
+        node = predecessors[1][node]
+        down_part.append(node)
+
+    ids = _unpack(up_part + down_part, hierarchy.middle)
+    labels = hierarchy.labels
+    shortest_path = [labels[node] for node in ids]
+    visited = {node: previous for previous, node in zip(shortest_path, shortest_path[1:])}
+    return shortest_path, visited
+
+
+def _unpack(path, middle):
+    # replace every shortcut u -> w of the path by u -> v -> w until only original edges are left
+    unpacked = [path[0]]
+    for u, w in zip(path, path[1:]):
+        stack = [(u, w)]
+        while stack:
+            edge = stack.pop()
+            node = middle.get(edge)
+            if node is None:
+                unpacked.append(edge[1])
+            else:
+                # the second half is pushed first, so the first half comes out first
+                stack.append((node, edge[1]))
+                stack.append((edge[0], node))
+    return unpacked
@@ -0,0 +1,226 @@
+"""
+This module contains the compact graph (CSR, compressed sparse row) used by the search algorithms.
+The graph is built once from a networkx graph or an edge list and is only read afterwards.
+"""
+from array import array
+import networkx
+import numpy
+
+
+class csrgraph:
+    """
+    graph stored as flat arrays instead of dicts.
+    every node gets an integer id 0..n-1, the edges leaving node u are
+    targets[offsets[u]:offsets[u + 1]] and their weights are in the same slots of weights.
+    an undirected graph stores each edge in both directions.
+    """
+    # node id -> (first, last) of the rows kept in extra_targets and extra_weights instead of
+    # the arrays, only a per-query virtual_graph.csrview has them
+    extra = None
+
+    def __init__(self, labels, offsets, targets, weights, lat=None, lon=None, directed=False):
+        # id -> original node label, the reverse mapping is the index property
+        self.labels = labels
+        self._index = None
+        # adjacency arrays
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        # node coordinates (latitude, longitude), None when the nodes have no position
+        self.lat = lat
+        self.lon = lon
+        self.directed = directed
+        self._reverse = None
+
+    @classmethod
+    def from_networkx(cls, graph, weight='weight'):
+        """
+        build the compact graph from a networkx graph.
+        coordinates are taken from the 'pos' attribute, or from the label if it is a (lat, lon) pair
+        """
+        labels = list(graph.nodes)
+        index = {label: node_id for node_id, label in enumerate(labels)}
+        sources = []
+        targets = []
+        weights = []
+        # graph.adj holds both directions of an undirected edge, and only successors for DiGraph
+        for node, neighbors in graph.adj.items():
+            node_id = index[node]
+            for neighbor, data in neighbors.items():
+                sources.append(node_id)
+                targets.append(index[neighbor])
+                weights.append(data.get(weight, 1))
+        positions = [_position_of(label, graph.nodes[label]) for label in labels]
+        return cls._build(labels, sources, targets, weights, positions, graph.is_directed())
+
+    @classmethod
+    def from_edges(cls, edges, directed=False, positions=None):
+        """
+        build the compact graph from an iterable of (u, v, weight) tuples.
+        positions is an optional dict node -> (lat, lon).
+        """
+        labels = []
+        index = {}
+        sources = []
+        targets = []
+        weights = []
+        for u, v, weight in edges:
+            for node in (u, v):
+                if node not in index:
+                    index[node] = len(labels)
+                    labels.append(node)
+            sources.append(index[u])
+            targets.append(index[v])
+            weights.append(weight)
+            if not directed:
+                sources.append(index[v])
+                targets.append(index[u])
+                weights.append(weight)
+        if positions is not None:
+            positions = [positions.get(label) for label in labels]
+        return cls._build(labels, sources, targets, weights, positions, directed)
+
+    @classmethod
+    def from_arrays(cls, labels, sources, targets, weights, lat=None, lon=None, directed=True):
+        """
+        build the compact graph from edge arrays: edge i goes from node id sources[i] to node id
+        targets[i]. labels[node id] is the node label, lat and lon are optional coordinate arrays.
+        an undirected graph needs both directions of every edge in the arrays.
+        """
+        # sort the edges by source node (stable, so neighbor order is kept) and count them per node
+        node_count = len(labels)
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        order = numpy.argsort(sources, kind='stable')
+        counts = numpy.bincount(sources, minlength=node_count)
+        offsets = numpy.zeros(node_count + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        targets = numpy.asarray(targets, dtype=numpy.int64)[order]
+        weights = numpy.asarray(weights, dtype=numpy.float64)[order]
+
+        if lat is not None and lon is not None and node_count:
+            lat = _to_array('d', numpy.asarray(lat, dtype=numpy.float64))
+            lon = _to_array('d', numpy.asarray(lon, dtype=numpy.float64))
+        else:
+            lat = lon = None
+
+        # the search loops index single elements, which is much faster on array than on numpy
+        return cls(labels, _to_array('q', offsets), _to_array('q', targets),
+                   _to_array('d', weights), lat, lon, directed)
+
+    @classmethod
+    def _build(cls, labels, sources, targets, weights, positions, directed):
+        # same as from_arrays(), with the coordinates as one (lat, lon) or None per node
+        lat = lon = None
+        if positions is not None and all(pos is not None for pos in positions):
+            lat = [pos[0] for pos in positions]
+            lon = [pos[1] for pos in positions]
+        return cls.from_arrays(labels, sources, targets, weights, lat, lon, directed)
+
+    @property
+    def index(self):
+        """
+        label -> node id, built on first use so opening a graph file does not wait for it
+        """
+        if self._index is None:
+            self._index = {label: node_id for node_id, label in enumerate(self.labels)}
+        return self._index
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def edge_count(self):
+        """
+        number of stored (directed) edges
+        """
+        return len(self.targets)
+
+    def neighbors(self, node):
+        """
+        same as networkx graph.neighbors(), yields the neighbor labels of a node label
+        """
+        node_id = self.index[node]
+        labels = self.labels
+        for i in range(self.offsets[node_id], self.offsets[node_id + 1]):
+            yield labels[self.targets[i]]
+
+    def edges_from(self, node_id):
+        """
+        yields (target id, weight) for each edge leaving the node id
+        """
+        targets = self.targets
+        weights = self.weights
+        for i in range(self.offsets[node_id], self.offsets[node_id + 1]):
+            yield targets[i], weights[i]
+
+    def degree(self, node_id):
+        """
+        number of edges leaving the node id
+        """
+        return self.offsets[node_id + 1] - self.offsets[node_id]
+
+    def reverse(self):
+        """
+        graph with every edge turned around, used by backward searches.
+        an undirected graph is its own reverse. the result is built once and kept.
+        """
+        if not self.directed:
+            return self
+        if self._reverse is None:
+            offsets = numpy.frombuffer(self.offsets, dtype=numpy.int64)
+            sources = numpy.repeat(numpy.arange(len(self)), numpy.diff(offsets))
+            self._reverse = csrgraph.from_arrays(
+                self.labels, numpy.frombuffer(self.targets, dtype=numpy.int64), sources,
+                numpy.frombuffer(self.weights, dtype=numpy.float64), self.lat, self.lon, True)
+        return self._reverse
+
+    def to_networkx(self):
+        """
+        the same graph as a networkx Graph (DiGraph when directed), with 'weight' on the edges
+        and 'pos' on the nodes when the graph has coordinates
+        """
+        graph = networkx.DiGraph() if self.directed else networkx.Graph()
+        labels = self.labels
+        for node_id, label in enumerate(labels):
+            if self.lat is None:
+                graph.add_node(label)
+            else:
+                graph.add_node(label, pos=(self.lat[node_id], self.lon[node_id]))
+        for node_id, label in enumerate(labels):
+            for target, weight in self.edges_from(node_id):
+                graph.add_edge(label, labels[target], weight=weight)
+        return graph
+
+    def position(self, node_id):
+        """
+        (lat, lon) of a node id, None if the graph has no coordinates
+        """
+        if self.lat is None:
+            return None
+        return self.lat[node_id], self.lon[node_id]
+
+    def nbytes(self):
+        """
+        memory used by the adjacency and coordinate arrays
+        """
+        arrays = [self.offsets, self.targets, self.weights, self.lat, self.lon]
+        return sum(len(a) * a.itemsize for a in arrays if a is not None)
+
+
+def _to_array(typecode, values):
+    # copy a numpy array into a compact array.array
+    result = array(typecode)
+    result.frombytes(values.tobytes())
+    return result
+
+
+def _position_of(label, data):
+    # the 'pos' attribute wins, otherwise a label that is a pair of numbers is the position
+    if 'pos' in data:
+        return data['pos']
+    if (isinstance(label, tuple) and len(label) == 2 and
+            all(isinstance(value, (int, float)) for value in label)):
+        return label
+    return None
@@ -1,6 +1,9 @@
 """
 This module contains all fuctions to implment Dijkstra.
 """
+from csr_graph import csrgraph
+from search_stats import countedheap
+from search_workspace import workspace
 
 class binaryheap:
     """
@@ -37,8 +40,10 @@ class binaryheap:
         if not self.heap:
             return None
 
-        node = self.heap[0][2]
-        del self.node_index[node]
+        distance, _, node = self.heap[0]
+        # the node can be in the heap more than once, only the newest entry is in the dictionary
+        if self.node_index.get(node) is self.heap[0]:
+            del self.node_index[node]
         if len(self.heap) > 1:
             self.heap[0] = self.heap.pop()
             #calls below method to maintain the heap property
@@ -47,10 +52,7 @@ class binaryheap:
         else:
             self.heap.pop()
 
-        if self.heap:
-            return self.heap[0][0], node
-        else:
-            return None, None
+        return distance, node
 
     def update(self, node, new_distance):
         """
@@ -128,28 +130,196 @@ class binaryheap:
         self.node_index[self.heap[j][2]] = self.heap[j]
 
 
-def dijkstra(graph, start_coordinates, end_coordinates):
+class _positions(dict):
+    # node -> heap index, a node that is not in the heap has index -1
+    def __missing__(self, node):
+        return -1
+
+
+class daryheap:
+    """
+    indexed d-ary min heap, replaces binaryheap in the algorithms.
+    the nodes and their keys (distances) are kept in two parallel lists, and the heap index of
+    every node is kept in a position table, so update() can do a real decrease-key.
+    arity is the number of children of each heap node (2, 4 or 8), a wider heap is lower,
+    so push and update do fewer steps.
+    if capacity is given, nodes must be integer ids below it and the position table is a list.
+    position is a table to use instead (a list with -1 for every node id, like the one of a
+    search_workspace.searchworkspace), the heap leaves its nodes in it.
+    """
+    __slots__ = ('arity', 'nodes', 'keys', 'position')
+
+    def __init__(self, arity=4, capacity=None, position=None):
+        if arity not in (2, 4, 8):
+            raise ValueError("arity must be 2, 4 or 8")
+        self.arity = arity
+        self.nodes = []
+        self.keys = []
+        if position is not None:
+            self.position = position
+        elif capacity is None:
+            self.position = _positions()
+        else:
+            self.position = [-1] * capacity
+
+    def push(self, node, distance):
+        """
+        push new elements to heap
+        """
+        self.nodes.append(node)
+        self.keys.append(distance)
+        self._sift_up(len(self.nodes) - 1, node, distance)
+
+    def pop(self):
+        """
+        removes and returns (distance, node) with the smallest distance, None if the heap is empty
+        """
+        nodes = self.nodes
+        if not nodes:
+            return None
+        keys = self.keys
+        node = nodes[0]
+        distance = keys[0]
+        self.position[node] = -1
+
+        last_node = nodes.pop()
+        last_key = keys.pop()
+        if nodes:
+            # move the last element into the hole at the root and let it sink
+            self._sift_down(0, last_node, last_key)
+        return distance, node
+
+    def peek(self):
+        """
+        returns (distance, node) with the smallest distance without removing it, None if empty
+        """
+        if not self.nodes:
+            return None
+        return self.keys[0], self.nodes[0]
+
+    def update(self, node, new_distance):
+        """
+        change the distance of a node that is in the heap (decrease-key).
+        """
+        index = self.position[node]
+        if index < 0:
+            raise KeyError(node)
+        if new_distance < self.keys[index]:
+            self._sift_up(index, node, new_distance)
+        else:
+            self._sift_down(index, node, new_distance)
+
+    def is_empty(self):
+        """
+        Check if the heap is empty
+        """
+        return not self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return self.position[node] >= 0
+
+    #move the hole at index up while the parent is larger, then put the node into it.
+    #the parents are shifted down, so each step writes one entry instead of swapping two.
+    def _sift_up(self, index, node, distance):
+        nodes = self.nodes
+        keys = self.keys
+        position = self.position
+        arity = self.arity
+        while index > 0:
+            parent = (index - 1) // arity
+            parent_key = keys[parent]
+            if distance >= parent_key:
+                break
+            parent_node = nodes[parent]
+            nodes[index] = parent_node
+            keys[index] = parent_key
+            position[parent_node] = index
+            index = parent
+        nodes[index] = node
+        keys[index] = distance
+        position[node] = index
+
+    #move the hole at index down to the smallest child while that child is smaller.
+    def _sift_down(self, index, node, distance):
+        nodes = self.nodes
+        keys = self.keys
+        position = self.position
+        arity = self.arity
+        size = len(nodes)
+        while True:
+            first = arity * index + 1
+            if first >= size:
+                break
+            # find the smallest of the (up to arity) children
+            smallest = first
+            smallest_key = keys[first]
+            for child in range(first + 1, min(first + arity, size)):
+                if keys[child] < smallest_key:
+                    smallest = child
+                    smallest_key = keys[child]
+            if smallest_key >= distance:
+                break
+            child_node = nodes[smallest]
+            nodes[index] = child_node
+            keys[index] = smallest_key
+            position[child_node] = index
+            index = smallest
+        nodes[index] = node
+        keys[index] = distance
+        position[node] = index
+
+
+class _estimates(dict):
+    # node -> heuristic estimate to the end node, computed the first time it is needed
+    def __init__(self, heuristic_function, end_coordinates, labels=None):
+        super().__init__()
+        self.heuristic_function = heuristic_function
+        self.end_coordinates = end_coordinates
+        self.labels = labels
+
+    def __missing__(self, node):
+        label = node if self.labels is None else self.labels[node]
+        value = self[node] = self.heuristic_function(label, self.end_coordinates)
+        return value
+
+
+def dijkstra(graph, start_coordinates, end_coordinates, heuristic_function=None, stats=None):
     """
     Operates Dijkstra’s Algorithm
+    graph is a networkx graph or a csrgraph, the csrgraph runs on integer ids and arrays.
+    with heuristic_function(node, end) (a lower bound of the remaining distance, for example
+    a landmarks.landmarkset) the search is A*: the queue is ordered by distance + estimate.
+    stats is an optional search_stats.searchstats the work of the search is added to.
     """
-    # Initialize the distance dictionary with infinity for all nodes, except the start node
-    distances = {}
-    for node in graph.nodes:
-        distances[node] = float("inf")
-    distances[start_coordinates] = 0
+    if isinstance(graph, csrgraph):
+        return _dijkstra_csr(graph, start_coordinates, end_coordinates, heuristic_function,
+                             stats)
+
+    estimates = None
+    if heuristic_function is not None:
+        estimates = _estimates(heuristic_function, end_coordinates)
+
+    # only the reached nodes have a distance, the others are infinitely far.
+    # filling in every node first would cost O(V) even for a short query
+    infinity = float("inf")
+    distances = {start_coordinates: 0}
 
     # for visited nodes
     visited = {}
 
     # create queue
-    queue = binaryheap()
+    queue = daryheap()
+    if stats is not None:
+        queue = countedheap(queue, stats)
     queue.push (start_coordinates, 0)
 
     while not queue.is_empty():
         # Get the node with the smallest tentative distance from the priority queue
-        current_distance, current_node = queue.pop()
-        if current_distance is None or current_node is None:
-            break
+        _, current_node = queue.pop()
+        current_distance = distances[current_node]
 
         # break when end node is reached
         if current_node == end_coordinates:
@@ -160,12 +330,20 @@ def dijkstra(graph, start_coordinates, end_coordinates):
             # Calculate the distance from the start to the neighbor through the current node
             distance = current_distance + graph[current_node][neighbor]['weight']
             # If a shorter path is found, update the distance and visited node
-            if distance < distances[neighbor]:
+            if distance < distances.get(neighbor, infinity):
                 distances[neighbor] = distance
                 visited[neighbor] = current_node
 
-                # Add the neighbor code to the priority queue with the updated distance
-                queue.push((distance, neighbor))
+                # Add the neighbor to the priority queue, or lower its distance if it is there
+                key = distance if estimates is None else distance + estimates[neighbor]
+                if neighbor in queue:
+                    queue.update(neighbor, key)
+                else:
+                    queue.push(neighbor, key)
+
+    if stats is not None:
+        # the end node is settled, but its edges are not looked at
+        _count_settled(stats, queue.popped, end_coordinates, lambda node: len(graph[node]))
 
     # If no path from the start node to the end node, return None
     if end_coordinates not in visited:
@@ -179,6 +357,240 @@ def dijkstra(graph, start_coordinates, end_coordinates):
     return shortest_path, visited
 
 
+def _dijkstra_csr(graph, start_coordinates, end_coordinates, heuristic_function=None,
+                  stats=None):
+    """
+    Dijkstra on a csrgraph: same result as dijkstra(), but the loop only touches integer ids
+    and the offsets, targets and weights arrays.
+    """
+    if start_coordinates not in graph or end_coordinates not in graph:
+        if stats is not None:
+            stats.searches += 1
+        return []
+    start = graph.index[start_coordinates]
+    end = graph.index[end_coordinates]
+
+    estimates = None
+    if hasattr(heuristic_function, 'lazy_table'):
+        # the estimates of a block of nodes at once, only for the nodes the search reaches
+        estimates = heuristic_function.lazy_table(end_coordinates)
+    elif hasattr(heuristic_function, 'table'):
+        # the heuristic can give all estimates to the end node at once
+        estimates = heuristic_function.table(end_coordinates).tolist()
+    elif heuristic_function is not None:
+        estimates = _estimates(heuristic_function, end_coordinates, graph.labels)
+
+    # the distances, predecessors and heap positions are lists of the thread's workspace,
+    # a node counts as reached only when its stamp is this search's generation
+    with workspace(len(graph)) as space:
+        return _csr_search(graph, space, start, end, estimates, stats)
+
+
+def _csr_search(graph, space, start, end, estimates, stats):
+    # local names for the arrays, so the inner loop does no attribute lookups
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    # rows that are not in the arrays (the virtual nodes of a virtual_graph.csrview)
+    extra = graph.extra
+    generation = space.generation
+    stamps = space.stamps
+    distances = space.distances
+    predecessors = space.predecessors
+    touched = space.touched
+
+    stamps[start] = generation
+    distances[start] = 0
+
+    queue = space.heap = daryheap(position=space.position)
+    if stats is not None:
+        queue = countedheap(queue, stats)
+    position = queue.position
+    queue.push(start, 0)
+
+    while not queue.is_empty():
+        _, current_node = queue.pop()
+        if current_node == end:
+            break
+        current_distance = distances[current_node]
+
+        if extra is None or current_node not in extra:
+            edge_targets = targets
+            edge_weights = weights
+            first = offsets[current_node]
+            last = offsets[current_node + 1]
+        else:
+            edge_targets = graph.extra_targets
+            edge_weights = graph.extra_weights
+            first, last = extra[current_node]
+        for i in range(first, last):
+            neighbor = edge_targets[i]
+            distance = current_distance + edge_weights[i]
+            if stamps[neighbor] != generation:
+                stamps[neighbor] = generation
+                touched.append(neighbor)
+            elif distance >= distances[neighbor]:
+                continue
+            distances[neighbor] = distance
+            predecessors[neighbor] = current_node
+            key = distance if estimates is None else distance + estimates[neighbor]
+            if position[neighbor] >= 0:
+                queue.update(neighbor, key)
+            else:
+                queue.push(neighbor, key)
+
+    if stats is not None:
+        _count_settled(stats, queue.popped, end, graph.degree)
+
+    if stamps[end] != generation or end == start:
+        return []
+
+    # translate the ids back to the node labels
+    labels = graph.labels
+    visited = {labels[node]: labels[predecessors[node]] for node in touched}
+    shortest_path = reconstruct_shortest_path(visited, labels[start], labels[end])
+    return shortest_path, visited
+
+
+
+def bidirectional_dijkstra(graph, start_coordinates, end_coordinates, stats=None):
+    """
+    Dijkstra from both ends: one search forward from the start, one backward from the end.
+    stops when the two frontiers meet, for long routes it settles about half the nodes.
+    returns the same (path, predecessors) as dijkstra(), or [] if there is no path.
+    stats is an optional search_stats.searchstats, both sides are added to it.
+    """
+    if start_coordinates not in graph or end_coordinates not in graph:
+        if stats is not None:
+            stats.searches += 1
+        return []
+    if isinstance(graph, csrgraph):
+        # the heap positions of both sides are kept in the thread's workspaces
+        with workspace(len(graph)) as forward, workspace(len(graph)) as backward:
+            result = _bidirectional_search(
+                _csr_edges(graph), _csr_edges(graph.reverse()), graph.index[start_coordinates],
+                graph.index[end_coordinates], (forward, backward), stats)
+        if not result:
+            return []
+        labels = graph.labels
+        visited = {labels[node]: labels[parent] for node, parent in result[1].items()}
+        return [labels[node] for node in result[0]], visited
+
+    backward = graph.pred if graph.is_directed() else graph.adj
+    return _bidirectional_search(_networkx_edges(graph.adj), _networkx_edges(backward),
+                                 start_coordinates, end_coordinates, stats=stats)
+
+
+def _csr_edges(graph):
+    # function that yields (neighbor id, weight) of a node id
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    # rows that are not in the arrays (the virtual nodes of a virtual_graph.csrview)
+    extra = graph.extra or {}
+    extra_targets = graph.extra_targets if extra else None
+    extra_weights = graph.extra_weights if extra else None
+    def edges(node):
+        row = extra.get(node)
+        if row is not None:
+            for i in range(*row):
+                yield extra_targets[i], extra_weights[i]
+            return
+        for i in range(offsets[node], offsets[node + 1]):
+            yield targets[i], weights[i]
+    return edges
+
+
+def _networkx_edges(adjacency):
+    # function that yields (neighbor, weight) of a node from graph.adj or graph.pred
+    def edges(node):
+        for neighbor, data in adjacency[node].items():
+            yield neighbor, data['weight']
+    return edges
+
+
+def _bidirectional_search(forward_edges, backward_edges, start, end, spaces=None, stats=None):
+    """
+    the search itself, index 0 is the forward side and index 1 the backward side.
+    spaces is a pair of search workspaces for integer node ids, the two heaps keep their
+    positions in them. without them the positions are kept in dicts.
+    """
+    if start == end:
+        if stats is not None:
+            stats.searches += 1
+        return [start], {}
+    infinity = float("inf")
+    distances = ({start: 0}, {end: 0})
+    predecessors = ({}, {})
+    if spaces is None:
+        queues = (daryheap(), daryheap())
+    else:
+        queues = (daryheap(position=spaces[0].position), daryheap(position=spaces[1].position))
+        spaces[0].heap, spaces[1].heap = queues
+    if stats is not None:
+        queues = (countedheap(queues[0], stats), countedheap(queues[1], stats))
+    queues[0].push(start, 0)
+    queues[1].push(end, 0)
+    edges = (forward_edges, backward_edges)
+
+    # length of the best path found so far and the node where its two halves meet
+    best = infinity
+    meeting_node = None
+
+    while not queues[0].is_empty() and not queues[1].is_empty():
+        # no path through the unsettled nodes can be shorter than best any more
+        if queues[0].peek()[0] + queues[1].peek()[0] >= best:
+            break
+
+        # expand the side with the smaller frontier
+        side = 0 if len(queues[0]) <= len(queues[1]) else 1
+        queue = queues[side]
+        own = distances[side]
+        other = distances[1 - side]
+        current_distance, current_node = queue.pop()
+
+        for neighbor, weight in edges[side](current_node):
+            distance = current_distance + weight
+            if distance < own.get(neighbor, infinity):
+                own[neighbor] = distance
+                predecessors[side][neighbor] = current_node
+                if neighbor in queue:
+                    queue.update(neighbor, distance)
+                else:
+                    queue.push(neighbor, distance)
+            # the other search has reached the neighbor, so there is a path through it
+            if neighbor in other and own[neighbor] + other[neighbor] < best:
+                best = own[neighbor] + other[neighbor]
+                meeting_node = neighbor
+
+    if stats is not None:
+        # every popped node had its edges looked at, on both sides
+        stats.searches += 1
+        for side in (0, 1):
+            stats.settled += len(queues[side].popped)
+            stats.relaxed += sum(1 for node in queues[side].popped for _ in edges[side](node))
+
+    if meeting_node is None:
+        return []
+
+    # forward predecessors, then follow the backward search from the meeting node to the end
+    visited = dict(predecessors[0])
+    node = meeting_node
+    while node != end:
+        next_node = predecessors[1][node]
+        visited[next_node] = node
+        node = next_node
+
+    shortest_path = reconstruct_shortest_path(visited, start, end)
+    return shortest_path, visited
+
+
+def _count_settled(stats, popped, end, degree):
+    # one Dijkstra search: the popped nodes are settled, the edges of all but the end node relaxed
+    stats.searches += 1
+    stats.settled += len(popped)
+    stats.relaxed += sum(degree(node) for node in popped if node != end)
+
 
 def reconstruct_shortest_path(visited, start_coordinates, end_coordinates):
     """
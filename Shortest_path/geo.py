@@ -0,0 +1,26 @@
+"""
+This module contains the distance on the earth's surface between coordinates.
+haversine() works on single numbers and on numpy arrays, so a whole edge list is done in one call.
+"""
+import numpy
+
+# mean earth radius in meters
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    great circle distance in meters between (lat1, lon1) and (lat2, lon2), in degrees.
+    arguments can be numbers or numpy arrays of the same shape
+    """
+    lat1, lon1, lat2, lon2 = (numpy.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = (numpy.sin((lat2 - lat1) / 2) ** 2
+         + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+
+
+def point_distance(point1, point2):
+    """
+    haversine() between two (lat, lon) points, as a float
+    """
+    return float(haversine(point1[0], point1[1], point2[0], point2[1]))
@@ -0,0 +1,173 @@
+"""
+This module contains the geocoding cache: an in-process LRU in front of an on-disk SQLite store.
+Addresses are normalized before lookup, every entry has an expiry time, and addresses the
+geocoder could not find are cached too (for a shorter time), so they are not asked again.
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# how long found and not found addresses stay valid, in seconds
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 4096
+
+# marks "not in the cache", because None is a cached "address not found"
+MISSING = object()
+
+
+def normalize_address(address):
+    """
+    the cache key of an address: case and extra whitespace or punctuation do not matter
+    """
+    address = address.casefold().strip().strip('.,;')
+    address = re.sub(r'\s*,\s*', ', ', address)
+    return re.sub(r'\s+', ' ', address)
+
+
+class geocodecache:
+    """
+    cache of address -> (latitude, longitude), or None for an address that was not found.
+    file_path is the SQLite file, None keeps the cache in memory only.
+    hits, disk_hits and misses count the lookups (disk_hits are also hits).
+    """
+    def __init__(self, file_path=None, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, clock=time.time):
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # normalized address -> (coordinates or None, expiry time), least recently used first
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def lookup(self, address, geocoder):
+        """
+        coordinates of the address from the cache, or from geocoder(address) on a miss.
+        geocoder returns (lat, lon), or None when the address does not exist (cached as well).
+        if it raises, nothing is cached and the exception goes to the caller.
+        """
+        key = normalize_address(address)
+        coordinates = self.get(key)
+        if coordinates is not MISSING:
+            return coordinates
+        coordinates = geocoder(address)
+        self.put(key, coordinates)
+        return coordinates
+
+    def get(self, key):
+        """
+        cached value of a normalized address, MISSING if it is not cached or has expired
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+            entry = self._read(key, now)
+            if entry is not None:
+                self._remember(key, entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry[0]
+
+            self.misses += 1
+            return MISSING
+
+    def missing(self, keys):
+        """
+        the normalized addresses of keys that are not cached or have expired, without counting
+        them as lookups
+        """
+        now = self.clock()
+        with self._lock:
+            return [key for key in keys
+                    if not ((key in self._memory and self._memory[key][1] > now)
+                            or self._read(key, now) is not None)]
+
+    def put(self, key, coordinates):
+        """
+        store the value of a normalized address in memory and on disk
+        """
+        ttl = self.ttl if coordinates is not None else self.negative_ttl
+        entry = (coordinates, self.clock() + ttl)
+        with self._lock:
+            self._remember(key, entry)
+            self._write(key, entry)
+
+    def clear(self):
+        """
+        remove every entry, in memory and on disk
+        """
+        with self._lock:
+            self._memory.clear()
+            connection = self._database()
+            if connection is not None:
+                with connection:
+                    connection.execute("DELETE FROM geocode")
+
+    def stats(self):
+        """
+        counters and size of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._memory),
+        }
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _database(self):
+        # the SQLite connection, opened on first use. callers hold the lock.
+        if self.file_path is None:
+            return None
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.file_path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode ("
+                    "address TEXT PRIMARY KEY, latitude REAL, longitude REAL, expires REAL)")
+        return self._connection
+
+    def _read(self, key, now):
+        connection = self._database()
+        if connection is None:
+            return None
+        row = connection.execute(
+            "SELECT latitude, longitude, expires FROM geocode WHERE address = ?",
+            (key,)).fetchone()
+        if row is None or row[2] <= now:
+            return None
+        coordinates = None if row[0] is None else (row[0], row[1])
+        return coordinates, row[2]
+
+    def _write(self, key, entry):
+        connection = self._database()
+        if connection is None:
+            return
+        coordinates, expires = entry
+        latitude, longitude = coordinates if coordinates is not None else (None, None)
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO geocode (address, latitude, longitude, expires) "
+                "VALUES (?, ?, ?, ?)", (key, latitude, longitude, expires))
@@ -0,0 +1,245 @@
+"""
+This module contains the binary file format of the routing graph.
+A fixed size header is followed by the arrays of a csrgraph (offsets, targets, weights, node
+coordinates), the KD-tree of its spatial index and the node labels, each array aligned to 8 bytes.
+Integer labels are stored as an int64 array, other labels (str, int, float, bool, None and
+tuples of them) as UTF-8 JSON. The file only holds data, opening it never runs code from it.
+open_graph() maps the file into memory (mmap) and uses the arrays in place, nothing is copied, so
+opening is nearly instant and processes that open the same file share its pages.
+
+    python graph_file.py convert <map.osm | map.osm.pbf | graph file> <output graph file>
+    python graph_file.py info <graph file>
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+import networkx
+import numpy
+from csr_graph import csrgraph
+from osm_loader import osmloader
+from spatial_index import spatialindex
+
+MAGIC = b'SPGRAPH\0'
+VERSION = 2
+# magic, version, flags, node count, edge count, KD-tree leaf count, label bytes, crc32
+HEADER = struct.Struct('<8sIIQQQQI')
+HEADER_SIZE = 64
+
+# header flags
+DIRECTED = 1
+COORDINATES = 2
+INTEGER_LABELS = 4
+SPATIAL_TREE = 8
+
+
+def save_graph(graph, file_path):
+    """
+    write a csrgraph or networkx graph to file_path.
+    the spatial index is built and stored too when the nodes have coordinates.
+    the file is written next to file_path and renamed, so readers never see half a file.
+    raises ValueError for a label that is not a str, int, float, bool, None or tuple of them.
+    """
+    if isinstance(graph, networkx.Graph):
+        graph = csrgraph.from_networkx(graph)
+    node_count = len(graph)
+    flags = DIRECTED if graph.directed else 0
+    sections = [_int64(graph.offsets), _int64(graph.targets), _float64(graph.weights)]
+    leaf_count = 0
+    if graph.lat is not None:
+        flags |= COORDINATES | SPATIAL_TREE
+        sections += [_float64(graph.lat), _float64(graph.lon)]
+        order, leaf_starts, split_dims, split_values = spatialindex.from_graph(graph).tree()
+        leaf_count = len(leaf_starts) - 1
+        sections += [_int64(order), _int64(leaf_starts), _int64(split_dims),
+                     _float64(split_values)]
+    labels = graph.labels
+    if all(isinstance(label, int) and not isinstance(label, bool) and
+           -2 ** 63 <= label < 2 ** 63 for label in labels):
+        flags |= INTEGER_LABELS
+        sections.append(numpy.asarray(labels, dtype=numpy.int64).tobytes())
+    else:
+        sections.append(json.dumps([_label_value(label) for label in labels],
+                                   separators=(',', ':')).encode('utf-8'))
+    label_bytes = len(sections[-1])
+
+    checksum = 0
+    for section in sections:
+        checksum = zlib.crc32(section, checksum)
+        checksum = zlib.crc32(_padding(len(section)), checksum)
+    header = HEADER.pack(MAGIC, VERSION, flags, node_count, graph.edge_count(), leaf_count,
+                         label_bytes, checksum)
+
+    temporary_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(header.ljust(HEADER_SIZE, b'\0'))
+        for section in sections:
+            file.write(section)
+            file.write(_padding(len(section)))
+    os.replace(temporary_path, file_path)
+
+
+def open_graph(file_path, verify=True):
+    """
+    csrgraph of a file written by save_graph(), its arrays are read straight from the mapped file.
+    verify=True compares the checksum, which reads the whole file once.
+    the opened graph can not be pickled, every process opens the file itself.
+    raises ValueError if the file is not a graph file, has another version or is damaged.
+    """
+    return _open(file_path, verify)[0]
+
+
+def open_spatial_index(file_path, verify=True):
+    """
+    (csrgraph, spatialindex) of a file written by save_graph(), the index uses the stored tree.
+    the index is None when the graph has no coordinates.
+    """
+    graph, tree = _open(file_path, verify)
+    if graph.lat is None:
+        return graph, None
+    points = numpy.column_stack((numpy.frombuffer(graph.lat, dtype=numpy.float64),
+                                 numpy.frombuffer(graph.lon, dtype=numpy.float64)))
+    return graph, spatialindex(points, graph.labels, tree=tree)
+
+
+def read_header(file_path):
+    """
+    header fields of a graph file as a dict
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read(HEADER_SIZE)
+    return _header(data, file_path)
+
+
+def _header(data, file_path):
+    if len(data) < HEADER_SIZE or data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{file_path} is not a graph file")
+    (_, version, flags, node_count, edge_count, leaf_count, label_bytes,
+     checksum) = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"{file_path} has graph file version {version}, "
+                         f"this program reads version {VERSION}")
+    return {'version': version, 'flags': flags, 'directed': bool(flags & DIRECTED),
+            'node_count': node_count, 'edge_count': edge_count, 'leaf_count': leaf_count,
+            'label_bytes': label_bytes, 'checksum': checksum}
+
+
+def _open(file_path, verify):
+    with open(file_path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _header(mapped[:HEADER_SIZE], file_path)
+    flags = header['flags']
+    node_count = header['node_count']
+    edge_count = header['edge_count']
+    leaf_count = header['leaf_count']
+
+    # (typecode, length) of each section, in file order
+    layout = [('q', node_count + 1), ('q', edge_count), ('d', edge_count)]
+    if flags & COORDINATES:
+        layout += [('d', node_count), ('d', node_count)]
+    if flags & SPATIAL_TREE:
+        layout += [('q', node_count), ('q', leaf_count + 1), ('q', leaf_count - 1),
+                   ('d', leaf_count - 1)]
+    if flags & INTEGER_LABELS:
+        layout.append(('q', node_count))
+    else:
+        layout.append(('B', header['label_bytes']))
+    size = HEADER_SIZE + sum(_aligned(length * (1 if typecode == 'B' else 8))
+                             for typecode, length in layout)
+    if len(mapped) != size:
+        raise ValueError(f"{file_path} should have {size} bytes, it has {len(mapped)}")
+
+    view = memoryview(mapped)
+    if verify and zlib.crc32(view[HEADER_SIZE:]) != header['checksum']:
+        raise ValueError(f"{file_path} is damaged, the checksum does not match")
+
+    sections = []
+    position = HEADER_SIZE
+    for typecode, length in layout:
+        end = position + length * (1 if typecode == 'B' else 8)
+        sections.append(view[position:end].cast(typecode))
+        position = _aligned(end - HEADER_SIZE) + HEADER_SIZE
+
+    offsets, targets, weights = sections[:3]
+    lat = lon = tree = None
+    if flags & COORDINATES:
+        lat, lon = sections[3:5]
+    if flags & SPATIAL_TREE:
+        order, leaf_starts, split_dims = (numpy.frombuffer(section, dtype=numpy.int64)
+                                          for section in sections[5:8])
+        tree = (order, leaf_starts, split_dims, numpy.frombuffer(sections[8], dtype=numpy.float64))
+    if flags & INTEGER_LABELS:
+        # memoryview items are python ints, like the labels that were saved
+        labels = sections[-1]
+    else:
+        labels = _labels(sections[-1], node_count, file_path)
+    graph = csrgraph(labels, offsets, targets, weights, lat, lon, bool(flags & DIRECTED))
+    return graph, tree
+
+
+def _label_value(label):
+    # the JSON value of a label, a tuple becomes a list (a list can not be a label)
+    if label is None or isinstance(label, (str, int, float)):
+        return label
+    if isinstance(label, tuple):
+        return [_label_value(item) for item in label]
+    raise ValueError(f"node label {label!r} of type {type(label).__name__} can not be stored "
+                     "in a graph file")
+
+
+def _label(value):
+    if isinstance(value, list):
+        return tuple(_label(item) for item in value)
+    return value
+
+
+def _labels(data, node_count, file_path):
+    # the labels of the JSON label section
+    try:
+        values = json.loads(bytes(data).decode('utf-8'))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != node_count:
+        raise ValueError(f"{file_path} has damaged node labels")
+    return [_label(value) for value in values]
+
+
+def _int64(values):
+    return numpy.asarray(values, dtype=numpy.int64).tobytes()
+
+
+def _float64(values):
+    return numpy.asarray(values, dtype=numpy.float64).tobytes()
+
+
+def _aligned(length):
+    return (length + 7) // 8 * 8
+
+
+def _padding(length):
+    return b'\0' * (_aligned(length) - length)
+
+
+def convert(input_path, output_path):
+    """
+    write the road graph of an OSM file (or another graph file) as a graph file
+    """
+    if input_path.endswith(('.osm', '.pbf', '.xml')):
+        loader = osmloader()
+        graph = loader.load(input_path)
+        print(f"read {input_path}: {loader.stats()}")
+    else:
+        graph = open_graph(input_path)
+    save_graph(graph, output_path)
+    print(f"wrote {output_path}: {read_header(output_path)}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'convert':
+        convert(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'info':
+        print(read_header(sys.argv[2]))
+    else:
+        print("usage: python graph_file.py convert <input> <output> | info <graph file>")
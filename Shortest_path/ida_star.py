@@ -1,87 +1,379 @@
 """
 This module contains all fuctions to implment IDA*.
+The search is iterative (explicit stack), so long routes do not hit Python's recursion limit,
+and a transposition table keeps the best g of each node between the deepening iterations.
 """
-import networkx
+import heapq
+from operator import itemgetter
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from search_stats import searchstats
+from straight_line import straightline
+
+# most nodes the transposition table remembers, this caps the memory of one query
+DEFAULT_TABLE_SIZE = 1000000
+
+_first = itemgetter(0)
 
-# Create a weighted graph
-graph = networkx.Graph()
 
 def heuristic(start_coordinates, end_coordinates):
     """
     heuristic function (Euclidean distance between two points)
     estimates the distance between a given node and the goal node
     """
+    if start_coordinates is None or end_coordinates is None:
+        # no position known, zero is always a valid estimate
+        return 0
     x1, y1 = start_coordinates
     x2, y2 = end_coordinates
     return ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
 
 
-def search(current_coordinates, g, bound, end_coordinates):
+class idastar:
     """
-    # Define the IDA* search function
+    IDA* engine for one graph (networkx graph or csrgraph).
+    after run(), iterations, expansions, reexpansions (of nodes expanded before), relaxed
+    (edges looked at), peak_depth (longest path on the stack) and table_size tell how much work
+    the query did. they are also added to stats, a search_stats.searchstats, if one is given.
+    max_table_size caps the transposition table. a pass that needs more nodes than that
+    stops, and A* (dijkstra() with the same estimate) finishes the query: without the table
+    IDA* re-expands nodes exponentially. fallback tells if that happened.
+    threshold_policy is how the bound grows between iterations:
+      'min'        - classic IDA*, the smallest estimate that was over the bound
+      'controlled' - the bound that lets about twice as many nodes in as the last iteration.
+                     the iteration that finds a path keeps searching for a shorter one,
+                     so the result is still the shortest path, with far fewer iterations
+                     on graphs with many different edge weights (road networks).
     """
-    f = g + heuristic(current_coordinates, end_coordinates)
+    def __init__(self, graph, max_table_size=DEFAULT_TABLE_SIZE, threshold_policy='controlled',
+                 heuristic_function=None, stats=None):
+        if threshold_policy not in ('min', 'controlled'):
+            raise ValueError("threshold_policy must be 'min' or 'controlled'")
+        self.graph = graph
+        # heuristic_function(node, end), None is the straight line distance: of heuristic()
+        # on a networkx graph, of straight_line.straightline on a csrgraph
+        self.heuristic_function = heuristic_function
+        self.max_table_size = max_table_size
+        self.threshold_policy = threshold_policy
+        self.stats = stats
+        self.iterations = 0
+        self.expansions = 0
+        self.reexpansions = 0
+        self.relaxed = 0
+        self.peak_depth = 0
+        self.table_size = 0
+        self.fallback = False
+        self.cost = None
+
+    def run(self, start_coordinates, end_coordinates):
+        """
+        returns the shortest path as a list of nodes, [] if there is none
+        """
+        self.iterations = 0
+        self.expansions = 0
+        self.reexpansions = 0
+        self.relaxed = 0
+        self.peak_depth = 0
+        self.table_size = 0
+        self.fallback = False
+        self.cost = None
+        path = self._run(start_coordinates, end_coordinates)
+        stats = self.stats
+        if stats is not None:
+            stats.searches += 1
+            stats.iterations += self.iterations
+            stats.settled += self.expansions
+            stats.reexpansions += self.reexpansions
+            stats.relaxed += self.relaxed
+            stats.peak_depth = max(stats.peak_depth, self.peak_depth)
+        return path
+
+    def _run(self, start_coordinates, end_coordinates):
+        if start_coordinates not in self.graph or end_coordinates not in self.graph:
+            return []
+
+        if isinstance(self.graph, csrgraph):
+            start = self.graph.index[start_coordinates]
+            end = self.graph.index[end_coordinates]
+            edges, estimate = _csr_functions(self.graph, end, self.heuristic_function)
+        else:
+            start = start_coordinates
+            end = end_coordinates
+            edges, estimate = _networkx_functions(self.graph, end, self.heuristic_function)
+
+        controlled = self.threshold_policy == 'controlled'
+        # node -> best g seen in any iteration, and node -> predecessor
+        table = {}
+        visited = {}
+        bound = estimate(start)
+        step = 0
+        while True:
+            self.iterations += 1
+            exceeded = [] if controlled else None
+            cost, path, min_exceeded, expansions, work = _threshold_pass(
+                start, 0, bound, end, edges, estimate, table, visited,
+                self.max_table_size, exceeded, not controlled)
+            self.expansions += expansions
+            self.reexpansions += work[0]
+            self.relaxed += work[1]
+            self.peak_depth = max(self.peak_depth, work[2])
+            self.table_size = len(table)
+            if work[3]:
+                return self._fallback(start_coordinates, end_coordinates, edges)
+            if path is not None:
+                self.cost = cost
+                if isinstance(self.graph, csrgraph):
+                    return [self.graph.labels[node] for node in path]
+                return path
+            if min_exceeded == float("inf"):
+                return []
+            next_bound = _next_bound(bound, step, min_exceeded, exceeded, expansions)
+            step = next_bound - bound
+            bound = next_bound
+
+    def _fallback(self, start_coordinates, end_coordinates, edges):
+        # the table is full, A* finishes the query. its settled nodes count as expansions
+        self.fallback = True
+        heuristic_function = self.heuristic_function
+        if heuristic_function is None and isinstance(self.graph, csrgraph):
+            heuristic_function = straightline.of(self.graph)
+        work = searchstats()
+        result = dijkstra(self.graph, start_coordinates, end_coordinates,
+                          heuristic_function=heuristic_function, stats=work)
+        self.expansions += work.settled
+        self.relaxed += work.relaxed
+        if not result:
+            return []
+        path = result[0]
+        nodes = path
+        if isinstance(self.graph, csrgraph):
+            index = self.graph.index
+            nodes = [index[node] for node in path]
+        self.cost = sum(min(weight for neighbor, weight in edges(u) if neighbor == v)
+                        for u, v in zip(nodes, nodes[1:]))
+        return path
+
+
+def _next_bound(bound, step, min_exceeded, exceeded, expansions):
+    # classic policy: the smallest estimate over the bound.
+    # controlled policy: the estimate that lets in about as many new nodes as were expanded.
+    # when fewer nodes than that wait over the bound (a thin frontier), the bound step doubles
+    # instead, so a long chain of nodes does not take one iteration per node.
+    if not exceeded:
+        return min_exceeded
+    wanted = max(1, expansions)
+    if len(exceeded) >= wanted:
+        return heapq.nsmallest(wanted, exceeded)[-1]
+    # thin frontier: every waiting node gets in, and the step doubles
+    farthest = max(exceeded)
+    doubled = bound + 2 * step
+    return max(farthest, doubled)
+
+
+def _threshold_pass(start, start_g, bound, end, edges, estimate, table, visited,
+                    max_table_size, exceeded, first_solution):
+    """
+    one depth-first iteration with an explicit stack.
+    returns (cost of the best path, the path or None, smallest estimate over the bound,
+    number of expanded nodes, (reexpanded nodes, relaxed edges, longest path, full)).
+    full is True when the pass stopped because the table had no room for a new node.
+    """
+    infinity = float("inf")
+    best_cost = infinity
+    best_path = None
+    min_exceeded = infinity
+    expansions = 0
+    reexpansions = 0
+    peak_depth = 1
+    full = False
+
+    f = start_g + estimate(start)
     if f > bound:
-        return f
+        return infinity, None, f, 0, (0, 0, 0, False)
+    if start == end:
+        return start_g, [start], infinity, 0, (0, 0, 1, False)
 
-    if current_coordinates == end_coordinates:
-        return "FOUND"
+    # nodes expanded in this iteration, reaching one again with the same g would repeat work
+    expanded = {start}
+    table[start] = start_g
+    path = [start]
+    on_path = {start}
+    children = _children(edges, estimate, start, start_g)
+    relaxed = len(children)
+    stack = [iter(children)]
+
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            # all children done, step back
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+
+        f, g, node = entry
+        if f > bound or f >= best_cost:
+            # the children are sorted by f, so the rest of them are over the bound too
+            if f > bound:
+                min_exceeded = min(min_exceeded, f)
+                if exceeded is not None and len(exceeded) < max_table_size:
+                    exceeded.append(f)
+                    exceeded.extend(rest[0] for rest in stack[-1])
+            stack[-1] = iter(())
+            continue
+        if node in on_path:
+            continue
+
+        known = table.get(node)
+        if known is not None and (g > known or (g == known and node in expanded)):
+            continue
+        if known is None and len(table) >= max_table_size:
+            # no room to remember the node, going on would repeat work exponentially
+            full = True
+            break
+        if known is None or g < known:
+            table[node] = g
+            visited[node] = path[-1]
+        expanded.add(node)
+
+        if node == end:
+            best_cost = g
+            best_path = path + [node]
+            if first_solution:
+                break
+            continue
+
+        expansions += 1
+        if known is not None:
+            reexpansions += 1
+        path.append(node)
+        on_path.add(node)
+        if len(path) > peak_depth:
+            peak_depth = len(path)
+        children = _children(edges, estimate, node, g)
+        relaxed += len(children)
+        stack.append(iter(children))
+
+    return (best_cost, best_path, min_exceeded, expansions,
+            (reexpansions, relaxed, peak_depth, full))
 
-    min_cost = float("inf")
 
-    # neighbors sorted by the combined cost of the path
+def _children(edges, estimate, node, g):
+    # (f, g, neighbor) of every neighbor, sorted by the combined cost of the path
     # from the start node and the heuristic estimate
-    neighbors = sorted(
-        graph.neighbors(current_coordinates),
-        key=lambda neighbor: (
-            g + graph[current_coordinates][neighbor]['weight'] +
-            heuristic(neighbor, end_coordinates)
-        )
-    )
-
-    # Explore the neighbors of the current node
-    for neighbor in neighbors:
-        # Calculate the distance from the start to the neighbor through the current node
-        distance = g + graph[current_coordinates][neighbor]['weight']
-        if distance < distances[neighbor]:
-            distances[neighbor] = distance
-            visited[neighbor] = current_coordinates
-
-            cost = search(neighbor, distance, bound)
-            if cost == "FOUND":
-                return "FOUND"
-            if cost < min_cost:
-                min_cost = cost
-
-    return min_cost
-
-
-def ida_star(graph, start_coordinates, end_coordinates):
+    children = [(g + weight + estimate(neighbor), g + weight, neighbor)
+                for neighbor, weight in edges(node)]
+    children.sort(key=_first)
+    return children
+
+
+class _lazyestimates(dict):
+    # node id -> estimate to the end node, computed the first time it is asked for
+    __slots__ = ('function',)
+
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, node):
+        value = self[node] = self.function(node)
+        return value
+
+
+def _networkx_functions(graph, end_coordinates, heuristic_function=None):
+    # edges(node) and estimate(node) for a networkx graph, estimates are computed once per node
+    adjacency = graph.adj
+    end_position = _position(graph, end_coordinates)
+    estimates = {}
+    if heuristic_function is None:
+        def heuristic_function(node, _):
+            return heuristic(_position(graph, node), end_position)
+
+    def edges(node):
+        return [(neighbor, data['weight']) for neighbor, data in adjacency[node].items()]
+
+    def estimate(node):
+        value = estimates.get(node)
+        if value is None:
+            value = estimates[node] = heuristic_function(node, end_coordinates)
+        return value
+
+    return edges, estimate
+
+
+def _csr_functions(graph, end, heuristic_function=None):
+    # edges(node) and estimate(node) for a csrgraph, working on the integer ids
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    # the estimates are computed when a node is first reached, not for every node up front.
+    # the default is the straight line in the units of the edge weights, a block of node ids
+    # at a time with numpy
+    if heuristic_function is None:
+        heuristic_function = straightline.of(graph)
+    if hasattr(heuristic_function, 'lazy_table'):
+        estimates = heuristic_function.lazy_table(graph.labels[end])
+    elif hasattr(heuristic_function, 'table'):
+        estimates = heuristic_function.table(graph.labels[end]).tolist()
+    else:
+        labels = graph.labels
+        end_label = labels[end]
+        estimates = _lazyestimates(lambda node: heuristic_function(labels[node], end_label))
+
+    # rows that are not in the arrays (the virtual nodes of a virtual_graph.csrview)
+    extra = graph.extra or {}
+    extra_targets = graph.extra_targets if extra else None
+    extra_weights = graph.extra_weights if extra else None
+
+    def edges(node):
+        row = extra.get(node)
+        if row is not None:
+            return [(extra_targets[i], extra_weights[i]) for i in range(*row)]
+        return [(targets[i], weights[i]) for i in range(offsets[node], offsets[node + 1])]
+
+    return edges, estimates.__getitem__
+
+
+def search(current_coordinates, g, bound, end_coordinates,
+           search_graph, distances=None, visited=None):
+    """
+    # Define the IDA* search function
+    one depth-first pass that stops at paths whose estimated cost is over the bound.
+    distances is the best g of each node (transposition table), visited the predecessors.
+    returns "FOUND", or the smallest estimated cost that was over the bound.
+    """
+    if distances is None:
+        distances = {}
+    if visited is None:
+        visited = {}
+    edges, estimate = _networkx_functions(search_graph, end_coordinates)
+    _, path, min_exceeded, _, _ = _threshold_pass(
+        current_coordinates, g, bound, end_coordinates, edges, estimate, distances, visited,
+        DEFAULT_TABLE_SIZE, None, True)
+    if path is not None:
+        return "FOUND"
+    return min_exceeded
+
+
+def ida_star(graph, start_coordinates, end_coordinates, max_table_size=DEFAULT_TABLE_SIZE,
+             heuristic_function=None, stats=None):
     """
     Define the ida_star function
+    graph is a networkx graph or a csrgraph.
+    heuristic_function(node, end) replaces the straight line estimate, for example landmarks.
+    stats is an optional search_stats.searchstats the work of the search is added to.
     """
-    distances = {}
-    for node in graph.nodes:
-        distances[node] = float("inf")
-    distances[start_coordinates] = 0
-
-    # for visited nodes
-    visited = {}
-
-    # Perform the IDA* search
-    bound = heuristic(start_coordinates, end_coordinates)
-    while True:
-        cost = search(start_coordinates, 0, bound, end_coordinates)
-        if cost == "FOUND":
-            break
-        if cost == float("inf"):
-            return []
-        bound = cost
+    engine = idastar(graph, max_table_size, heuristic_function=heuristic_function, stats=stats)
+    return engine.run(start_coordinates, end_coordinates)
 
-    # Reconstruct the shortest path
-    shortest_path = reconstruct_shortest_path(visited, start_coordinates, end_coordinates)
-    return shortest_path
 
+def _position(search_graph, node):
+    # position of a networkx node: the 'pos' attribute, or the label if it is a (lat, lon) pair
+    data = search_graph.nodes[node] if node in search_graph else {}
+    if 'pos' in data:
+        return data['pos']
+    if isinstance(node, tuple) and len(node) == 2:
+        return node
+    return None
 
 
 def reconstruct_shortest_path(visited, start_coordinates, end_coordinates):
@@ -0,0 +1,186 @@
+"""
+This module contains the ALT heuristic (A*, Landmarks, Triangle inequality).
+A few landmark nodes are picked far apart, and the shortest distances to and from each of them
+are computed once. For a node v and target t the triangle inequality gives
+    d(v, t) >= d(L, t) - d(L, v)   and   d(v, t) >= d(v, L) - d(t, L)
+so the largest of these over all landmarks is a lower bound in the same units as the weights.
+A search asks for the bounds to its target with lazy_table(), which computes them with numpy a
+block of node ids at a time, only for the blocks the search reaches.
+"""
+import random
+import networkx
+import numpy
+from csr_graph import csrgraph
+from dijkstra import daryheap
+from straight_line import BLOCK_SIZE
+
+DEFAULT_LANDMARK_COUNT = 8
+
+
+class landmarkset:
+    """
+    landmark distances of one graph, usable as heuristic_function of dijkstra() and ida_star().
+    from_landmark[i][v] is d(landmark i, v) and to_landmark[i][v] is d(v, landmark i),
+    both indexed by the csrgraph node id.
+    """
+    def __init__(self, index, landmarks, from_landmark, to_landmark):
+        self.index = index
+        self.landmarks = landmarks
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+        # infinity (unreachable) is replaced by a large value so the subtractions stay defined
+        self._from = _finite(from_landmark)
+        self._to = self._from if to_landmark is from_landmark else _finite(to_landmark)
+
+    def __call__(self, node, target):
+        """
+        lower bound of the distance from node to target (node labels)
+        """
+        return self.estimate(self.index[node], self.index[target])
+
+    def estimate(self, node_id, target_id):
+        """
+        lower bound of the distance between two node ids
+        """
+        forward = self._from[:, target_id] - self._from[:, node_id]
+        backward = self._to[:, node_id] - self._to[:, target_id]
+        return max(0.0, float(forward.max()), float(backward.max()))
+
+    def table(self, target):
+        """
+        lower bound from every node to the target (a node label), as one array by node id
+        """
+        return self._block(0, self._from.shape[1], self.index[target])
+
+    def lazy_table(self, target):
+        """
+        node id -> lower bound to the target (a node label), a dict that computes a block of
+        BLOCK_SIZE node ids with numpy the first time one of them is asked for
+        """
+        return _lazytable(self, self.index[target])
+
+    def _block(self, start, stop, target_id):
+        # lower bounds of the node ids start..stop-1 to target_id
+        forward = self._from[:, target_id, None] - self._from[:, start:stop]
+        backward = self._to[:, start:stop] - self._to[:, target_id, None]
+        return numpy.maximum(numpy.maximum(forward.max(axis=0), backward.max(axis=0)), 0.0)
+
+    def save(self, file_path):
+        """
+        write the landmark distances to a .npz file
+        """
+        numpy.savez(file_path, landmarks=numpy.asarray(self.landmarks),
+                    from_landmark=self.from_landmark, to_landmark=self.to_landmark)
+
+    @classmethod
+    def load(cls, file_path, graph):
+        """
+        read landmark distances written by save(), graph is the graph they were computed on
+        """
+        with numpy.load(file_path) as data:
+            from_landmark = data['from_landmark']
+            to_landmark = data['to_landmark']
+            landmarks = data['landmarks'].tolist()
+        index = _index_of(graph)
+        if from_landmark.shape[1] != len(index):
+            raise ValueError(f"{file_path} was computed for a graph with "
+                             f"{from_landmark.shape[1]} nodes, not {len(index)}")
+        if numpy.array_equal(from_landmark, to_landmark):
+            to_landmark = from_landmark
+        return cls(index, landmarks, from_landmark, to_landmark)
+
+
+class _lazytable(dict):
+    # node id -> lower bound, filled one block at a time
+    __slots__ = ('landmarks', 'target_id')
+
+    def __init__(self, landmarks, target_id):
+        super().__init__()
+        self.landmarks = landmarks
+        self.target_id = target_id
+
+    def __missing__(self, node_id):
+        start = node_id - node_id % BLOCK_SIZE
+        stop = min(start + BLOCK_SIZE, self.landmarks._from.shape[1])
+        values = self.landmarks._block(start, stop, self.target_id)
+        self.update(zip(range(start, stop), values.tolist()))
+        return self[node_id]
+
+
+def select_landmarks(graph, count=DEFAULT_LANDMARK_COUNT, seed=0):
+    """
+    pick count landmarks by farthest-point selection and compute their distance arrays.
+    the first landmark is the node farthest from a random node, every next one is the node
+    farthest from all landmarks picked so far.
+    """
+    if isinstance(graph, networkx.Graph):
+        graph = csrgraph.from_networkx(graph)
+    node_count = len(graph)
+    reverse = graph.reverse()
+
+    rng = random.Random(seed)
+    closest = distances_from(graph, rng.randrange(node_count))
+    landmarks = []
+    from_landmark = []
+    to_landmark = []
+    for _ in range(min(count, node_count)):
+        reachable = numpy.isfinite(closest)
+        if landmarks and not reachable.any():
+            break
+        candidates = numpy.where(reachable, closest, -1.0)
+        landmark = int(candidates.argmax())
+        if landmark in landmarks:
+            break
+        landmarks.append(landmark)
+        from_landmark.append(distances_from(graph, landmark))
+        to_landmark.append(from_landmark[-1] if reverse is graph
+                           else distances_from(reverse, landmark))
+        if len(landmarks) == 1:
+            closest = from_landmark[-1].copy()
+        else:
+            numpy.minimum(closest, from_landmark[-1], out=closest)
+
+    from_landmark = numpy.array(from_landmark)
+    to_landmark = from_landmark if reverse is graph else numpy.array(to_landmark)
+    return landmarkset(graph.index, landmarks, from_landmark, to_landmark)
+
+
+def distances_from(graph, start):
+    """
+    shortest distance from the node id start to every node id of a csrgraph, inf if unreachable
+    """
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    infinity = float("inf")
+    distances = [infinity] * len(graph)
+    distances[start] = 0.0
+    queue = daryheap(capacity=len(graph))
+    position = queue.position
+    queue.push(start, 0.0)
+    while not queue.is_empty():
+        current_distance, current_node = queue.pop()
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = targets[i]
+            distance = current_distance + weights[i]
+            if distance < distances[neighbor]:
+                distances[neighbor] = distance
+                if position[neighbor] >= 0:
+                    queue.update(neighbor, distance)
+                else:
+                    queue.push(neighbor, distance)
+    return numpy.array(distances)
+
+
+def _finite(distances):
+    # unreachable nodes get a value larger than any real distance
+    finite = numpy.isfinite(distances)
+    large = 2 * (distances[finite].max() if finite.any() else 1) + 1
+    return numpy.where(finite, distances, large)
+
+
+def _index_of(graph):
+    # label -> node id, in the same order csrgraph.from_networkx() gives
+    if isinstance(graph, csrgraph):
+        return graph.index
+    return {label: node_id for node_id, label in enumerate(graph.nodes)}
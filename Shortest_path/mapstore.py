@@ -0,0 +1,197 @@
+"""
+This module contains the store of rendered maps, so the maps are not written into templates/.
+A map is kept under the sha256 of its HTML (the same map gets the same key), in memory with
+limits on total size, count and age. The least recently used maps are dropped first, or moved to
+a spill directory (also limited in size) when one is given.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+# how long a map can be shown after it was made, in seconds
+DEFAULT_MAX_AGE = 3600
+DEFAULT_MAX_SPILL_BYTES = 256 * 1024 * 1024
+
+# keys are made by put(), anything else (like a path) is never looked up
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}\.html')
+
+
+def map_key(html):
+    """
+    the key of a map: sha256 of the HTML, with the .html suffix
+    """
+    return hashlib.sha256(html).hexdigest() + '.html'
+
+
+class mapstore:
+    """
+    rendered maps by key. spill_directory None keeps the maps in memory only.
+    hits, spill_hits, misses and evictions count the lookups and dropped maps.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age=DEFAULT_MAX_AGE, spill_directory=None,
+                 max_spill_bytes=DEFAULT_MAX_SPILL_BYTES, clock=time.time):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.spill_directory = spill_directory
+        self.max_spill_bytes = max_spill_bytes
+        self.clock = clock
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (html bytes, creation time), least recently used first
+        self._memory = OrderedDict()
+        self._bytes = 0
+        # key -> (size, creation time) of the spilled maps, oldest spilled first
+        self._spilled = OrderedDict()
+        self._spilled_bytes = 0
+        self._lock = threading.Lock()
+        if spill_directory is not None:
+            os.makedirs(spill_directory, exist_ok=True)
+
+    def put(self, html):
+        """
+        store a rendered map (str or bytes) and return its key
+        """
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        key = map_key(html)
+        now = self.clock()
+        with self._lock:
+            if key in self._memory:
+                self._bytes -= len(self._memory[key][0])
+            self._forget_spilled(key)
+            self._memory[key] = (html, now)
+            self._memory.move_to_end(key)
+            self._bytes += len(html)
+            self._evict(now)
+        return key
+
+    def get(self, key):
+        """
+        HTML bytes of the map, None if it is unknown, expired or was dropped
+        """
+        if not KEY_PATTERN.fullmatch(key):
+            with self._lock:
+                self.misses += 1
+            return None
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(key)
+
+            entry = self._read_spilled(key, now)
+            if entry is not None:
+                # back to memory, the file is not needed any more
+                self._forget_spilled(key)
+                self._memory[key] = entry
+                self._bytes += len(entry[0])
+                self._evict(now)
+                self.hits += 1
+                self.spill_hits += 1
+                return entry[0]
+
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._spilled
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory) + len(self._spilled)
+
+    def clear(self):
+        """
+        remove every map, in memory and spilled
+        """
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+            for key in list(self._spilled):
+                self._forget_spilled(key)
+
+    def stats(self):
+        """
+        counters and size of the store
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'spill_hits': self.spill_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._memory),
+                'bytes': self._bytes,
+                'spilled_entries': len(self._spilled),
+                'spilled_bytes': self._spilled_bytes,
+            }
+
+    def _evict(self, now):
+        # callers hold the lock. expired maps go first, then the least recently used ones
+        for key in [key for key, entry in self._memory.items() if now - entry[1] >= self.max_age]:
+            self._drop(key)
+        while self._memory and (len(self._memory) > self.max_entries
+                                or self._bytes > self.max_bytes):
+            key, (html, created) = self._memory.popitem(last=False)
+            self._bytes -= len(html)
+            self.evictions += 1
+            self._spill(key, html, created, now)
+
+    def _drop(self, key):
+        html = self._memory.pop(key)[0]
+        self._bytes -= len(html)
+        self.evictions += 1
+
+    def _spill(self, key, html, created, now):
+        if self.spill_directory is None or len(html) > self.max_spill_bytes:
+            return
+        with open(self._spill_path(key), 'wb') as file:
+            file.write(html)
+        self._spilled[key] = (len(html), created)
+        self._spilled_bytes += len(html)
+        while self._spilled_bytes > self.max_spill_bytes:
+            self._forget_spilled(next(iter(self._spilled)))
+        for old_key in [old_key for old_key, (_, old_created) in self._spilled.items()
+                        if now - old_created >= self.max_age]:
+            self._forget_spilled(old_key)
+
+    def _read_spilled(self, key, now):
+        spilled = self._spilled.get(key)
+        if spilled is None:
+            return None
+        if now - spilled[1] >= self.max_age:
+            self._forget_spilled(key)
+            return None
+        try:
+            with open(self._spill_path(key), 'rb') as file:
+                return file.read(), spilled[1]
+        except OSError:
+            self._forget_spilled(key)
+            return None
+
+    def _forget_spilled(self, key):
+        spilled = self._spilled.pop(key, None)
+        if spilled is None:
+            return
+        self._spilled_bytes -= spilled[0]
+        try:
+            os.remove(self._spill_path(key))
+        except OSError:
+            pass
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_directory, key)
@@ -0,0 +1,193 @@
+"""
+This module contains the distance matrix between many sources and many targets.
+One Dijkstra search runs per source (or per target on the reversed graph, if there are fewer
+targets) and stops as soon as every requested target is settled, instead of one search per pair.
+The searches only touch the nodes they reach, there is no O(V) set up per search.
+Rows can be spread over a process pool, every worker gets the graph once.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import networkx
+import numpy
+from csr_graph import csrgraph
+from dijkstra import daryheap
+from graph_file import open_graph
+
+# a matrix is split into this many parts for the process pool
+POOL_CHUNKS = 32
+
+# the graph of a pool worker process, set by _init_worker()
+_worker_graph = None
+
+
+def one_to_many(graph, source, targets):
+    """
+    shortest distances from the node id source to the node ids targets of a csrgraph,
+    as a numpy array (inf where a target can not be reached)
+    """
+    offsets = graph.offsets
+    edge_targets = graph.targets
+    weights = graph.weights
+    # target id -> columns of the result, the same target can be asked more than once
+    columns = {}
+    for column, target in enumerate(targets):
+        columns.setdefault(target, []).append(column)
+    result = numpy.full(len(targets), numpy.inf)
+    remaining = len(columns)
+
+    # only reached nodes are in distances
+    distances = {source: 0.0}
+    settled = set()
+    queue = daryheap()
+    position = queue.position
+    queue.push(source, 0.0)
+    while remaining:
+        entry = queue.pop()
+        if entry is None:
+            break
+        current_distance, current_node = entry
+        settled.add(current_node)
+        if current_node in columns:
+            result[columns[current_node]] = current_distance
+            remaining -= 1
+            if not remaining:
+                break
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = edge_targets[i]
+            if neighbor in settled:
+                continue
+            distance = current_distance + weights[i]
+            if distance < distances.get(neighbor, numpy.inf):
+                distances[neighbor] = distance
+                if position[neighbor] >= 0:
+                    queue.update(neighbor, distance)
+                else:
+                    queue.push(neighbor, distance)
+    return result
+
+
+def one_to_many_paths(graph, source, targets):
+    """
+    one_to_many() with the paths: a list of (node ids from source to the target, distance)
+    for the node ids targets of a csrgraph, (None, inf) where a target can not be reached
+    """
+    offsets = graph.offsets
+    edge_targets = graph.targets
+    weights = graph.weights
+    remaining = set(targets)
+
+    distances = {source: 0.0}
+    # node -> the node before it on its shortest path
+    predecessors = {source: None}
+    settled = set()
+    queue = daryheap()
+    position = queue.position
+    queue.push(source, 0.0)
+    while remaining:
+        entry = queue.pop()
+        if entry is None:
+            break
+        current_distance, current_node = entry
+        settled.add(current_node)
+        remaining.discard(current_node)
+        if not remaining:
+            break
+        for i in range(offsets[current_node], offsets[current_node + 1]):
+            neighbor = edge_targets[i]
+            if neighbor in settled:
+                continue
+            distance = current_distance + weights[i]
+            if distance < distances.get(neighbor, numpy.inf):
+                distances[neighbor] = distance
+                predecessors[neighbor] = current_node
+                if position[neighbor] >= 0:
+                    queue.update(neighbor, distance)
+                else:
+                    queue.push(neighbor, distance)
+
+    paths = []
+    for target in targets:
+        if target not in settled:
+            paths.append((None, numpy.inf))
+            continue
+        path = [target]
+        while predecessors[path[-1]] is not None:
+            path.append(predecessors[path[-1]])
+        path.reverse()
+        paths.append((path, distances[target]))
+    return paths
+
+
+def distance_matrix(graph, sources, targets, processes=None, pool=None, graph_path=None):
+    """
+    matrix[i][j] is the shortest distance from sources[i] to targets[j] (node labels),
+    numpy.inf if there is no path. graph is a csrgraph or a networkx graph.
+    see distance_matrix_ids() for processes, pool and graph_path.
+    """
+    if isinstance(graph, networkx.Graph):
+        graph = csrgraph.from_networkx(graph)
+    index = graph.index
+    unknown = [label for label in list(sources) + list(targets) if label not in index]
+    if unknown:
+        raise KeyError(f"nodes not in the graph: {unknown[:10]}")
+    return distance_matrix_ids(graph, [index[label] for label in sources],
+                               [index[label] for label in targets], processes, pool, graph_path)
+
+
+def distance_matrix_ids(graph, sources, targets, processes=None, pool=None, graph_path=None):
+    """
+    distance_matrix() for node ids of a csrgraph.
+    pool is an executor made by matrix_pool() for the same graph, else with processes > 1
+    a pool is made for this call only. graph_path (a graph file of the same graph) lets
+    the workers open the file instead of receiving a copy of the graph.
+    """
+    sources = list(sources)
+    targets = list(targets)
+    if not sources or not targets:
+        return numpy.zeros((len(sources), len(targets)))
+    # fewer searches: search backward from each target when there are fewer targets
+    transposed = len(targets) < len(sources)
+    if transposed:
+        sources, targets = targets, sources
+
+    # the pool workers hold the graph as it was given, they reverse it themselves
+    if pool is not None:
+        rows = _pool_rows(pool, sources, targets, transposed)
+    elif processes is not None and processes > 1:
+        with matrix_pool(graph, processes, graph_path) as own_pool:
+            rows = _pool_rows(own_pool, sources, targets, transposed)
+    else:
+        search_graph = graph.reverse() if transposed else graph
+        rows = [one_to_many(search_graph, source, targets) for source in sources]
+
+    matrix = numpy.vstack(rows)
+    return matrix.T.copy() if transposed else matrix
+
+
+def matrix_pool(graph, processes, graph_path=None):
+    """
+    process pool for distance_matrix_ids(), every worker gets the graph once when it starts:
+    it opens graph_path if given, otherwise the graph is sent to it.
+    """
+    return ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                               initargs=(graph_path or graph,))
+
+
+def _pool_rows(pool, sources, targets, transposed):
+    # sources go to the workers in POOL_CHUNKS parts, so one slow part does not hold up the rest
+    size = max(1, -(-len(sources) // POOL_CHUNKS))
+    chunks = [sources[i:i + size] for i in range(0, len(sources), size)]
+    rows = []
+    for chunk_rows in pool.map(_worker_rows, chunks, [targets] * len(chunks),
+                               [transposed] * len(chunks)):
+        rows.extend(chunk_rows)
+    return rows
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = open_graph(graph) if isinstance(graph, str) else graph
+
+
+def _worker_rows(sources, targets, reverse):
+    graph = _worker_graph.reverse() if reverse else _worker_graph
+    return [one_to_many(graph, source, targets) for source in sources]
@@ -0,0 +1,211 @@
+"""
+This module contains the metrics of the program: counters and latency histograms that are shown
+on /metrics in the Prometheus text format.
+A metric has label names, every combination of label values is counted on its own.
+A disabled registry hands out metrics that do nothing, so the measured code does not change
+and the cost is one method call that returns at once.
+"""
+import bisect
+import contextlib
+import threading
+import time
+
+# upper bounds (seconds) of the histogram buckets, from a cached lookup to a slow external call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+# the timer of a disabled histogram, one shared object
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class metricsregistry:
+    """
+    the metrics of the program, render() gives them in the Prometheus text format.
+    enabled=False makes every metric a no-op and render() empty.
+    """
+    def __init__(self, enabled=True, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self._metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        """
+        new counter, inc(*label_values) adds to it
+        """
+        metric = counter(name, help_text, label_names) if self.enabled else _nullmetric()
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        new histogram, observe(seconds, *label_values) or "with histogram.time(*label_values):"
+        """
+        if not self.enabled:
+            metric = _nullmetric()
+        else:
+            metric = histogram(name, help_text, label_names, buckets, self.clock)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        every metric in the Prometheus text exposition format (version 0.0.4)
+        """
+        return ''.join(metric.render() for metric in self._metrics)
+
+
+class counter:
+    """
+    counts per label values, only goes up
+    """
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """
+        add amount to the count of the label values
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """
+        the count of the label values
+        """
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        """
+        the counter in the Prometheus text format
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}\n", f"# TYPE {self.name} counter\n"]
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} "
+                         f"{_number(value)}\n")
+        return ''.join(lines)
+
+
+class histogram:
+    """
+    distribution of durations (or any values) per label values, in buckets with upper bounds
+    """
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS,
+                 clock=time.perf_counter):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.clock = clock
+        # label values -> [count of each bucket and the +Inf bucket, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        count one value
+        """
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def time(self, *label_values):
+        """
+        context manager that observes how long its block takes
+        """
+        return _timer(self, label_values)
+
+    def count(self, *label_values):
+        """
+        number of values counted for the label values
+        """
+        with self._lock:
+            series = self._series.get(label_values)
+            return sum(series[0]) if series else 0
+
+    def render(self):
+        """
+        the histogram in the Prometheus text format, the buckets are cumulative
+        """
+        with self._lock:
+            series = sorted((label_values, list(counts), total)
+                            for label_values, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}\n", f"# TYPE {self.name} histogram\n"]
+        names = self.label_names + ('le',)
+        for label_values, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _labels(names, label_values + (_number(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}\n")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}\n")
+            lines.append(f"{self.name}_count{labels} {cumulative}\n")
+        return ''.join(lines)
+
+
+class _timer:
+    # with histogram.time(...): the time of the block goes to the histogram
+    __slots__ = ('histogram', 'label_values', 'started')
+
+    def __init__(self, histogram_metric, label_values):
+        self.histogram = histogram_metric
+        self.label_values = label_values
+        self.started = None
+
+    def __enter__(self):
+        self.started = self.histogram.clock()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(self.histogram.clock() - self.started, *self.label_values)
+        return False
+
+
+class _nullmetric:
+    # counter and histogram of a disabled registry, nothing is counted
+    def inc(self, *label_values, amount=1):
+        pass
+
+    def observe(self, value, *label_values):
+        pass
+
+    def time(self, *label_values):
+        return _NULL_TIMER
+
+    def value(self, *label_values):
+        return 0
+
+    def count(self, *label_values):
+        return 0
+
+    def render(self):
+        return ''
+
+
+def _labels(names, values):
+    # {name="value",...}, nothing when there are no labels
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    # Prometheus writes infinity as +Inf
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
@@ -0,0 +1,214 @@
+"""
+This module contains the loader of OpenStreetMap road networks.
+OSM XML is read with a streaming parser (every element is dropped as soon as it is read), and
+.pbf files are read with the osmium package when it is installed. Only ways a car can drive on
+are kept, one way streets get an edge in one direction only, and all edge lengths (meters) are
+computed in one numpy pass. The result is a csrgraph, node labels are the OSM node ids.
+"""
+import time
+import xml.etree.ElementTree as ElementTree
+from array import array
+import numpy
+from csr_graph import csrgraph
+from geo import haversine
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+# highway values of roads for cars
+DRIVABLE_HIGHWAYS = frozenset((
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road'))
+
+# access values that close a road to cars
+NO_ACCESS = frozenset(('no', 'private'))
+
+
+class osmloader:
+    """
+    reads OSM files into a csrgraph.
+    after load(), elements, nodes, ways, drivable_ways and seconds tell how much was read
+    and how long it took, stats() also gives elements per second.
+    """
+    def __init__(self, highways=DRIVABLE_HIGHWAYS, clock=time.perf_counter):
+        self.highways = highways
+        self.clock = clock
+        self.elements = 0
+        self.nodes = 0
+        self.ways = 0
+        self.drivable_ways = 0
+        self.seconds = 0.0
+        self._reset()
+
+    def load(self, file_path):
+        """
+        road graph of an .osm (XML) or .osm.pbf file
+        """
+        self.elements = self.nodes = self.ways = self.drivable_ways = 0
+        self._reset()
+        started = self.clock()
+        if file_path.endswith('.pbf'):
+            self._read_pbf(file_path)
+        else:
+            self._read_xml(file_path)
+        graph = self._build()
+        self.seconds = self.clock() - started
+        self._reset()
+        return graph
+
+    def stats(self):
+        """
+        counters and throughput of the last load()
+        """
+        return {
+            'elements': self.elements,
+            'nodes': self.nodes,
+            'ways': self.ways,
+            'drivable_ways': self.drivable_ways,
+            'seconds': self.seconds,
+            'elements_per_second': self.elements / self.seconds if self.seconds else 0.0,
+        }
+
+    def _reset(self):
+        # node id and coordinates of every node, and the (from, to) OSM ids of the road edges
+        self._node_ids = array('q')
+        self._lat = array('d')
+        self._lon = array('d')
+        self._sources = array('q')
+        self._targets = array('q')
+
+    def _read_xml(self, file_path):
+        tags = {}
+        refs = []
+        root = None
+        for event, element in ElementTree.iterparse(file_path, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            tag = element.tag
+            if tag == 'nd':
+                refs.append(int(element.get('ref')))
+            elif tag == 'tag':
+                tags[element.get('k')] = element.get('v')
+            elif tag == 'node':
+                self.elements += 1
+                self.nodes += 1
+                self._node_ids.append(int(element.get('id')))
+                self._lat.append(float(element.get('lat')))
+                self._lon.append(float(element.get('lon')))
+                tags.clear()
+                root.clear()
+            elif tag == 'way':
+                self.elements += 1
+                self._way(refs, tags)
+                refs = []
+                tags.clear()
+                root.clear()
+            elif tag == 'relation':
+                self.elements += 1
+                refs = []
+                tags.clear()
+                root.clear()
+
+    def _read_pbf(self, file_path):
+        if osmium is None:
+            raise ImportError("reading .pbf files needs the osmium package (pip install osmium)")
+        loader = self
+
+        class handler(osmium.SimpleHandler):
+            # osmium calls node() and way() for every element of the file
+            def node(self, node):
+                loader.elements += 1
+                loader.nodes += 1
+                loader._node_ids.append(node.id)
+                loader._lat.append(node.location.lat)
+                loader._lon.append(node.location.lon)
+
+            def way(self, way):
+                loader.elements += 1
+                loader._way([ref.ref for ref in way.nodes], dict(way.tags))
+
+            def relation(self, _):
+                loader.elements += 1
+
+        handler().apply_file(file_path)
+
+    def _way(self, refs, tags):
+        # keep the edges of a way cars can drive on, in the allowed directions
+        self.ways += 1
+        if tags.get('highway') not in self.highways or tags.get('area') == 'yes':
+            return
+        if tags.get('access') in NO_ACCESS or tags.get('motor_vehicle') in NO_ACCESS:
+            return
+        self.drivable_ways += 1
+        forward, backward = _directions(tags)
+        for u, v in zip(refs, refs[1:]):
+            if u == v:
+                continue
+            if forward:
+                self._sources.append(u)
+                self._targets.append(v)
+            if backward:
+                self._sources.append(v)
+                self._targets.append(u)
+
+    def _build(self):
+        # OSM ids to node ids, only the nodes used by a road are kept
+        node_ids = numpy.frombuffer(self._node_ids, dtype=numpy.int64)
+        lat = numpy.frombuffer(self._lat, dtype=numpy.float64)
+        lon = numpy.frombuffer(self._lon, dtype=numpy.float64)
+        sources = numpy.frombuffer(self._sources, dtype=numpy.int64)
+        targets = numpy.frombuffer(self._targets, dtype=numpy.int64)
+
+        order = numpy.argsort(node_ids, kind='stable')
+        sorted_ids = node_ids[order]
+        source_slots = _lookup(sorted_ids, sources)
+        target_slots = _lookup(sorted_ids, targets)
+        # edges to nodes that are not in the file (cut off by the extract) are dropped
+        known = (source_slots >= 0) & (target_slots >= 0)
+        source_nodes = order[source_slots[known]]
+        target_nodes = order[target_slots[known]]
+
+        used, compact = numpy.unique(numpy.concatenate((source_nodes, target_nodes)),
+                                     return_inverse=True)
+        edge_count = len(source_nodes)
+        weights = haversine(lat[source_nodes], lon[source_nodes],
+                            lat[target_nodes], lon[target_nodes])
+        return csrgraph.from_arrays(node_ids[used].tolist(), compact[:edge_count],
+                                    compact[edge_count:], weights, lat[used], lon[used],
+                                    directed=True)
+
+
+def load_osm(file_path):
+    """
+    road graph of an .osm or .osm.pbf file, see osmloader
+    """
+    return osmloader().load(file_path)
+
+
+def _directions(tags):
+    # (forward, backward) directions a way can be driven in
+    oneway = tags.get('oneway')
+    if oneway in ('yes', 'true', '1'):
+        return True, False
+    if oneway in ('-1', 'reverse'):
+        return False, True
+    if oneway == 'no':
+        return True, True
+    # motorways and roundabouts are one way unless tagged otherwise
+    if tags.get('highway') in ('motorway', 'motorway_link') or \
+            tags.get('junction') in ('roundabout', 'circular'):
+        return True, False
+    return True, True
+
+
+def _lookup(sorted_ids, ids):
+    # position of each id in sorted_ids, -1 where it is missing
+    if not len(sorted_ids):
+        return numpy.full(len(ids), -1, dtype=numpy.int64)
+    slots = numpy.minimum(numpy.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return numpy.where(sorted_ids[slots] == ids, slots, -1)
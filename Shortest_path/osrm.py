@@ -0,0 +1,126 @@
+"""
+This module contains the client for the OSRM routing service that gives the drawn route geometry.
+It keeps one requests.Session (keep-alive connections, retries) for all requests, and caches the
+decoded geometries, so repeated or nearby routes do not call the service again.
+"""
+import threading
+from collections import OrderedDict
+import polyline
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_OSRM_URL = "http://router.project-osrm.org"
+DEFAULT_CACHE_SIZE = 1024
+# coordinates are rounded to this many decimals for the cache key, 4 decimals is about 10 m
+DEFAULT_PRECISION = 4
+
+
+class osrmclient:
+    """
+    route geometries from an OSRM server.
+    base_url can point to a local OSRM (or a stand-in for tests).
+    hits and misses count the cache lookups.
+    """
+    def __init__(self, base_url=DEFAULT_OSRM_URL, timeout=5, retries=3,
+                 cache_size=DEFAULT_CACHE_SIZE, precision=DEFAULT_PRECISION, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # retry connection errors and overloaded server answers, with a growing pause
+        retry = Retry(total=retries, backoff_factor=0.3,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def route(self, start_coordinates, end_coordinates):
+        """
+        driving route between two (lat, lon) points, as a list of (lat, lon)
+        """
+        coordinates = self.cached(start_coordinates, end_coordinates)
+        if coordinates is not None:
+            return coordinates
+        url = route_url(self.base_url, start_coordinates, end_coordinates)
+        coordinates = route_geometry(self.session.get(url, timeout=self.timeout).json())
+        self.remember(start_coordinates, end_coordinates, coordinates)
+        return coordinates
+
+    def cached(self, start_coordinates, end_coordinates):
+        """
+        the cached route, None if it is not cached. counts a hit or a miss
+        """
+        key = self._key(start_coordinates, end_coordinates)
+        with self._lock:
+            coordinates = self._cache.get(key)
+            if coordinates is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return coordinates
+            self.misses += 1
+            return None
+
+    def remember(self, start_coordinates, end_coordinates, coordinates):
+        """
+        put a route into the cache, also used by the async client of the ASGI app
+        """
+        key = self._key(start_coordinates, end_coordinates)
+        with self._lock:
+            self._cache[key] = coordinates
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _key(self, start_coordinates, end_coordinates):
+        return (round(start_coordinates[0], self.precision),
+                round(start_coordinates[1], self.precision),
+                round(end_coordinates[0], self.precision),
+                round(end_coordinates[1], self.precision))
+
+    def stats(self):
+        """
+        cache counters and size
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}
+
+    def close(self):
+        """
+        close the pooled connections
+        """
+        self.session.close()
+
+
+def route_url(base_url, start_coordinates, end_coordinates):
+    """
+    OSRM route request of two (lat, lon) points
+    """
+    # OSRM wants longitude first
+    return (f"{base_url}/route/v1/driving/"
+            f"{start_coordinates[1]},{start_coordinates[0]};"
+            f"{end_coordinates[1]},{end_coordinates[0]}")
+
+
+def route_geometry(response):
+    """
+    the route of a decoded OSRM JSON answer as a list of (lat, lon)
+    """
+    # Check if the 'routes' key exists in the response
+    if 'routes' not in response or not response['routes']:
+        raise ValueError("Missing 'routes' key in API response")
+
+    route = response['routes'][0]
+    # Check if the 'geometry' key exists in the route
+    if 'geometry' not in route:
+        raise ValueError("Missing 'geometry' key in route")
+
+    # Decode the encoded polyline to obtain the coordinates
+    return polyline.decode(route['geometry'])
@@ -0,0 +1,120 @@
+"""
+This module contains the geometry of a found path and its compact output forms.
+The coordinates of a path come straight from the lat and lon arrays of the csrgraph with one
+numpy index, and the segment lengths from one vectorized haversine call. A path can be given
+as a list of [lat, lon], a Google encoded polyline (a few bytes per point), a GeoJSON
+LineString or a flat numpy array.
+"""
+import numpy
+from geo import haversine
+
+# output forms of a path in the JSON answers
+PATH_FORMATS = ('coordinates', 'polyline', 'geojson')
+
+# most 5 bit chunks of one encoded value, enough for any longitude at precision 6
+_CHUNKS = 7
+_SHIFTS = numpy.arange(_CHUNKS, dtype=numpy.int64) * 5
+
+
+class pathgeometry:
+    """
+    geometry of a path: coordinates is an (n, 2) numpy array of (lat, lon) in degrees,
+    segments the n - 1 straight segment lengths in meters and distance their sum.
+    """
+    __slots__ = ('coordinates', 'segments', 'distance')
+
+    def __init__(self, coordinates):
+        coordinates = numpy.asarray(coordinates, dtype=numpy.float64).reshape(-1, 2)
+        self.coordinates = coordinates
+        lat = coordinates[:, 0]
+        lon = coordinates[:, 1]
+        self.segments = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        self.distance = float(self.segments.sum())
+
+    @classmethod
+    def from_nodes(cls, graph, node_ids):
+        """
+        geometry of a path of node ids of a csrgraph with coordinates
+        """
+        ids = numpy.asarray(node_ids, dtype=numpy.int64)
+        lat = numpy.frombuffer(graph.lat, dtype=numpy.float64)[ids]
+        lon = numpy.frombuffer(graph.lon, dtype=numpy.float64)[ids]
+        return cls(numpy.column_stack((lat, lon)))
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def points(self):
+        """
+        the coordinates as a list of (lat, lon) tuples
+        """
+        return list(map(tuple, self.coordinates.tolist()))
+
+    def flat(self):
+        """
+        the coordinates as one flat numpy array lat0, lon0, lat1, lon1, ...
+        """
+        return self.coordinates.ravel()
+
+    def polyline(self, precision=5):
+        """
+        the coordinates as a Google encoded polyline
+        """
+        return encode_polyline(self.coordinates, precision)
+
+    def geojson(self):
+        """
+        the path as a GeoJSON Feature with a LineString (lon, lat order), the distance and
+        the segment lengths are its properties
+        """
+        return {'type': 'Feature',
+                'geometry': {'type': 'LineString',
+                             'coordinates': self.coordinates[:, ::-1].tolist()},
+                'properties': {'distance': self.distance, 'segments': self.segments.tolist()}}
+
+    def output(self, path_format='coordinates'):
+        """
+        the path for a JSON answer in one of PATH_FORMATS, as a dict of answer fields
+        """
+        if path_format == 'coordinates':
+            return {'path': self.coordinates.tolist(), 'segments': self.segments.tolist()}
+        if path_format == 'polyline':
+            return {'polyline': self.polyline(), 'segments': self.segments.tolist()}
+        if path_format == 'geojson':
+            return {'geojson': self.geojson()}
+        raise ValueError(f"path format must be one of {', '.join(PATH_FORMATS)}")
+
+
+def encode_polyline(coordinates, precision=5):
+    """
+    Google encoded polyline of (lat, lon) pairs, the same string as polyline.encode()
+    """
+    coordinates = numpy.asarray(coordinates, dtype=numpy.float64).reshape(-1, 2)
+    if not len(coordinates):
+        return ''
+    # rounded half away from zero, like the reference implementation
+    scaled = coordinates * 10 ** precision
+    values = (numpy.sign(scaled) * numpy.floor(numpy.abs(scaled) + 0.5)).astype(numpy.int64)
+    deltas = numpy.diff(values, axis=0, prepend=numpy.zeros((1, 2), dtype=numpy.int64)).ravel()
+    # the sign goes to the lowest bit
+    values = numpy.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # 5 bit chunks from the lowest, all but the last one of a value get 0x20, then + 63
+    remaining = values[:, None] >> _SHIFTS
+    counts = numpy.maximum(1, numpy.count_nonzero(remaining, axis=1))
+    positions = numpy.arange(_CHUNKS)
+    chars = (remaining & 31) + 63 + 32 * (positions < counts[:, None] - 1)
+    return chars[positions < counts[:, None]].astype(numpy.uint8).tobytes().decode('ascii')
+
+
+def path_weight(graph, node_ids):
+    """
+    sum of the edge weights along a path of node ids of a csrgraph,
+    the shortest edge where there are parallel ones
+    """
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    total = 0.0
+    for u, v in zip(node_ids, node_ids[1:]):
+        total += min(weights[i] for i in range(offsets[u], offsets[u + 1]) if targets[i] == v)
+    return total
@@ -0,0 +1,41 @@
+"""
+This module contains a thread-safe rate limiter for calls to external services.
+"""
+import threading
+import time
+
+
+class ratelimiter:
+    """
+    lets at most rate calls per second through, spread evenly.
+    acquire() reserves the next free time slot and sleeps until it, outside the lock,
+    so waiting threads do not block each other from reserving. rate None means no limit.
+    reserve() only reserves, for callers that wait in their own way (asyncio.sleep).
+    """
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        wait until the next call is allowed, returns the time waited in seconds
+        """
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def reserve(self):
+        """
+        reserve the next free time slot, returns the seconds until it (the caller waits them)
+        """
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
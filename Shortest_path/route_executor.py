@@ -0,0 +1,223 @@
+"""
+This module contains the execution of route searches on worker processes.
+The searches are pure Python, so threads of one process take turns on the GIL. routeexecutor
+sends them to a pool of processes instead, every worker gets the read-only road graph once when
+it starts (inherited when the pool forks, or opened from the graph file), so a query only sends
+its two points and gets the road route back.
+At most max_pending queries wait or run at once, further ones are refused at once (saturated),
+and a caller waits at most timeout seconds for its result.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra
+from geo import point_distance
+from graph_file import open_spatial_index
+from ida_star import ida_star
+from matrix import one_to_many_paths
+from path_geometry import pathgeometry, path_weight
+from straight_line import straightline
+from virtual_graph import virtualgraph, csrview
+
+ALGORITHMS = ('ida_star', 'dijkstra', 'bidirectional')
+# pending queries per worker process
+DEFAULT_QUEUE_PER_PROCESS = 4
+DEFAULT_TIMEOUT = 30.0
+
+# the graph and spatial index of a worker process, set by _init_worker()
+_worker_graph = None
+_worker_index = None
+
+
+class saturated(RuntimeError):
+    """
+    raised by routeexecutor.search() when max_pending queries are already waiting or running
+    """
+
+
+def search_road_route(graph, index, start_coordinates, end_coordinates, algorithm):
+    """
+    run the search, returns (coordinates of the road nodes on the path, their distance),
+    (None, None) if there is no path
+    """
+    # the start and end points are joined to the nearest road nodes by virtual edges,
+    # which only exist in this query's view, road_graph itself is not changed.
+    # on a csrgraph the view keeps the searches on the integer ids and the road arrays
+    # road edges are in meters, so are the virtual edges
+    endpoints = {'start': start_coordinates, 'end': end_coordinates}
+    if isinstance(graph, csrgraph):
+        view = csrview(graph, endpoints, distance=point_distance, index=index)
+    else:
+        view = virtualgraph(graph, endpoints, distance=point_distance, index=index)
+
+    if algorithm == 'ida_star':
+        shortest_path = ida_star(view, 'start', 'end',
+                                 heuristic_function=_straight_line_estimate(graph, view))
+    elif algorithm == 'dijkstra':
+        # dijkstra returns (path, predecessors), or [] when there is no path
+        result = dijkstra(view, 'start', 'end')
+        shortest_path = result[0] if result else []
+    elif algorithm == 'bidirectional':
+        result = bidirectional_dijkstra(view, 'start', 'end')
+        shortest_path = result[0] if result else []
+    else:
+        raise ValueError(f"Unknown algorithm '{algorithm}'")
+
+    if not shortest_path:
+        return None, None
+
+    # the path is start, the road nodes, end
+    road_path = shortest_path[1:-1]
+    if isinstance(graph, csrgraph):
+        # coordinates from the coordinate arrays and weights from the edge arrays
+        node_index = graph.index
+        node_ids = [node_index[node] for node in road_path]
+        if graph.lat is not None:
+            return pathgeometry.from_nodes(graph, node_ids).points(), path_weight(graph, node_ids)
+        return [view.position(node_id) for node_id in node_ids], path_weight(graph, node_ids)
+    distance = sum(view.adj[u][v]['weight'] for u, v in zip(road_path, road_path[1:]))
+    return [view.position(node) for node in road_path], distance
+
+
+class routeexecutor:
+    """
+    search_road_route() on processes worker processes for one road graph and its index.
+    graph_path (the graph file of the same graph) lets the workers open the file, otherwise
+    they get graph and index from the pool (for free when the pool forks).
+    max_pending is the most queries waiting or running at once, by default
+    DEFAULT_QUEUE_PER_PROCESS per process. completed, rejected and timeouts count the queries.
+    """
+    def __init__(self, graph, index, processes, max_pending=None, timeout=DEFAULT_TIMEOUT,
+                 graph_path=None):
+        if max_pending is None:
+            max_pending = processes * DEFAULT_QUEUE_PER_PROCESS
+        self.graph = graph
+        self.processes = processes
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        initargs = (graph_path, None) if graph_path else (graph, index)
+        self._pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                         initargs=initargs)
+
+    def search(self, start_coordinates, end_coordinates, algorithm, timeout=None):
+        """
+        search_road_route() on a worker, waits at most timeout seconds (self.timeout by default).
+        raises saturated when max_pending queries are pending, and TimeoutError when the result
+        is late. a late search still runs to its end on the worker and keeps its place until then
+        """
+        return self._run(timeout, _worker_search, start_coordinates, end_coordinates, algorithm)
+
+    def paths(self, source, targets, timeout=None):
+        """
+        matrix.one_to_many_paths() from the node id source to the node ids targets on a worker,
+        it counts as one query: same limits and exceptions as search()
+        """
+        return self._run(timeout, _worker_paths, source, targets)
+
+    def _run(self, timeout, function, *args):
+        # function(*args) on a worker, when fewer than max_pending queries are pending
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise saturated(f"{self._pending} route searches are pending")
+            self._pending += 1
+        try:
+            future = self._pool.submit(function, *args)
+        except Exception:
+            self._finished(None)
+            raise
+        future.add_done_callback(self._finished)
+        try:
+            result = future.result(self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # a search that has not started yet is dropped
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def pending(self):
+        """
+        number of queries waiting or running
+        """
+        with self._lock:
+            return self._pending
+
+    def stats(self):
+        """
+        counters of the executor
+        """
+        with self._lock:
+            return {'processes': self.processes, 'max_pending': self.max_pending,
+                    'pending': self._pending, 'completed': self.completed,
+                    'rejected': self.rejected, 'timeouts': self.timeouts}
+
+    def close(self, wait=True):
+        """
+        stop the worker processes, queries that have not started are dropped
+        """
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _finished(self, _):
+        with self._lock:
+            self._pending -= 1
+
+
+def _straight_line_estimate(graph, view):
+    # IDA* estimate on the csrview of a query, the straight line to the end point. the virtual
+    # edges can be relatively shorter than the road edges, the scale is at most their
+    # weight / straight line ratio so it stays a lower bound. None (the default) on other graphs
+    if not isinstance(view, csrview):
+        return None
+    line = straightline.of(graph)
+    if not line.scale:
+        return None
+    scale = line.scale
+    for virtual, road, weight in view.joins:
+        length = line.distance(view.position(virtual), graph.position(road))
+        if length > 0:
+            scale = min(scale, weight / length * (1 - 1e-9))
+    return _viewestimate(line, view, scale)
+
+
+class _viewestimate:
+    # heuristic_function of a search on a csrview, the lazy table of the road graph's
+    # straightline with the estimates of the virtual nodes filled in
+    def __init__(self, line, view, scale):
+        self.line = line
+        self.view = view
+        self.scale = scale
+
+    def lazy_table(self, target):
+        view = self.view
+        target_position = view.positions[target]
+        estimates = self.line.towards(target_position, self.scale)
+        for label, position in view.positions.items():
+            estimates[view.index[label]] = (estimates.scale
+                                            * self.line.distance(position, target_position))
+        return estimates
+
+
+def _init_worker(graph, index):
+    global _worker_graph, _worker_index
+    if isinstance(graph, str):
+        graph, index = open_spatial_index(graph)
+    _worker_graph = graph
+    _worker_index = index
+
+
+def _worker_search(start_coordinates, end_coordinates, algorithm):
+    return search_road_route(_worker_graph, _worker_index, start_coordinates, end_coordinates,
+                             algorithm)
+
+
+def _worker_paths(source, targets):
+    return one_to_many_paths(_worker_graph, source, targets)
@@ -0,0 +1,112 @@
+"""
+This module contains the cache of route results.
+A route is kept under the road nodes its start and end points snap to and the algorithm, so
+nearby points that snap to the same nodes share one search. Only the road part of the route is
+kept (coordinates and length), the start and end points are added back on every lookup.
+The cache belongs to one road graph: when it is used with another graph (the road graph was
+reloaded) everything in it is dropped, and results searched on the old graph are not stored.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 10000
+# how long a route is kept, in seconds
+DEFAULT_MAX_AGE = 600
+
+
+class routecache:
+    """
+    route results by (start node, end node, algorithm) for one road graph.
+    a value is (road node coordinates, road distance), coordinates None when there is no path.
+    hits, misses, evictions (full or expired) and invalidations (graph changes) are counted,
+    version is the number of graphs the cache has been used with.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE,
+                 clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version = 0
+        # the graph is held, so its id can not be reused by another graph
+        self._graph = None
+        # key -> (value, creation time), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, graph, key):
+        """
+        the value of key searched on graph, None if it is not cached
+        """
+        now = self.clock()
+        with self._lock:
+            self._use(graph)
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, graph, key, value):
+        """
+        store the value of key searched on graph and return it.
+        nothing is stored if the cache is used with another graph by now
+        """
+        now = self.clock()
+        with self._lock:
+            if self._graph is None:
+                self._use(graph)
+            elif graph is not self._graph:
+                return value
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clear(self):
+        """
+        remove every route
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        counters and size of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'version': self.version,
+            }
+
+    def _use(self, graph):
+        # callers hold the lock. routes of another graph are not valid for this one
+        if graph is self._graph:
+            return
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+        self._graph = graph
+        self.version += 1
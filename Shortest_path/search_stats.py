@@ -0,0 +1,130 @@
+"""
+This module contains the work counters of the searches.
+dijkstra(), bidirectional_dijkstra() and ida_star() fill a searchstats when one is passed in
+(stats=...), and add to it, so one object can sum up many queries. Without it the Dijkstra
+searches run exactly as before: their counting is done by a heap wrapper and after the search,
+not in the loops. IDA* counts its work on the idastar object in any case.
+"""
+
+# counters that are added up over queries, and the ones that keep the largest value
+TOTALS = ('searches', 'settled', 'relaxed', 'pushes', 'pops', 'updates', 'iterations',
+          'reexpansions')
+PEAKS = ('peak_queue', 'peak_depth')
+
+
+class searchstats:
+    """
+    work of one or more searches:
+      searches     - number of searches added up here
+      settled      - nodes taken off the queue (Dijkstra) or expanded (IDA*)
+      relaxed      - edges looked at from the settled nodes
+      pushes, pops, updates - priority queue operations, updates are decrease-keys
+      peak_queue   - most nodes in one priority queue at once
+      iterations   - IDA* deepening iterations
+      reexpansions - IDA* expansions of a node that was expanded before
+      peak_depth   - IDA* longest path on the search stack
+    """
+    __slots__ = TOTALS + PEAKS
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        set every counter to zero
+        """
+        for name in TOTALS + PEAKS:
+            setattr(self, name, 0)
+
+    def merge(self, other):
+        """
+        add the counters of another searchstats to this one
+        """
+        for name in TOTALS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in PEAKS:
+            setattr(self, name, max(getattr(self, name), getattr(other, name)))
+        return self
+
+    def as_dict(self):
+        """
+        the counters as a dict
+        """
+        return {name: getattr(self, name) for name in TOTALS + PEAKS}
+
+    def per_search(self):
+        """
+        the added up counters divided by the number of searches, the peaks as they are
+        """
+        searches = self.searches or 1
+        result = {name: getattr(self, name) / searches for name in TOTALS if name != 'searches'}
+        result.update((name, getattr(self, name)) for name in PEAKS)
+        return result
+
+    def __repr__(self):
+        counters = ', '.join(f"{name}={value}" for name, value in self.as_dict().items())
+        return f"searchstats({counters})"
+
+
+class countedheap:
+    """
+    priority queue wrapper that counts the operations of the heap inside it (binaryheap or
+    daryheap) into a searchstats, and remembers the popped nodes.
+    the searches only use it when they are given a searchstats.
+    """
+    __slots__ = ('heap', 'stats', 'position', 'popped', 'size')
+
+    def __init__(self, heap, stats):
+        self.heap = heap
+        self.stats = stats
+        # daryheap position table, the csr searches read it directly
+        self.position = getattr(heap, 'position', None)
+        self.popped = []
+        self.size = 0
+
+    def push(self, node, distance):
+        """
+        push new elements to heap
+        """
+        self.heap.push(node, distance)
+        stats = self.stats
+        stats.pushes += 1
+        self.size += 1
+        if self.size > stats.peak_queue:
+            stats.peak_queue = self.size
+
+    def pop(self):
+        """
+        removes and returns (distance, node) with the smallest distance, None if the heap is empty
+        """
+        entry = self.heap.pop()
+        if entry is not None:
+            self.stats.pops += 1
+            self.size -= 1
+            self.popped.append(entry[1])
+        return entry
+
+    def update(self, node, new_distance):
+        """
+        change the distance of a node that is in the heap (decrease-key)
+        """
+        self.heap.update(node, new_distance)
+        self.stats.updates += 1
+
+    def peek(self):
+        """
+        (distance, node) with the smallest distance without removing it, None if empty
+        """
+        return self.heap.peek()
+
+    def is_empty(self):
+        """
+        Check if the heap is empty
+        """
+        return self.heap.is_empty()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, node):
+        return node in self.heap
@@ -0,0 +1,92 @@
+"""
+This module contains the reusable memory of the searches on a csrgraph.
+A search used to start with lists over every node of the graph (distances, heap positions),
+so even a query to a node three edges away cost O(V). A searchworkspace keeps those lists
+between searches: every search gets a new generation number, and a value only counts when
+the stamp of its node is that generation, so nothing has to be cleared. A query costs only
+the nodes it touches.
+Each thread has its own free workspaces, a search takes one with workspace() and gives it back
+when it ends, so concurrent searches (and a search inside a search) never share one.
+"""
+import contextlib
+import threading
+
+# free workspaces of each thread
+_local = threading.local()
+
+
+class searchworkspace:
+    """
+    per node id lists of at least capacity nodes:
+      stamps       - the generation a node was last reached in
+      distances    - distance of a node, valid when its stamp is the current generation
+      predecessors - the node before it, valid the same way
+      position     - position table for a daryheap, -1 for a node that is not in it.
+                     it is -1 everywhere between searches
+    touched is the list of the nodes reached in the current generation that the search
+    chose to record, heap the daryheap(position=space.position) of the search: its nodes
+    get position -1 again when the search ends.
+    """
+    __slots__ = ('capacity', 'generation', 'stamps', 'distances', 'predecessors', 'position',
+                 'touched', 'heap')
+
+    def __init__(self, capacity=0):
+        self.capacity = 0
+        self.generation = 0
+        self.stamps = []
+        self.distances = []
+        self.predecessors = []
+        self.position = []
+        self.touched = []
+        self.heap = None
+        self.reserve(capacity)
+
+    def reserve(self, capacity):
+        """
+        make room for node ids below capacity, the lists only grow
+        """
+        extra = capacity - self.capacity
+        if extra > 0:
+            self.stamps.extend([0] * extra)
+            self.distances.extend([0.0] * extra)
+            self.predecessors.extend([-1] * extra)
+            self.position.extend([-1] * extra)
+            self.capacity = capacity
+
+    def begin(self):
+        """
+        start a new search: every node counts as not reached. returns the new generation
+        """
+        self.generation += 1
+        self.touched.clear()
+        return self.generation
+
+    def finish(self):
+        """
+        end the search: the nodes still in its heap get position -1 again
+        """
+        heap = self.heap
+        if heap is not None:
+            position = self.position
+            for node in heap.nodes:
+                position[node] = -1
+            self.heap = None
+
+
+@contextlib.contextmanager
+def workspace(capacity):
+    """
+    a searchworkspace of this thread with room for capacity nodes, begun for a new search.
+    with workspace(len(graph)) as space: ...
+    """
+    free = getattr(_local, 'free', None)
+    if free is None:
+        free = _local.free = []
+    space = free.pop() if free else searchworkspace()
+    space.reserve(capacity)
+    space.begin()
+    try:
+        yield space
+    finally:
+        space.finish()
+        free.append(space)
@@ -2,30 +2,213 @@
 This module contains all main functions, like routes, geocoding, path finding, plotting etc. 
 This version can work either with dijkstra’s algorithm or IDA* algorithm.
 """
+import json
 import secrets
 import os
-import random
-import string
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import (Flask, Response, render_template, request, redirect, url_for, flash, abort,
+                   jsonify, g, stream_with_context)
 from geopy.geocoders import Nominatim
-import requests
 import folium
-import polyline
-import networkx
-from dijkstra import dijkstra
-from ida_star import ida_star
+import numpy
+from csr_graph import csrgraph
+from spatial_index import spatialindex
+from osm_loader import osmloader
+from graph_file import open_spatial_index
+from geo import point_distance, haversine
+from matrix import distance_matrix_ids, matrix_pool, one_to_many_paths
+from geocache import geocodecache, normalize_address
+from ratelimit import ratelimiter
+from osrm import osrmclient, DEFAULT_OSRM_URL
+from mapstore import mapstore
+from routecache import routecache
+from metrics import metricsregistry
+from route_executor import routeexecutor, search_road_route, saturated, ALGORITHMS
+from path_geometry import pathgeometry, PATH_FORMATS
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# latency of each stage of a route request and request counters, shown on /metrics.
+# METRICS=0 turns them into no-ops
+METRICS_ENABLED = os.environ.get('METRICS', '1') != '0'
+metrics = metricsregistry(METRICS_ENABLED)
+stage_seconds = metrics.histogram('shortest_path_stage_seconds',
+                                  'Time of each stage of a route request.', ('stage',))
+route_requests = metrics.counter('shortest_path_route_requests_total',
+                                 'Route requests of the form by result.', ('result',))
+http_seconds = metrics.histogram('shortest_path_http_request_seconds',
+                                 'Time to answer an HTTP request.', ('endpoint',))
+http_requests = metrics.counter('shortest_path_http_requests_total',
+                                'HTTP requests by endpoint, method and status.',
+                                ('endpoint', 'method', 'status'))
+external_errors = metrics.counter('shortest_path_external_errors_total',
+                                  'Failed calls to Nominatim and OSRM.', ('service',))
+
 # making an instance of Nominatim class
 geolocator = Nominatim(user_agent="shortest_path_app")
 
 # Define the OpenStreetMap API endpoint for geocoding
 GEOCODE_API_URL = "https://nominatim.openstreetmap.org/search"
 
-# Create a weighted graph
-graph = networkx.Graph()
+# geocoding results are cached in memory and in this SQLite file, an empty path keeps memory only
+GEOCODE_CACHE_PATH = os.environ.get(
+    'GEOCODE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       'geocode_cache.sqlite3'))
+geocode_cache = geocodecache(GEOCODE_CACHE_PATH or None)
+
+# geocoding of one request runs in parallel on this shared pool, every call to Nominatim
+# waits for the rate limiter (the public server allows one request per second)
+GEOCODE_WORKERS = int(os.environ.get('GEOCODE_WORKERS', '4'))
+GEOCODE_TIMEOUT = float(os.environ.get('GEOCODE_TIMEOUT', '10'))
+GEOCODE_RATE = float(os.environ.get('GEOCODE_RATE', '1'))
+geocode_pool = ThreadPoolExecutor(max_workers=GEOCODE_WORKERS, thread_name_prefix='geocode')
+geocode_limiter = ratelimiter(GEOCODE_RATE)
+
+# OSRM route geometry for the maps (see MAP_GEOMETRY) and the ASGI app,
+# set OSRM_BASE_URL to use a local server
+OSRM_BASE_URL = os.environ.get('OSRM_BASE_URL', DEFAULT_OSRM_URL)
+osrm_client = osrmclient(OSRM_BASE_URL)
+
+# rendered maps are kept in memory, MAP_SPILL_PATH names a directory for the maps that do not fit
+MAP_SPILL_PATH = os.environ.get('MAP_SPILL_PATH')
+map_store = mapstore(spill_directory=MAP_SPILL_PATH or None)
+
+
+# road network as a graph file (see graph_file.py), or as an OpenStreetMap file
+# (.osm, or .osm.pbf with osmium installed) that is read at start up
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH')
+ROAD_OSM_PATH = os.environ.get('ROAD_OSM_PATH')
+
+# the map shows the found path ('path') or the route geometry of OSRM ('osrm').
+# the found path is the default only with a real road network, the placeholder graph
+# has no roads to draw
+MAP_GEOMETRY = os.environ.get('MAP_GEOMETRY') or (
+    'path' if ROAD_GRAPH_PATH or ROAD_OSM_PATH else 'osrm')
+
+
+def load_road_graph():
+    """
+    the road graph and its spatial index, built once when the program starts and never changed
+    afterwards. a graph file is mapped into memory and shared by all worker processes.
+    without ROAD_GRAPH_PATH and ROAD_OSM_PATH two placeholder nodes at (0, 0) stand for
+    the road network. the size of the graph and the load time are kept in road_graph_stats
+    (shown on /api/stats)
+    """
+    global road_graph_stats
+    started = time.perf_counter()
+    index = None
+    loader = None
+    if ROAD_GRAPH_PATH:
+        graph, index = open_spatial_index(ROAD_GRAPH_PATH)
+    elif ROAD_OSM_PATH:
+        loader = osmloader()
+        graph = loader.load(ROAD_OSM_PATH)
+    else:
+        positions = {'node1': (0, 0), 'node2': (0, 0)}
+        graph = csrgraph.from_edges([('node1', 'node2', 0.0)], positions=positions)
+    if index is None:
+        index = spatialindex.from_graph(graph)
+    road_graph_stats = {'nodes': len(graph), 'edges': graph.edge_count(),
+                        'seconds': time.perf_counter() - started,
+                        'osm': loader.stats() if loader is not None else None}
+    return graph, index
+
+
+# shared read-only by every request, queries add their end points in a virtualgraph.
+# the index snaps the end points of a query to the nearest road nodes
+road_graph_stats = None
+road_graph, road_index = load_road_graph()
+
+# routes by the road nodes their end points snap to, ROUTE_CACHE_SIZE routes for
+# ROUTE_CACHE_AGE seconds. it is emptied when the road graph is reloaded
+ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', '10000'))
+ROUTE_CACHE_AGE = float(os.environ.get('ROUTE_CACHE_AGE', '600'))
+route_cache = routecache(ROUTE_CACHE_SIZE, ROUTE_CACHE_AGE)
+
+# route searches run on ROUTE_PROCESSES worker processes (0 searches in the request thread).
+# at most ROUTE_QUEUE searches wait or run at once, more get HTTP 503, and a request waits
+# ROUTE_TIMEOUT seconds for its search
+ROUTE_PROCESSES = int(os.environ.get('ROUTE_PROCESSES', '0'))
+ROUTE_QUEUE = int(os.environ.get('ROUTE_QUEUE', '0')) or None
+ROUTE_TIMEOUT = float(os.environ.get('ROUTE_TIMEOUT', '30'))
+
+
+def start_route_executor(graph, index):
+    """
+    worker processes for the searches on graph, None when ROUTE_PROCESSES is 0.
+    the workers map the graph file themselves, a graph read from OSM is inherited from this
+    process when the pool forks
+    """
+    if ROUTE_PROCESSES < 1:
+        return None
+    return routeexecutor(graph, index, ROUTE_PROCESSES, ROUTE_QUEUE, ROUTE_TIMEOUT,
+                         ROAD_GRAPH_PATH)
+
+
+route_executor = start_route_executor(road_graph, road_index)
+
+
+# distance matrix requests: at most MATRIX_MAX_CELLS distances, computed on MATRIX_PROCESSES
+# worker processes (0 or 1 computes them in the request thread)
+MATRIX_MAX_CELLS = int(os.environ.get('MATRIX_MAX_CELLS', '10000'))
+MATRIX_PROCESSES = int(os.environ.get('MATRIX_PROCESSES', '0'))
+# batch route requests: at most ROUTES_MAX_PAIRS origin/destination pairs and
+# ROUTES_MAX_ADDRESSES addresses that are not in the geocoding cache yet. their addresses are
+# geocoded on a pool of their own (ROUTES_GEOCODE_WORKERS threads), so a large batch does not
+# hold up the geocoding of the route form
+ROUTES_MAX_PAIRS = int(os.environ.get('ROUTES_MAX_PAIRS', '1000'))
+ROUTES_MAX_ADDRESSES = int(os.environ.get('ROUTES_MAX_ADDRESSES', '100'))
+ROUTES_GEOCODE_WORKERS = int(os.environ.get('ROUTES_GEOCODE_WORKERS', '1'))
+routes_geocode_pool = ThreadPoolExecutor(max_workers=ROUTES_GEOCODE_WORKERS,
+                                         thread_name_prefix='routes-geocode')
+
+
+def start_distance_pool(graph):
+    """
+    worker processes for the distance matrices of graph, None when MATRIX_PROCESSES < 2
+    """
+    if MATRIX_PROCESSES < 2:
+        return None
+    return matrix_pool(graph, MATRIX_PROCESSES, ROAD_GRAPH_PATH)
+
+
+distance_pool = start_distance_pool(road_graph)
+
+
+def reload_road_graph():
+    """
+    load the road graph again (after the graph file or OSM file changed).
+    queries that already run finish on the old graph, cached routes of it are not used again,
+    and the worker processes are started again with the new graph
+    """
+    global road_graph, road_index, route_executor, distance_pool
+    road_graph, road_index = load_road_graph()
+    route_cache.clear()
+    old_executor, old_pool = route_executor, distance_pool
+    route_executor = start_route_executor(road_graph, road_index)
+    distance_pool = start_distance_pool(road_graph)
+    if old_executor is not None:
+        old_executor.close(wait=False)
+    if old_pool is not None:
+        old_pool.shutdown(wait=False)
+
+
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def count_request(response):
+        endpoint = request.endpoint or 'unknown'
+        started = g.pop('request_started', None)
+        if started is not None:
+            http_seconds.observe(time.perf_counter() - started, endpoint)
+        http_requests.inc(endpoint, request.method, str(response.status_code))
+        return response
+
 
 @app.route('/', methods=['GET', 'POST'])
 def home():
@@ -37,31 +220,35 @@ def home():
         end_point = request.form['end']
 
         if not start_point or not end_point:
+            route_requests.inc('missing_address')
             flash('Please provide both a start and end address.', 'error')
             return redirect(url_for('home'))
 
-        # use geocoding geocode function to convert addresses to coordinates
-        start_coordinates = geocode(start_point)
-        end_coordinates = geocode(end_point)
+        # use geocoding geocode function to convert addresses to coordinates, both at once
+        start_coordinates, end_coordinates = geocode_many([start_point, end_point])
 
         # Perform find_shortest_path function, the key operation for this program
         shortest_path = find_shortest_path(start_coordinates, end_coordinates)
 
         if start_coordinates and end_coordinates:
-            # Plot the shortest path on the map and save it as an HTML file
-            file_path = plot_shortest_path(start_coordinates, end_coordinates, shortest_path)
+            # Plot the shortest path on the map and keep it in the map store
+            file_path = plot_shortest_path(start_coordinates, end_coordinates, shortest_path)[0]
             if file_path:
+                route_requests.inc('ok')
                 # Pass the shortest path and coordinates to the template for visualization
                 redirect_url = url_for('show_shortest_path', file_path=file_path)
                 return redirect(redirect_url)
 
         # scenario where geocoding fails
         if not start_coordinates or not end_coordinates:
+            route_requests.inc('geocoding_failed')
             return render_template('index.html', error="Unable to find coordinates for addresses.")
 
         # scenario where shortest path cannot be found
         if shortest_path is None:
+            route_requests.inc('no_path')
             return render_template('index.html', error="Unable to find a path.")
+        route_requests.inc('no_map')
 
     return render_template('index.html')
 
@@ -69,117 +256,292 @@ def home():
 def geocode(address):
     """
     applying geocode method to get the location
+    repeated addresses come from geocode_cache and do not call Nominatim again
     """
     try:
-        location = geolocator.geocode(address)
-        print(location)  # Print loocation variable
-        if (
-            location is not None and
-            hasattr(location, 'latitude') and
-            hasattr(location, 'longitude')
-            ):
-            return location.latitude, location.longitude
+        return geocode_cache.lookup(address, geocode_address)
     except Exception as ex:
-        print(f"Geocoding failed for address '{address}': {ex}")
+        external_errors.inc('nominatim')
+        app.logger.warning("Geocoding failed for address %r: %s", address, ex)
     return None
 
 
-def find_shortest_path(start_coordinates, end_coordinates):
+def geocode_many(addresses, timeout=None):
+    """
+    geocode several addresses concurrently on the shared pool.
+    returns the coordinates in the same order, None for an address that failed or
+    was not ready within timeout seconds (GEOCODE_TIMEOUT for the whole request by default).
+    """
+    if timeout is None:
+        timeout = GEOCODE_TIMEOUT
+    # the same address is looked up once
+    with stage_seconds.time('geocode'):
+        futures = {address: geocode_pool.submit(geocode, address) for address in set(addresses)}
+        done, not_done = wait(futures.values(), timeout=timeout)
+    for future in not_done:
+        future.cancel()
+    results = {address: future.result() if future in done and future.exception() is None
+               else None for address, future in futures.items()}
+    return [results[address] for address in addresses]
+
+
+def geocode_address(address):
+    """
+    ask Nominatim for the location, without the cache.
+    returns None if the address was not found, raises if the answer could not be used
+    """
+    geocode_limiter.acquire()
+    location = geolocator.geocode(address)
+    print(location)  # Print loocation variable
+    if location is None:
+        return None
+    if hasattr(location, 'latitude') and hasattr(location, 'longitude'):
+        return location.latitude, location.longitude
+    raise ValueError(f"unexpected geocoder result {location!r}")
+
+
+def find_shortest_path(start_coordinates, end_coordinates, algorithm='ida_star'):
     """
     Implement Dijkstra’s Algorithm (priority queue implemented on heap) or IDA* Algorithm
     use the start_coordinates and end_coordinates to calculate the shortest path
+    algorithm is 'ida_star', 'dijkstra' or 'bidirectional' (Dijkstra from both ends)
     Return the shortest path as a list of coordinate
     """
-    # Add the start and end nodes with their coordinates to the graph
-    graph.add_node('start', pos=start_coordinates)
-    graph.add_node('node1', pos=(0, 0))  # Add 'node1' with placeholder coordinates
-    graph.add_node('node2', pos=(0, 0))  # Add 'node2' with placeholder coordinates
-    graph.add_node('end', pos=end_coordinates)
-
-    # Define the distance function (Euclidean distance between two points)
-    def distance(point1, point2):
-        x1, y1 = point1
-        x2, y2 = point2
-        return ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
-
-    # Calculate the distance between two nodes based on their coordinates
-    def calculate_distance(node1, node2):
-        return distance(graph.nodes[node1]['pos'], graph.nodes[node2]['pos'])
-
-    # Add edges to the graph connecting neighboring nodes
-    graph.add_edge('start', 'node1', weight=calculate_distance('start', 'node1'))
-    graph.add_edge('node1', 'node2', weight=calculate_distance('node1', 'node2'))
-    graph.add_edge('node2', 'end', weight=calculate_distance('node2', 'end'))
-
-    # Use Algorithm:
-    if start_coordinates not in graph.nodes or end_coordinates not in graph.nodes:
-        # Handle the case when the coordinates are not present in the graph
-        flash('Invalid start or end coordinates. Please provide valid coordinates.', 'error')
-        return redirect(url_for('home'))
-
-    # if use ida_star function (IDA* Algorithm) to find the shortest path, run below line:
-    shortest_path = ida_star(graph, start_coordinates, end_coordinates)
-    # if use Dijkstra’s Algorithm to find the shortest path, run below line:
-    #shortest_path = dijkstra(graph, 'start', 'end')
-
-    if not shortest_path:
+    route = find_route(start_coordinates, end_coordinates, algorithm)
+    if route is None:
+        return None
+    if route[0] is None:
         return "No path found"
-
-    # Retrieve the coordinates of the nodes in the shortest path
-    path_coordinates = [graph.nodes[node]['pos'] for node in shortest_path]
-
-    return path_coordinates
+    return route[0]
 
 
-def plot_shortest_path(start_coordinates, end_coordinates, shortest_path):
+def find_route(start_coordinates, end_coordinates, algorithm='ida_star'):
     """
-    this function plots the found path.
+    (path coordinates, distance in meters) from start_coordinates to end_coordinates,
+    (None, None) if there is no path and None if a coordinate is missing.
+    a route between the same two road nodes comes from route_cache
     """
-    # Define the OSRM API endpoint
-    url = (f"http://router.project-osrm.org/route/v1/driving/"
-            f"{start_coordinates[1]},{start_coordinates[0]};"
-            f"{end_coordinates[1]},{end_coordinates[0]}")
-
-    # Send a request to the OSRM API
-    response = requests.get(url, timeout=5).json()
-
-    # Check if the 'routes' key exists in the response
-    if 'routes' not in response or not response['routes']:
-        raise ValueError("Missing 'routes' key in API response")
+    if start_coordinates is None or end_coordinates is None:
+        return None
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm '{algorithm}'")
+
+    # one snapshot of the graph, index and workers, reload_road_graph() may replace them
+    graph, index, executor = road_graph, road_index, route_executor
+    start_node = index.nearest(start_coordinates)[0]
+    end_node = index.nearest(end_coordinates)[0]
+    key = (start_node, end_node, algorithm)
+    road_route = route_cache.get(graph, key)
+    if road_route is None:
+        with stage_seconds.time('search'):
+            if executor is not None:
+                # raises saturated or TimeoutError, answered with 503 and 504
+                road_route = executor.search(start_coordinates, end_coordinates, algorithm)
+            else:
+                road_route = search_road_route(graph, index, start_coordinates,
+                                               end_coordinates, algorithm)
+            road_route = route_cache.put(graph, key, road_route)
+    return _add_end_points(start_coordinates, end_coordinates, road_route)
+
+
+def find_routes(start_coordinates, end_coordinates_list, algorithm='ida_star'):
+    """
+    find_route() from one start to many ends, a list of (path coordinates, distance).
+    algorithm is only used for a single end, see grouped_algorithm(). more ends that are not
+    in route_cache are found by one Dijkstra search from the start node, which stops when all
+    of them are reached, on route_executor like find_route() (it raises saturated and
+    TimeoutError the same way)
+    """
+    if start_coordinates is None or any(end is None for end in end_coordinates_list):
+        raise ValueError("every start and end needs coordinates")
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm '{algorithm}'")
+    if len(end_coordinates_list) == 1:
+        return [find_route(start_coordinates, end_coordinates_list[0], algorithm)]
+    algorithm = grouped_algorithm(algorithm, len(end_coordinates_list))
+
+    # one snapshot of the graph, index and workers, reload_road_graph() may replace them
+    graph, index, executor = road_graph, road_index, route_executor
+    start_node = index.nearest(start_coordinates)[0]
+    end_nodes = [index.nearest(end)[0] for end in end_coordinates_list]
+    road_routes = [route_cache.get(graph, (start_node, end_node, algorithm))
+                   for end_node in end_nodes]
+    missing = list(dict.fromkeys(end_node for end_node, road_route in zip(end_nodes, road_routes)
+                                 if road_route is None))
+    if missing:
+        node_index = graph.index
+        source = node_index[start_node]
+        targets = [node_index[end_node] for end_node in missing]
+        with stage_seconds.time('search'):
+            if executor is not None:
+                # raises saturated or TimeoutError like find_route()
+                found = executor.paths(source, targets)
+            else:
+                found = one_to_many_paths(graph, source, targets)
+        searched = {}
+        for end_node, (node_ids, distance) in zip(missing, found):
+            road_route = (None, None) if node_ids is None else \
+                ([graph.position(node_id) for node_id in node_ids], distance)
+            searched[end_node] = route_cache.put(graph, (start_node, end_node, algorithm),
+                                                 road_route)
+        road_routes = [searched[end_node] if road_route is None else road_route
+                       for end_node, road_route in zip(end_nodes, road_routes)]
+    return [_add_end_points(start_coordinates, end, road_route)
+            for end, road_route in zip(end_coordinates_list, road_routes)]
+
+
+def grouped_algorithm(algorithm, end_count):
+    """
+    the algorithm find_routes() runs from one start to end_count ends, 'dijkstra' for more
+    than one end
+    """
+    return algorithm if end_count == 1 else 'dijkstra'
 
-    # Get the encoded polyline from the first route
-    route = response['routes'][0]
 
-    # Check if the 'geometry' key exists in the route
-    if 'geometry' not in route:
-        raise ValueError("Missing 'geometry' key in route")
+def _add_end_points(start_coordinates, end_coordinates, road_route):
+    # the route of a query from its road route, (None, None) if there is no path
+    road_coordinates, road_distance = road_route
+    if road_coordinates is None:
+        return None, None
+    # the virtual edges at both ends are straight lines to the snapped road nodes
+    distance = (road_distance + point_distance(start_coordinates, road_coordinates[0])
+                + point_distance(road_coordinates[-1], end_coordinates))
+    return [start_coordinates] + road_coordinates + [end_coordinates], distance
 
-    # Retrieve the encoded polyline from the response
-    encoded_polyline = route['geometry']
 
-    # Decode the polyline to obtain the coordinates
-    coordinates = polyline.decode(encoded_polyline)
+def batch_routes(pairs, algorithm='ida_star', path_format='coordinates'):
+    """
+    routes of many (start, end) pairs, a start or end is an address or (lat, lon).
+    yields one dict per pair as soon as it is ready, not in the order of the pairs:
+    {"index": i, "start": .., "end": .., "distance": meters, "algorithm": the one that ran,
+    and the path in path_format (see path_geometry.pathgeometry.output())} or
+    {"index": i, "error": message}. every address is geocoded once, and the pairs with the
+    same start are routed together (find_routes(), with Dijkstra when there are several) as
+    soon as all their addresses are geocoded
+    """
+    # addresses are told apart like in geocode_cache, "Kamppi" and "kamppi " are one address,
+    # looked up with its first spelling
+    spellings = {}
+    for pair in pairs:
+        for point in pair:
+            if isinstance(point, str):
+                spellings.setdefault(normalize_address(point), point)
+    pairs = [tuple(normalize_address(point) if isinstance(point, str) else point
+                   for point in pair) for pair in pairs]
+    groups = {}
+    for i, (start, _) in enumerate(pairs):
+        groups.setdefault(start, []).append(i)
+    # address -> the starts whose groups wait for it, start -> number of addresses it waits for
+    waiting_starts = {}
+    waiting = {}
+    for start, indexes in groups.items():
+        addresses = {point for i in indexes for point in pairs[i] if isinstance(point, str)}
+        waiting[start] = len(addresses)
+        for address in addresses:
+            waiting_starts.setdefault(address, []).append(start)
+
+    futures = {routes_geocode_pool.submit(geocode, spellings[address]): address
+               for address in waiting_starts}
+    # the addresses are geocoded at GEOCODE_RATE, the timeout grows with their number
+    deadline = time.monotonic() + GEOCODE_TIMEOUT + len(futures) * geocode_limiter.interval
+    coordinates = {}
+    ready = [start for start, count in waiting.items() if not count]
+    pending = set(futures)
+    try:
+        while True:
+            for start in ready:
+                yield from _route_group(pairs, groups[start], coordinates, algorithm,
+                                        path_format)
+            if not pending:
+                return
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                # the rest of the addresses count as not found
+                for future in pending:
+                    future.cancel()
+                done, pending = pending, set()
+            ready = []
+            for future in done:
+                address = futures[future]
+                # a lookup still running after the deadline is not waited for
+                late = not future.done() or future.cancelled()
+                coordinates[address] = None if late else future.result()
+                for start in waiting_starts[address]:
+                    waiting[start] -= 1
+                    if not waiting[start]:
+                        ready.append(start)
+    finally:
+        # the client went away, the lookups that have not started are dropped
+        for future in pending:
+            future.cancel()
+
+
+def _route_group(pairs, indexes, coordinates, algorithm, path_format):
+    # answers of the pairs indexes that share one start
+    def located(point):
+        return coordinates.get(point) if isinstance(point, str) else point
+
+    start = located(pairs[indexes[0]][0])
+    routable = []
+    for i in indexes:
+        end = located(pairs[i][1])
+        if start is None or end is None:
+            route_requests.inc('geocoding_failed')
+            yield {'index': i, 'error': "Unable to find coordinates for addresses."}
+        else:
+            routable.append((i, end))
+    if not routable:
+        return
+    algorithm = grouped_algorithm(algorithm, len(routable))
+    try:
+        routes = find_routes(start, [end for _, end in routable], algorithm)
+    except (saturated, TimeoutError) as ex:
+        error = ("Too many route searches at the moment, please try again."
+                 if isinstance(ex, saturated) else "The route search took too long.")
+        for i, _ in routable:
+            yield {'index': i, 'error': error}
+        return
+    for (i, end), (path, distance) in zip(routable, routes):
+        if path is None:
+            route_requests.inc('no_path')
+            yield {'index': i, 'error': "Unable to find a path."}
+        else:
+            route_requests.inc('ok')
+            answer = {'index': i, 'start': start, 'end': end, 'distance': distance,
+                      'algorithm': algorithm}
+            answer.update(pathgeometry(path).output(path_format))
+            yield answer
 
-    # Create a map object using Folium
-    m_map = folium.Map(location=start_coordinates, zoom_start=13)
 
-    # Plot the start and destination markers
-    folium.Marker(start_coordinates, popup="Start").add_to(m_map)
-    folium.Marker(end_coordinates, popup="Destination").add_to(m_map)
+def plot_shortest_path(start_coordinates, end_coordinates, shortest_path):
+    """
+    this function plots the found path.
+    with MAP_GEOMETRY=path (the default when a road network is loaded) the found path itself
+    is drawn, OSRM is only asked when there is no path. MAP_GEOMETRY=osrm (the default with
+    the placeholder graph) always draws the OSRM route.
+    """
+    if MAP_GEOMETRY == 'path' and isinstance(shortest_path, list) and shortest_path:
+        coordinates = shortest_path
+    else:
+        # route geometry from OSRM, the client reuses its connection and caches the result
+        with stage_seconds.time('osrm'):
+            coordinates = osrm_client.route(start_coordinates, end_coordinates)
 
-    # Plot the polyline for the shortest path
-    folium.PolyLine(coordinates, color="blue", weight=2.5, opacity=1).add_to(m_map)
+    with stage_seconds.time('render'):
+        # Create a map object using Folium
+        m_map = folium.Map(location=start_coordinates, zoom_start=13)
 
-    # Generate a random cache-busting parameter
-    # ensure the URL is unique for each version of the HTML file
-    cache_bust = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+        # Plot the start and destination markers
+        folium.Marker(start_coordinates, popup="Start").add_to(m_map)
+        folium.Marker(end_coordinates, popup="Destination").add_to(m_map)
 
-    # Construct the file name with the cache-busting parameter
-    file_name = f"shortest_path_{cache_bust}.html"
-    file_path = os.path.join("templates", file_name)
+        # Plot the polyline for the shortest path
+        folium.PolyLine(coordinates, color="blue", weight=2.5, opacity=1).add_to(m_map)
 
-    # Save the map as an HTML file to templates folder
-    m_map.save(file_path)
+        # Keep the map in the map store, the key is the hash of the HTML so
+        # a different map always gets a different URL
+        file_path = map_store.put(m_map.get_root().render())
 
     return file_path, shortest_path
 
@@ -197,9 +559,172 @@ def show_shortest_path():
 @app.route('/display_map/<file_path>')
 def display_map(file_path):
     """
-    send the map to the frame
+    send the map to the frame, from the map store
+    """
+    html = map_store.get(file_path)
+    if html is None:
+        abort(404)
+    response = Response(html, mimetype='text/html')
+    # the content of a key never changes
+    response.headers['Cache-Control'] = f'private, max-age={map_store.max_age}, immutable'
+    response.set_etag(file_path)
+    return response.make_conditional(request)
+
+@app.errorhandler(saturated)
+def route_search_saturated(_):
+    """
+    every route worker is busy and the queue is full, the client should try again soon
+    """
+    response = Response("Too many route searches at the moment, please try again.", 503,
+                        mimetype='text/plain')
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+@app.errorhandler(TimeoutError)
+def route_search_timeout(_):
+    """
+    the route search did not finish within ROUTE_TIMEOUT seconds
+    """
+    return Response("The route search took too long.", 504, mimetype='text/plain')
+
+
+@app.route('/metrics')
+def show_metrics():
+    """
+    the metrics in the Prometheus text format, 404 when METRICS=0
+    """
+    if not metrics.enabled:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/matrix', methods=['POST'])
+def api_matrix():
+    """
+    road distances in meters between every source and every target.
+    the body is JSON {"sources": [[lat, lon], ...], "targets": [[lat, lon], ...]},
+    the answer is {"distances": [[...], ...]}, one row per source, null where there is no path.
     """
-    return send_file(file_path)
+    data = request.get_json(silent=True) or {}
+    try:
+        sources = coordinate_list(data.get('sources'))
+        targets = coordinate_list(data.get('targets'))
+    except ValueError as ex:
+        return jsonify(error=str(ex)), 400
+    if len(sources) * len(targets) > MATRIX_MAX_CELLS:
+        return jsonify(error=f"at most {MATRIX_MAX_CELLS} distances per request"), 400
+
+    # every point goes to its nearest road node, the distance to it is added at both ends
+    source_ids, source_gaps = snap_to_road(sources)
+    target_ids, target_gaps = snap_to_road(targets)
+    distances = distance_matrix_ids(road_graph, source_ids, target_ids, pool=distance_pool)
+    distances += source_gaps[:, None] + target_gaps[None, :]
+    rows = [[value if numpy.isfinite(value) else None for value in row]
+            for row in distances.tolist()]
+    return jsonify(distances=rows)
+
+
+@app.route('/api/routes', methods=['POST'])
+def api_routes():
+    """
+    routes of many origin/destination pairs in one request.
+    the body is JSON {"pairs": [{"start": .., "end": ..}, ...], "algorithm": "ida_star",
+    "format": "coordinates"}, a start or end is an address or [lat, lon], the format of
+    the paths is "coordinates", "polyline" or "geojson". algorithm is used for the starts that
+    have one end, the ends of a start with several are found by one Dijkstra search. the answer
+    is NDJSON, one line per pair (see batch_routes()) sent as soon as the route is found
+    """
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("the body must be a JSON object")
+        pairs = route_pairs(data.get('pairs'))
+        algorithm = data.get('algorithm', 'ida_star')
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+        path_format = data.get('format', 'coordinates')
+        if path_format not in PATH_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(PATH_FORMATS)}")
+    except ValueError as ex:
+        return jsonify(error=str(ex)), 400
+    if len(pairs) > ROUTES_MAX_PAIRS:
+        return jsonify(error=f"at most {ROUTES_MAX_PAIRS} pairs per request"), 400
+    addresses = {normalize_address(point) for pair in pairs for point in pair
+                 if isinstance(point, str)}
+    if (len(addresses) > ROUTES_MAX_ADDRESSES
+            and len(geocode_cache.missing(addresses)) > ROUTES_MAX_ADDRESSES):
+        return jsonify(error=f"at most {ROUTES_MAX_ADDRESSES} new addresses per request"), 400
+
+    lines = (json.dumps(answer) + '\n'
+             for answer in batch_routes(pairs, algorithm, path_format))
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+
+@app.route('/api/stats')
+def api_stats():
+    """
+    counters of the caches, like hit rates and evictions, and the size of the road graph
+    """
+    return jsonify(road_graph=road_graph_stats, routes=route_cache.stats(), maps=map_store.stats(),
+                   geocoding=geocode_cache.stats(), osrm=osrm_client.stats(),
+                   workers=route_executor.stats() if route_executor is not None else None)
+
+
+def coordinate_list(value):
+    """
+    list of (lat, lon) from JSON, raises ValueError if it is not a list of number pairs
+    """
+    if not isinstance(value, list) or not value:
+        raise ValueError("sources and targets must be non-empty lists of [lat, lon]")
+    points = []
+    for point in value:
+        if (not isinstance(point, list) or len(point) != 2 or
+                not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in point)):
+            raise ValueError(f"{point!r} is not a [lat, lon] pair")
+        points.append((float(point[0]), float(point[1])))
+    return points
+
+
+def route_pairs(value):
+    """
+    list of (start, end) from JSON, an address stays a string and [lat, lon] becomes a tuple.
+    raises ValueError if it is not a list of {"start": .., "end": ..}
+    """
+    if not isinstance(value, list) or not value:
+        raise ValueError("pairs must be a non-empty list of {\"start\": .., \"end\": ..}")
+    pairs = []
+    for pair in value:
+        if not isinstance(pair, dict) or 'start' not in pair or 'end' not in pair:
+            raise ValueError(f"{pair!r} is not a {{\"start\": .., \"end\": ..}} pair")
+        pairs.append(tuple(route_point(pair[name]) for name in ('start', 'end')))
+    return pairs
+
+
+def route_point(value):
+    """
+    an address or a (lat, lon) from JSON
+    """
+    if isinstance(value, str):
+        if not value.strip():
+            raise ValueError("an address can not be empty")
+        return value
+    if isinstance(value, list):
+        return coordinate_list([value])[0]
+    raise ValueError(f"{value!r} is not an address or a [lat, lon] pair")
+
+
+def snap_to_road(points):
+    """
+    (road node ids, distances in meters to them) of the nearest road node of every point
+    """
+    indexes, _ = road_index.snap(points)
+    node_ids = [road_graph.index[road_index.labels[i]] for i in indexes.tolist()]
+    positions = numpy.array([road_graph.position(node_id) for node_id in node_ids])
+    points = numpy.asarray(points)
+    gaps = haversine(points[:, 0], points[:, 1], positions[:, 0], positions[:, 1])
+    return node_ids, gaps
+
 
 if __name__ == '__main__':
     app.run()
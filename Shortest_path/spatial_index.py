@@ -0,0 +1,261 @@
+"""
+This module contains the spatial index used to snap coordinates to the nearest graph nodes.
+It is a KD-tree on numpy arrays: the points are split at the median of the wider coordinate
+until at most leaf_size points are left, so a nearest node query visits O(log n) tree nodes.
+For (lat, lon) points the distances are equirectangular: a degree of longitude is shorter than
+a degree of latitude by cos(latitude), so the longitude difference is scaled by the cosine of
+the query's latitude and the distances are in degrees of latitude. Other points (a planar
+graph) use straight line distances, like virtual_graph.euclidean.
+"""
+import heapq
+import math
+import networkx
+import numpy
+from csr_graph import csrgraph
+
+DEFAULT_LEAF_SIZE = 32
+# snap() works on this many points at a time, to bound the temporary arrays
+BATCH_SIZE = 65536
+# snap() looks at cells up to this many levels above the leaves before searching the tree
+SNAP_LEVELS = 3
+
+
+class spatialindex:
+    """
+    KD-tree over points, an (n, 2) array. labels[i] is the label of point i (the point index
+    when labels is None). the tree is complete: every leaf is at the same depth, and the
+    internal node i has the children 2i + 1 and 2i + 2 (like a binary heap).
+    """
+    def __init__(self, points, labels=None, leaf_size=DEFAULT_LEAF_SIZE, tree=None):
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        self.labels = list(range(len(points))) if labels is None else labels
+        self.leaf_size = leaf_size
+        # tree is (order, leaf_starts, split_dims, split_values) of an index built before,
+        # for example read from a graph file, otherwise the tree is built here
+        if tree is None:
+            tree = _build_tree(points, leaf_size)
+        self.order, self.leaf_starts, self.split_dims, self.split_values = tree
+        self.depth = (len(self.leaf_starts) - 1).bit_length() - 1
+        self.points = points[self.order]
+        # (lat, lon) points in degrees, the longitude axis is scaled by cos(latitude)
+        self.geographic = bool(len(points)) and bool(
+            numpy.abs(points[:, 0]).max() <= 90 and numpy.abs(points[:, 1]).max() <= 180)
+        # plain lists for the single point queries, indexing them is faster than numpy
+        self._dims = self.split_dims.tolist()
+        self._values = self.split_values.tolist()
+        self._starts = self.leaf_starts.tolist()
+
+    def tree(self):
+        """
+        the arrays of the tree, (order, leaf_starts, split_dims, split_values)
+        """
+        return self.order, self.leaf_starts, self.split_dims, self.split_values
+
+    @classmethod
+    def from_graph(cls, graph, leaf_size=DEFAULT_LEAF_SIZE):
+        """
+        index over the node positions of a csrgraph or networkx graph.
+        for a csrgraph with coordinates the point index is the node id.
+        nodes without a position are left out.
+        """
+        labels, points = node_positions(graph)
+        return cls(points, labels, leaf_size)
+
+    def __len__(self):
+        return len(self.points)
+
+    def nearest(self, point):
+        """
+        (label, distance) of the point closest to point, None if the index is empty
+        """
+        found = self.k_nearest(point, 1)
+        return found[0] if found else None
+
+    def k_nearest(self, point, count):
+        """
+        list of (label, distance) of the count points closest to point, nearest first
+        """
+        labels = self.labels
+        order = self.order
+        return [(labels[order[position]], distance)
+                for position, distance in self._search(point, count)]
+
+    def snap(self, points):
+        """
+        nearest point of many points at once, returns (point indexes, distances) as arrays.
+        labels[index] is the label of the nearest point.
+        """
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        indexes = numpy.empty(len(points), dtype=numpy.int64)
+        distances = numpy.empty(len(points), dtype=numpy.float64)
+        if not len(self):
+            indexes.fill(-1)
+            distances.fill(numpy.inf)
+            return indexes, distances
+        for start in range(0, len(points), BATCH_SIZE):
+            end = min(start + BATCH_SIZE, len(points))
+            indexes[start:end], distances[start:end] = self._snap_batch(points[start:end])
+        return indexes, distances
+
+    def _snap_batch(self, queries):
+        # every query walks down to its leaf at the same time, one tree level per step
+        node = numpy.zeros(len(queries), dtype=numpy.int64)
+        rows = numpy.arange(len(queries))
+        steps = []
+        for _ in range(self.depth):
+            dims = self.split_dims[node]
+            values = self.split_values[node]
+            right = queries[rows, dims] >= values
+            steps.append((dims, values, right))
+            node = 2 * node + 1 + right
+        leaf = node - (2 ** self.depth - 1)
+
+        # axis scales of every query, see _scale()
+        scales = numpy.ones((len(queries), 2))
+        if self.geographic:
+            scales[:, 1] = numpy.abs(numpy.cos(numpy.radians(queries[:, 0])))
+
+        # nearest point in the own cell, first the leaf and then bigger cells for the queries
+        # whose found point is farther than a wall of the cell (the answer can be outside it)
+        indexes = numpy.zeros(len(queries), dtype=numpy.int64)
+        squared = numpy.full(len(queries), numpy.inf)
+        pending = rows
+        for up in range(min(self.depth, SNAP_LEVELS) + 1):
+            cells = leaf[pending] >> up
+            starts = self.leaf_starts[cells << up]
+            sizes = self.leaf_starts[(cells + 1) << up] - starts
+            width = max(int(sizes.max()), 1)
+            slots = starts[:, None] + numpy.arange(width)
+            valid = numpy.arange(width) < sizes[:, None]
+            slots = numpy.where(valid, slots, 0)
+            points = queries[pending]
+            scale = scales[pending]
+            candidates = (((self.points[slots] - points[:, None, :]) * scale[:, None, :]) ** 2
+                          ).sum(axis=2)
+            candidates[~valid] = numpy.inf
+            best = candidates.argmin(axis=1)
+            near = numpy.arange(len(pending))
+            indexes[pending] = slots[near, best]
+            squared[pending] = candidates[near, best]
+
+            # the walls of the cell come from the splits on the way down to it
+            low = numpy.full((len(pending), 2), -numpy.inf)
+            high = numpy.full((len(pending), 2), numpy.inf)
+            for dims, values, right in steps[:self.depth - up]:
+                dims = dims[pending]
+                values = values[pending]
+                right = right[pending]
+                low[near[right], dims[right]] = values[right]
+                high[near[~right], dims[~right]] = values[~right]
+            room = (numpy.minimum(points - low, high - points) * scale).min(axis=1)
+            pending = pending[squared[pending] > room ** 2]
+            if not len(pending):
+                break
+
+        for i in pending.tolist():
+            (position, distance), = self._search(queries[i], 1, squared[i])
+            indexes[i] = position
+            squared[i] = distance ** 2
+        return self.order[indexes], numpy.sqrt(squared)
+
+    def _search(self, point, count, limit=math.inf):
+        # [(position in self.points, distance)] of the count nearest points, nearest first, by a
+        # depth first search that skips subtrees farther than the count-th best point so far.
+        # limit is a squared distance known to be reached, it prunes from the start
+        if not len(self) or count <= 0:
+            return []
+        x, y = float(point[0]), float(point[1])
+        query = numpy.array([x, y])
+        y_scale = self._scale(x)
+        scale = numpy.array([1.0, y_scale])
+        dims = self._dims
+        values = self._values
+        starts = self._starts
+        first_leaf = 2 ** self.depth - 1
+        # max-heap of (-squared distance, sorted position) of the best points
+        best = []
+        stack = [(0.0, 0)]
+        while stack:
+            bound, node = stack.pop()
+            if bound > limit or len(best) == count and bound >= -best[0][0]:
+                continue
+            if node >= first_leaf:
+                leaf = node - first_leaf
+                start, end = starts[leaf], starts[leaf + 1]
+                squared = (((self.points[start:end] - query) * scale) ** 2).sum(axis=1)
+                for position in numpy.argsort(squared)[:count].tolist():
+                    value = float(squared[position])
+                    if len(best) < count:
+                        heapq.heappush(best, (-value, start + position))
+                    elif value < -best[0][0]:
+                        heapq.heapreplace(best, (-value, start + position))
+                    else:
+                        break
+                continue
+            difference = x - values[node] if dims[node] == 0 else (y - values[node]) * y_scale
+            near, far = (2 * node + 2, 2 * node + 1) if difference >= 0 else \
+                (2 * node + 1, 2 * node + 2)
+            stack.append((max(bound, difference * difference), far))
+            stack.append((bound, near))
+        best.sort(reverse=True)
+        return [(position, math.sqrt(-value)) for value, position in best]
+
+    def _scale(self, latitude):
+        # length of a degree of longitude in degrees of latitude at a latitude, 1 for a plane
+        if not self.geographic:
+            return 1.0
+        return abs(math.cos(math.radians(latitude)))
+
+
+def _build_tree(points, leaf_size):
+    # split at the median of the wider coordinate, one tree level at a time
+    count = len(points)
+    depth = max(0, math.ceil(math.log2(count / leaf_size))) if count else 0
+    internal_count = 2 ** depth - 1
+    split_dims = numpy.zeros(internal_count, dtype=numpy.int64)
+    split_values = numpy.zeros(internal_count, dtype=numpy.float64)
+    order = numpy.arange(count)
+    # (start, end) of the points under each tree node of one level
+    ranges = [(0, count)]
+    for level in range(depth):
+        next_ranges = []
+        for i, (start, end) in enumerate(ranges):
+            node = 2 ** level - 1 + i
+            part = points[order[start:end]]
+            dim = int(numpy.argmax(numpy.ptp(part, axis=0))) if end > start else 0
+            mid = (start + end) // 2
+            if end > start:
+                # the median goes to mid, smaller values before it, larger after it
+                order[start:end] = order[start:end][
+                    numpy.argpartition(part[:, dim], min(mid - start, end - start - 1))]
+                split_values[node] = points[order[min(mid, end - 1)], dim]
+            split_dims[node] = dim
+            next_ranges.append((start, mid))
+            next_ranges.append((mid, end))
+        ranges = next_ranges
+    leaf_starts = numpy.array([start for start, _ in ranges] + [count], dtype=numpy.int64)
+    return order, leaf_starts, split_dims, split_values
+
+
+def node_positions(graph):
+    """
+    (labels, (n, 2) array of (lat, lon)) of the nodes of a graph that have a position:
+    the csrgraph coordinates, the networkx 'pos' attribute, or a label that is a (lat, lon) pair
+    """
+    if isinstance(graph, csrgraph) and graph.lat is not None:
+        points = numpy.column_stack((numpy.frombuffer(graph.lat, dtype=numpy.float64),
+                                     numpy.frombuffer(graph.lon, dtype=numpy.float64)))
+        return graph.labels, points
+    if isinstance(graph, networkx.Graph):
+        nodes = graph.nodes(data='pos')
+    else:
+        nodes = ((label, None) for label in graph.labels)
+    labels = []
+    points = []
+    for label, position in nodes:
+        if position is None and isinstance(label, tuple) and len(label) == 2:
+            position = label
+        if position is not None:
+            labels.append(label)
+            points.append(position)
+    return labels, numpy.array(points, dtype=numpy.float64).reshape(-1, 2)
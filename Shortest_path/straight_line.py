@@ -0,0 +1,149 @@
+"""
+This module contains the straight line heuristic of the searches on a csrgraph.
+The straight line distance to the target only is a lower bound when it is in the units of the
+edge weights. scale is the smallest weight / straight line length over all edges of the graph
+(1 for a road graph with haversine edge lengths), so scale * straight line never overestimates,
+and it keeps the triangle inequality, so the estimate is consistent as well.
+The estimates to one target are computed with numpy over the coordinate arrays, a block of
+node ids at a time when the first node of the block is asked for, and kept for the query.
+"""
+import weakref
+import numpy
+from geo import haversine
+
+# node ids whose estimates are computed together
+BLOCK_SIZE = 256
+# edges measured at a time for the scale, this caps the temporary arrays of a large graph
+EDGE_CHUNK = 1 << 20
+
+# the straightline of every graph, so the scale is computed once per graph
+_lines = weakref.WeakKeyDictionary()
+
+
+class straightline:
+    """
+    straight line lower bound of one csrgraph, usable as heuristic_function of dijkstra()
+    and ida_star(). metric is 'haversine' (meters) for coordinates in degrees, else 'planar'
+    (Euclidean in the units of the coordinates). a graph without coordinates estimates 0.
+    """
+    def __init__(self, graph):
+        self.index = graph.index
+        self.count = len(graph)
+        self.lat = self.lon = None
+        self.metric = None
+        self.scale = 0.0
+        if graph.lat is None or not self.count:
+            return
+        self.lat = numpy.asarray(graph.lat, dtype=numpy.float64)
+        self.lon = numpy.asarray(graph.lon, dtype=numpy.float64)
+        geographic = (numpy.abs(self.lat).max() <= 90 and numpy.abs(self.lon).max() <= 180)
+        self.metric = 'haversine' if geographic else 'planar'
+        self.scale = self._scale(graph)
+
+    def _scale(self, graph):
+        # smallest weight / straight line length of the edges that have a length
+        offsets = numpy.asarray(graph.offsets, dtype=numpy.int64)
+        targets = numpy.asarray(graph.targets, dtype=numpy.int64)
+        weights = numpy.asarray(graph.weights, dtype=numpy.float64)
+        smallest = numpy.inf
+        for first in range(0, len(targets), EDGE_CHUNK):
+            edges = numpy.arange(first, min(first + EDGE_CHUNK, len(targets)))
+            sources = numpy.searchsorted(offsets, edges, side='right') - 1
+            lengths = self._distance(self.lat[sources], self.lon[sources],
+                                     self.lat[targets[edges]], self.lon[targets[edges]])
+            positive = lengths > 0
+            if positive.any():
+                smallest = min(smallest, float((weights[edges][positive]
+                                                / lengths[positive]).min()))
+        if smallest == numpy.inf:
+            return 0.0
+        # a little under the smallest ratio, the rounding of the division must not make an
+        # estimate larger than the edge
+        return smallest * (1 - 1e-9)
+
+    @classmethod
+    def of(cls, graph):
+        """
+        the straightline of a graph, made once and kept while the graph exists
+        """
+        line = _lines.get(graph)
+        if line is None:
+            line = _lines[graph] = cls(graph)
+        return line
+
+    def __call__(self, node, target):
+        """
+        lower bound of the distance from node to target (node labels)
+        """
+        return self.estimate(self.index[node], self.index[target])
+
+    def estimate(self, node_id, target_id):
+        """
+        lower bound of the distance between two node ids
+        """
+        if not self.scale:
+            return 0.0
+        return self.scale * float(self._distance(self.lat[node_id], self.lon[node_id],
+                                                 self.lat[target_id], self.lon[target_id]))
+
+    def distance(self, position1, position2):
+        """
+        straight line length between two (lat, lon) points in the metric, not scaled
+        """
+        return float(self._distance(position1[0], position1[1], position2[0], position2[1]))
+
+    def table(self, target):
+        """
+        lower bound from every node to the target (a node label), as one array by node id
+        """
+        target_id = self.index[target]
+        return self._block(0, self.count, (self.lat[target_id], self.lon[target_id])
+                           if self.scale else None, self.scale)
+
+    def lazy_table(self, target):
+        """
+        node id -> lower bound to the target (a node label), a dict that computes a block of
+        BLOCK_SIZE node ids with numpy the first time one of them is asked for
+        """
+        if not self.scale:
+            return _lazytable(self, None, 0.0)
+        target_id = self.index[target]
+        return _lazytable(self, (self.lat[target_id], self.lon[target_id]), self.scale)
+
+    def towards(self, position, scale=None):
+        """
+        same as lazy_table() to a (lat, lon) point that need not be a node, scale (at most
+        self.scale) is for a search with extra edges that are relatively shorter
+        """
+        scale = self.scale if scale is None else min(scale, self.scale)
+        return _lazytable(self, position if scale else None, scale)
+
+    def _block(self, start, stop, position, scale):
+        # estimates of the node ids start..stop-1 to position
+        if position is None:
+            return numpy.zeros(stop - start)
+        return scale * self._distance(self.lat[start:stop], self.lon[start:stop],
+                                      position[0], position[1])
+
+    def _distance(self, lat1, lon1, lat2, lon2):
+        if self.metric == 'haversine':
+            return haversine(lat1, lon1, lat2, lon2)
+        return numpy.hypot(lat2 - lat1, lon2 - lon1)
+
+
+class _lazytable(dict):
+    # node id -> estimate, filled one block at a time
+    __slots__ = ('line', 'position', 'scale')
+
+    def __init__(self, line, position, scale):
+        super().__init__()
+        self.line = line
+        self.position = position
+        self.scale = scale
+
+    def __missing__(self, node_id):
+        start = node_id - node_id % BLOCK_SIZE
+        stop = min(start + BLOCK_SIZE, self.line.count)
+        values = self.line._block(start, stop, self.position, self.scale)
+        self.update(zip(range(start, stop), values.tolist()))
+        return self[node_id]
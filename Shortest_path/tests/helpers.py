@@ -0,0 +1,62 @@
+"""
+stand-ins and graphs shared by the tests
+"""
+import random
+import threading
+import time
+import networkx
+from ida_star import heuristic
+
+
+class Clock:
+    # time.monotonic stand-in, the tests move it by setting now
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class LocalGeocoder:
+    # stand-in for Nominatim: answers after a fixed delay, no network. the answer comes from
+    # places when given, otherwise it is made up from the length of the address and
+    # 'Nowhere' is not found
+    def __init__(self, delay, places=None):
+        self.delay = delay
+        self.places = places
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, address):
+        with self.lock:
+            self.calls.append(address)
+        time.sleep(self.delay)
+        if self.places is not None:
+            return self.places.get(address)
+        if address == 'Nowhere':
+            return None
+        return (60.0 + len(address) / 100, 24.0)
+
+
+def random_graph(seed, nodes=200, edges=600, directed=True, positions=False):
+    # random networkx graph with edge weights between 1 and 10. with positions every node
+    # gets a random 'pos' and an edge is 1 to 1.5 times the straight line between its ends,
+    # so the straight line estimate of IDA* stays admissible
+    rng = random.Random(seed)
+    if not positions:
+        graph = networkx.gnm_random_graph(nodes, edges, seed=seed, directed=directed)
+        for u, v in graph.edges:
+            graph[u][v]['weight'] = rng.uniform(1, 10)
+        return graph
+    graph = networkx.DiGraph() if directed else networkx.Graph()
+    for node in range(nodes):
+        graph.add_node(node, pos=(rng.random(), rng.random()))
+    for u, v in networkx.gnm_random_graph(nodes, edges, seed=seed, directed=directed).edges:
+        straight = heuristic(graph.nodes[u]['pos'], graph.nodes[v]['pos'])
+        graph.add_edge(u, v, weight=straight * rng.uniform(1, 1.5))
+    return graph
+
+
+def path_length(graph, path):
+    # sum of the edge weights along a path of a networkx graph (or virtualgraph)
+    return sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
@@ -1,6 +1,9 @@
 import unittest
-from ida_star import heuristic, search, ida_star, reconstruct_shortest_path
+from ida_star import heuristic, search, ida_star, reconstruct_shortest_path, idastar
+from dijkstra import dijkstra
+from csr_graph import csrgraph
 import networkx
+from tests.helpers import random_graph, path_length
 
 class HeuristicTestCase(unittest.TestCase):
     def test_heuristic(self):
@@ -183,6 +186,73 @@ class IDAStarTestCase(unittest.TestCase):
         self.assertEqual(shortest_path, expected_path, f"Test case 4 failed. Expected: {expected_path}, Got: {shortest_path}")
 
 
+class IDAStarEngineTestCase(unittest.TestCase):
+    def test_long_path_without_recursion_limit(self):
+        graph = networkx.path_graph(5000)
+        networkx.set_edge_attributes(graph, 1, 'weight')
+        path = ida_star(graph, 0, 4999)
+        self.assertEqual(path, list(range(5000)))
+
+    def test_same_length_as_dijkstra(self):
+        for seed in range(5):
+            graph = random_graph(seed, 60, 150, directed=False, positions=True)
+            csr = csrgraph.from_networkx(graph)
+            for policy in ('min', 'controlled'):
+                engine = idastar(csr, threshold_policy=policy)
+                for start, end in [(0, 59), (5, 40), (10, 33)]:
+                    expected = dijkstra(graph, start, end)
+                    path = engine.run(start, end)
+                    if not expected:
+                        self.assertEqual(path, [])
+                        continue
+                    self.assertAlmostEqual(path_length(graph, path),
+                                           path_length(graph, expected[0]))
+                    self.assertAlmostEqual(engine.cost, path_length(graph, path))
+
+    def test_controlled_policy_needs_fewer_iterations(self):
+        graph = random_graph(1, 60, 150, directed=False, positions=True)
+        classic = idastar(graph, threshold_policy='min')
+        controlled = idastar(graph, threshold_policy='controlled')
+        classic.run(0, 59)
+        controlled.run(0, 59)
+        self.assertGreater(classic.iterations, 1)
+        self.assertLess(controlled.iterations, classic.iterations)
+
+    def test_table_size_is_capped(self):
+        graph = random_graph(2, 60, 150, directed=False, positions=True)
+        engine = idastar(graph, max_table_size=10)
+        expected = dijkstra(graph, 0, 59)
+        path = engine.run(0, 59)
+        self.assertLessEqual(engine.table_size, 10)
+        if expected:
+            self.assertAlmostEqual(path_length(graph, path),
+                                   path_length(graph, expected[0]))
+
+    def test_small_table_falls_back_to_a_star(self):
+        # with room for only a few nodes the passes stop and A* finishes the query,
+        # instead of IDA* re-expanding nodes exponentially
+        for seed in range(3):
+            graph = random_graph(seed, 60, 150, directed=False, positions=True)
+            for search_graph in (graph, csrgraph.from_networkx(graph)):
+                engine = idastar(search_graph, max_table_size=5)
+                path = engine.run(0, 59)
+                self.assertTrue(engine.fallback)
+                self.assertLessEqual(engine.table_size, 5)
+                expected = dijkstra(graph, 0, 59)
+                self.assertEqual(bool(path), bool(expected))
+                if expected:
+                    self.assertAlmostEqual(path_length(graph, path),
+                                           path_length(graph, expected[0]))
+                    self.assertAlmostEqual(engine.cost, path_length(graph, path))
+        engine = idastar(random_graph(0, 60, 150, directed=False, positions=True))
+        engine.run(0, 59)
+        self.assertFalse(engine.fallback)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            idastar(networkx.Graph(), threshold_policy='double')
+
+
 class ReconstructShortestPathTestCase(unittest.TestCase):
     def test_ReconstructShortestPath(self):
         visited = {'A': None, 'B': 'A', 'C': 'B', 'D': 'C'}
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest.mock import patch
+import shortest_path
+from asgi_app import routeapp
+from geocache import geocodecache
+from osrm import osrmclient
+from ratelimit import ratelimiter
+from route_executor import saturated
+
+class LocalResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+class LocalClient:
+    # stand-in for httpx.AsyncClient: answers Nominatim and OSRM after a delay, no network
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = []
+
+    async def get(self, url, params=None, timeout=None):
+        self.calls.append(params['q'] if params else url)
+        await asyncio.sleep(self.delay)
+        if params is None:
+            # encoded polyline of (38.5, -120.2), (40.7, -120.95)
+            return LocalResponse({'routes': [{'geometry': '_p~iF~ps|U_ulLnnqC'}]})
+        if params['q'] == 'Nowhere':
+            return LocalResponse([])
+        if params['q'] == 'Broken':
+            raise OSError("connection reset")
+        return LocalResponse([{'lat': str(60.0 + len(params['q']) / 100), 'lon': '24.0'}])
+
+def local_route(start, end, algorithm='ida_star'):
+    # stand-in for find_route
+    if start == end:
+        return None, None
+    return [start, end], 1000.0
+
+async def post(app, body, method='POST', path='/api/route'):
+    # one HTTP request through the ASGI interface, returns (status, headers, JSON answer)
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    messages = []
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    async def send(message):
+        messages.append(message)
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': []}, receive, send)
+    start, answer = messages
+    return start['status'], dict(start['headers']), json.loads(answer['body'])
+
+# two addresses that get different coordinates
+ROUTE = {'start': 'Kamppi', 'end': 'Pasilan asema'}
+
+class AsgiAppTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = LocalClient(0.2)
+        self.app = routeapp(client=self.client)
+        self.patches = [
+            patch.object(shortest_path, 'geocode_cache', geocodecache(None)),
+            patch.object(shortest_path, 'geocode_limiter', ratelimiter(None)),
+            patch.object(shortest_path, 'osrm_client', osrmclient('http://osrm.test')),
+            patch.object(shortest_path, 'find_route', side_effect=local_route),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        asyncio.run(self.app.shutdown())
+
+    def test_route(self):
+        status, _, answer = asyncio.run(post(self.app, ROUTE))
+        self.assertEqual(status, 200)
+        self.assertEqual(answer['start'], [60.06, 24.0])
+        self.assertEqual(answer['end'], [60.13, 24.0])
+        self.assertEqual(answer['distance'], 1000.0)
+        self.assertEqual(answer['geometry'], [[38.5, -120.2], [40.7, -120.95]])
+
+    def test_addresses_and_osrm_overlap(self):
+        # two geocoding calls at once, then OSRM alongside the search: two delays, not three
+        started = time.perf_counter()
+        status, _, _ = asyncio.run(post(self.app, ROUTE))
+        self.assertEqual(status, 200)
+        self.assertLess(time.perf_counter() - started, 0.55)
+        self.assertEqual(len(self.client.calls), 3)
+
+    def test_many_requests_in_flight(self):
+        async def many():
+            return await asyncio.gather(*(
+                post(self.app, {'start': f'Street {i}', 'end': f'Road {i}'}) for i in range(200)))
+        started = time.perf_counter()
+        results = asyncio.run(many())
+        self.assertEqual([status for status, _, _ in results], [200] * 200)
+        # one request takes two delays, so all of them waited at the same time
+        self.assertLess(time.perf_counter() - started, 2.0)
+        self.assertEqual(self.app.in_flight, 0)
+
+    def test_same_address_is_geocoded_once(self):
+        async def many():
+            return await asyncio.gather(*(
+                post(self.app, {'start': 'Kamppi', 'end': 'kamppi '}) for _ in range(10)))
+        asyncio.run(many())
+        self.assertEqual(self.client.calls.count('Kamppi'), 1)
+        self.assertEqual(shortest_path.geocode_cache.get('kamppi'), (60.06, 24.0))
+
+    def test_address_not_found(self):
+        errors = shortest_path.external_errors.value('nominatim')
+        for address in ('Nowhere', 'Broken'):
+            status, _, answer = asyncio.run(post(self.app, {'start': address, 'end': 'Pasila'}))
+            self.assertEqual(status, 404)
+            self.assertIn('coordinates', answer['error'])
+        # the failed call is logged and counted, an address that does not exist is not
+        self.assertEqual(shortest_path.external_errors.value('nominatim'), errors + 1)
+        with self.assertLogs(shortest_path.app.logger, 'WARNING') as logs:
+            asyncio.run(post(self.app, {'start': 'Broken', 'end': 'Pasila'}))
+        self.assertIn('connection reset', logs.output[0])
+
+    def test_geocoding_timeout(self):
+        self.client.delay = 1.0
+        with patch.object(shortest_path, 'GEOCODE_TIMEOUT', 0.1):
+            status, _, _ = asyncio.run(post(self.app, {'start': 'Kamppi', 'end': 'Pasila'}))
+        self.assertEqual(status, 404)
+
+    def test_no_path(self):
+        # local_route finds no path between two equal points
+        status, _, answer = asyncio.run(post(self.app, {'start': 'Kamppi', 'end': 'Kamppi'}))
+        self.assertEqual(status, 404)
+        self.assertIn('path', answer['error'])
+
+    def test_osrm_failure_gives_no_geometry(self):
+        errors = shortest_path.external_errors.value('osrm')
+        with patch('asgi_app.route_geometry', side_effect=ValueError("no routes")), \
+                self.assertLogs(shortest_path.app.logger, 'WARNING') as logs:
+            status, _, answer = asyncio.run(post(self.app, ROUTE))
+        self.assertEqual(status, 200)
+        self.assertIsNone(answer['geometry'])
+        self.assertIn('no routes', logs.output[0])
+        self.assertEqual(shortest_path.external_errors.value('osrm'), errors + 1)
+
+    def test_search_errors(self):
+        with patch.object(shortest_path, 'find_route', side_effect=saturated("full")):
+            status, headers, _ = asyncio.run(post(self.app, {'start': 'Kamppi', 'end': 'Pasila'}))
+        self.assertEqual(status, 503)
+        self.assertEqual(headers[b'retry-after'], b'1')
+        with patch.object(shortest_path, 'find_route', side_effect=TimeoutError()):
+            status, _, _ = asyncio.run(post(self.app, {'start': 'Kamppi', 'end': 'Pasila'}))
+        self.assertEqual(status, 504)
+
+    def test_bad_requests(self):
+        for body in (b'not json', {'start': 'Kamppi'}, {'start': '', 'end': 'Pasila'},
+                     {'start': 'Kamppi', 'end': 'Pasila', 'algorithm': 'bfs'}, [1, 2]):
+            status, _, _ = asyncio.run(post(self.app, body))
+            self.assertEqual(status, 400, body)
+        self.assertEqual(asyncio.run(post(self.app, {}, method='GET'))[0], 405)
+        self.assertEqual(asyncio.run(post(self.app, {}, path='/other'))[0], 404)
+        self.assertEqual(self.client.calls, [])
+
+    def test_lifespan(self):
+        app = routeapp(client=self.client)
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+        async def receive():
+            return messages.pop(0)
+        async def send(message):
+            sent.append(message['type'])
+        asyncio.run(app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        self.assertIsNone(app.search_pool)
+        # a client that was passed in is not closed
+        self.assertIs(app.client, self.client)
+
+if __name__ == '__main__':
+    unittest.main()
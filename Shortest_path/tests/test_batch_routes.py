@@ -0,0 +1,155 @@
+import json
+import os
+import unittest
+from unittest.mock import patch
+from csr_graph import csrgraph
+from geocache import geocodecache
+from matrix import one_to_many_paths
+from osm_loader import load_osm
+from route_executor import saturated
+from routecache import routecache
+from spatial_index import spatialindex
+import shortest_path
+from shortest_path import app, find_route, find_routes
+from tests.helpers import LocalGeocoder
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+# addresses of the local geocoder, next to road nodes 6, 1 and 4 of small.osm
+PLACES = {'Kamppi': (60.1711, 24.9441), 'Pasila': (60.1699, 24.9399),
+          'Kallio': (60.171, 24.9401)}
+
+class BatchRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        self.geocoder = LocalGeocoder(0.05, PLACES)
+        road = load_osm(SMALL_OSM)
+        for name, value in (('road_graph', road), ('road_index', spatialindex.from_graph(road)),
+                            ('route_cache', routecache()), ('route_executor', None),
+                            ('geocode_cache', geocodecache(None))):
+            patcher = patch(f'shortest_path.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('shortest_path.geocode_address', side_effect=self.geocoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body):
+        response = self.app.post('/api/routes', json=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    def test_routes(self):
+        pairs = [{'start': 'Kamppi', 'end': 'Pasila'},
+                 {'start': 'Kamppi', 'end': [60.1701, 24.9419]},
+                 {'start': [60.1699, 24.9399], 'end': 'kamppi'},
+                 {'start': 'Kamppi', 'end': 'Kallio'}]
+        answers = self.post({'pairs': pairs, 'algorithm': 'dijkstra'})
+        self.assertEqual(sorted(answer['index'] for answer in answers), [0, 1, 2, 3])
+        # every address once, "kamppi" is the same address
+        self.assertEqual(sorted(self.geocoder.calls), ['Kallio', 'Kamppi', 'Pasila'])
+        for answer in answers:
+            pair = pairs[answer['index']]
+            start = PLACES['Kamppi'] if isinstance(pair['start'], str) else tuple(pair['start'])
+            end = PLACES.get(pair['end'], PLACES['Kamppi']) if isinstance(pair['end'], str) \
+                else tuple(pair['end'])
+            path, distance = find_route(start, end, 'dijkstra')
+            self.assertEqual(answer['path'], [list(point) for point in path])
+            self.assertAlmostEqual(answer['distance'], distance)
+
+    def test_pairs_with_the_same_start_are_searched_together(self):
+        ends = [(60.1699, 24.9399), (60.1701, 24.9419), (60.171, 24.9401), (60.1699, 24.9399)]
+        with patch('shortest_path.search_road_route') as search:
+            routes = find_routes((60.1711, 24.9441), ends, 'dijkstra')
+            search.assert_not_called()
+        for end, route in zip(ends, routes):
+            path, distance = find_route((60.1711, 24.9441), end, 'dijkstra')
+            self.assertEqual(route[0], path)
+            self.assertAlmostEqual(route[1], distance)
+
+    def test_grouped_starts_are_dijkstra_routes(self):
+        start = (60.1711, 24.9441)
+        ends = [(60.1699, 24.9399), (60.1701, 24.9419)]
+        find_routes(start, ends, 'ida_star')
+        # the routes are cached as Dijkstra routes, an IDA* query still runs IDA*
+        with patch('shortest_path.search_road_route',
+                   wraps=shortest_path.search_road_route) as search:
+            find_route(start, ends[0], 'dijkstra')
+            search.assert_not_called()
+            find_route(start, ends[0], 'ida_star')
+            self.assertEqual(search.call_args[0][-1], 'ida_star')
+        answers = self.post({'pairs': [{'start': list(start), 'end': list(end)} for end in ends]
+                                      + [{'start': 'Kamppi', 'end': 'Pasila'}]})
+        algorithms = {answer['index']: answer['algorithm'] for answer in answers}
+        self.assertEqual(algorithms, {0: 'dijkstra', 1: 'dijkstra', 2: 'ida_star'})
+
+    def test_searches_go_through_the_executor(self):
+        ends = [(60.1699, 24.9399), (60.1701, 24.9419)]
+        expected = find_routes((60.1711, 24.9441), ends, 'dijkstra')
+        with patch('shortest_path.route_executor') as executor, \
+                patch('shortest_path.route_cache', routecache()):
+            executor.paths.side_effect = saturated("busy")
+            answers = self.post({'pairs': [{'start': [60.1711, 24.9441], 'end': list(end)}
+                                           for end in ends]})
+            self.assertEqual(sorted(answer['index'] for answer in answers), [0, 1])
+            for answer in answers:
+                self.assertIn('Too many route searches', answer['error'])
+            # the search runs on the executor, not in the request thread
+            executor.paths.side_effect = lambda source, targets: one_to_many_paths(
+                shortest_path.road_graph, source, targets)
+            with patch('shortest_path.one_to_many_paths') as local:
+                self.assertEqual(find_routes((60.1711, 24.9441), ends, 'dijkstra'), expected)
+                local.assert_not_called()
+
+        # a one way road from a to b
+        road = csrgraph.from_edges([('a', 'b', 100.0)], directed=True,
+                                   positions={'a': (60.0, 24.0), 'b': (60.001, 24.0)})
+        with patch.multiple('shortest_path', road_graph=road,
+                            road_index=spatialindex.from_graph(road)):
+            answers = self.post({'pairs': [{'start': [60.001, 24.0], 'end': [60.0, 24.0]},
+                                           {'start': [60.001, 24.0], 'end': [60.001, 24.0001]}]})
+        answers.sort(key=lambda answer: answer['index'])
+        self.assertEqual(answers[0], {'index': 0, 'error': "Unable to find a path."})
+        self.assertEqual(answers[1]['path'], [[60.001, 24.0], [60.001, 24.0], [60.001, 24.0001]])
+
+    def test_results_are_streamed_when_ready(self):
+        self.geocoder.delay = 0.3
+        answers = self.post({'pairs': [{'start': 'Kamppi', 'end': 'Pasila'},
+                                       {'start': 'Nowhere', 'end': 'Pasila'},
+                                       {'start': [60.1711, 24.9441], 'end': [60.1699, 24.9399]}]})
+        # the pair of coordinates does not wait for the geocoding
+        self.assertEqual(answers[0]['index'], 2)
+        errors = [answer for answer in answers if 'error' in answer]
+        self.assertEqual(errors, [{'index': 1,
+                                   'error': "Unable to find coordinates for addresses."}])
+
+    def test_bad_requests(self):
+        for body in ([], {}, {'pairs': []}, {'pairs': [{'start': 'Kamppi'}]},
+                     {'pairs': [{'start': '', 'end': 'Pasila'}]},
+                     {'pairs': [{'start': [1, 'x'], 'end': 'Pasila'}]},
+                     {'pairs': [{'start': 5, 'end': 'Pasila'}]},
+                     {'pairs': [{'start': 'Kamppi', 'end': 'Pasila'}], 'algorithm': 'bfs'}):
+            self.assertEqual(self.app.post('/api/routes', json=body).status_code, 400, body)
+        with patch('shortest_path.ROUTES_MAX_PAIRS', 1):
+            body = {'pairs': [{'start': 'Kamppi', 'end': 'Pasila'}] * 2}
+            self.assertEqual(self.app.post('/api/routes', json=body).status_code, 400)
+        with patch('shortest_path.ROUTES_MAX_ADDRESSES', 1):
+            body = {'pairs': [{'start': 'Kamppi', 'end': 'Pasila'}]}
+            self.assertEqual(self.app.post('/api/routes', json=body).status_code, 400)
+        self.assertEqual(self.geocoder.calls, [])
+        # addresses in the geocoding cache do not count
+        shortest_path.geocode_cache.put('kamppi', PLACES['Kamppi'])
+        with patch('shortest_path.ROUTES_MAX_ADDRESSES', 1):
+            self.assertEqual(len(self.post(body)), 1)
+        self.assertEqual(self.geocoder.calls, ['Pasila'])
+
+    def test_batch_geocoding_has_its_own_pool(self):
+        with patch('shortest_path.geocode_pool') as pool:
+            answers = self.post({'pairs': [{'start': 'Kamppi', 'end': 'Pasila'}]})
+            pool.submit.assert_not_called()
+        self.assertIn('path', answers[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from benchmark import (grid_arrays, geometric_arrays, query_pairs, measure_engine,
+                       benchmark_suite, GEOMETRIC_DETOUR)
+
+class SuiteGraphsTestCase(unittest.TestCase):
+    def test_grid(self):
+        graph = grid_arrays(100)
+        self.assertEqual(len(graph), 100)
+        # 2 * 10 * 9 roads, both directions
+        self.assertEqual(graph.edge_count(), 360)
+        self.assertEqual(graph.position(23), (2.0, 3.0))
+        self.assertEqual(sorted(target for target, _ in graph.edges_from(0)), [1, 10])
+
+    def test_geometric(self):
+        graph = geometric_arrays(2000, seed=3)
+        self.assertEqual(len(graph), 2000)
+        edges = {}
+        for node in range(len(graph)):
+            for target, weight in graph.edges_from(node):
+                edges[node, target] = weight
+        for (u, v), weight in edges.items():
+            self.assertEqual(edges[v, u], weight)
+            (x1, y1), (x2, y2) = graph.position(u), graph.position(v)
+            straight = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+            self.assertLess(straight, 1.0)
+            self.assertTrue(straight <= weight <= straight * GEOMETRIC_DETOUR)
+        # about pi * 2 neighbors per node
+        self.assertTrue(5 < len(edges) / len(graph) < 7.5)
+        self.assertEqual(geometric_arrays(2000, seed=3).weights, graph.weights)
+
+class SuiteTestCase(unittest.TestCase):
+    def test_engines_agree(self):
+        graph = geometric_arrays(500)
+        pairs = query_pairs(graph, 10)
+        lengths = set()
+        for name in ('dijkstra', 'bidirectional', 'ida_star', 'alt', 'ch'):
+            result = measure_engine(name, graph, pairs, repeat=2)
+            self.assertEqual(result['queries'], 10)
+            self.assertGreater(result['peak_bytes'], 0)
+            self.assertGreater(result['work']['settled'], 0)
+            self.assertLessEqual(result['median_seconds'], result['max_seconds'])
+            lengths.add(round(result['total_length'], 6))
+        self.assertEqual(len(lengths), 1)
+
+    def test_reports(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'run')
+            with patch('builtins.print'):
+                report = benchmark_suite(sizes=[100, 400], kinds=['grid'],
+                                         engines=['dijkstra', 'ida_star'], queries=3, repeat=1,
+                                         output=output)
+            with open(output + '.json', encoding='utf-8') as file:
+                self.assertEqual(json.load(file), report)
+            with open(output + '.txt', encoding='utf-8') as file:
+                self.assertEqual(len(file.read().splitlines()), 5)
+        self.assertEqual([(r['nodes'], r['engine']) for r in report['results']],
+                         [(100, 'dijkstra'), (100, 'ida_star'), (400, 'dijkstra'),
+                          (400, 'ida_star')])
+        self.assertIn('python', report['environment'])
+
+if __name__ == '__main__':
+    unittest.main()
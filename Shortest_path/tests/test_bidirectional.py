@@ -0,0 +1,64 @@
+import random
+import unittest
+import networkx
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra, reconstruct_shortest_path
+from tests.helpers import path_length
+
+class BidirectionalDijkstraTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = networkx.Graph()
+        self.graph.add_edge('A', 'B', weight=1)
+        self.graph.add_edge('B', 'C', weight=3)
+        self.graph.add_edge('C', 'D', weight=5)
+        self.graph.add_edge('A', 'E', weight=4)
+        self.graph.add_edge('E', 'D', weight=4)
+
+    def test_bidirectional(self):
+        path, visited = bidirectional_dijkstra(self.graph, 'A', 'D')
+        self.assertEqual(path, ['A', 'E', 'D'])
+        # the predecessors rebuild the same path
+        self.assertEqual(reconstruct_shortest_path(visited, 'A', 'D'), path)
+
+    def test_bidirectional_csrgraph(self):
+        csr = csrgraph.from_networkx(self.graph)
+        path, visited = bidirectional_dijkstra(csr, 'A', 'D')
+        self.assertEqual(path, ['A', 'E', 'D'])
+        self.assertEqual(reconstruct_shortest_path(visited, 'A', 'D'), path)
+
+    def test_same_start_and_end(self):
+        path, _ = bidirectional_dijkstra(self.graph, 'B', 'B')
+        self.assertEqual(path, ['B'])
+
+    def test_no_path(self):
+        self.graph.add_edge('X', 'Y', weight=1)
+        self.assertEqual(bidirectional_dijkstra(self.graph, 'A', 'X'), [])
+        self.assertEqual(bidirectional_dijkstra(csrgraph.from_networkx(self.graph), 'A', 'X'), [])
+
+    def test_directed(self):
+        graph = networkx.DiGraph()
+        graph.add_edge('A', 'B', weight=1)
+        graph.add_edge('B', 'C', weight=1)
+        graph.add_edge('C', 'A', weight=1)
+        self.assertEqual(bidirectional_dijkstra(graph, 'A', 'C')[0], ['A', 'B', 'C'])
+        self.assertEqual(bidirectional_dijkstra(graph, 'C', 'B')[0], ['C', 'A', 'B'])
+        csr = csrgraph.from_networkx(graph)
+        self.assertEqual(bidirectional_dijkstra(csr, 'C', 'B')[0], ['C', 'A', 'B'])
+
+    def test_same_length_as_dijkstra(self):
+        rng = random.Random(3)
+        graph = networkx.gnm_random_graph(200, 600, seed=3)
+        for u, v in graph.edges:
+            graph[u][v]['weight'] = rng.uniform(1, 10)
+        csr = csrgraph.from_networkx(graph)
+        for _ in range(50):
+            start, end = rng.randrange(200), rng.randrange(200)
+            expected = dijkstra(graph, start, end)
+            result = bidirectional_dijkstra(csr, start, end)
+            if start == end or not expected:
+                continue
+            self.assertAlmostEqual(path_length(graph, result[0]),
+                                   path_length(graph, expected[0]))
+
+if __name__ == '__main__':
+    unittest.main()
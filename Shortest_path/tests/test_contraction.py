@@ -0,0 +1,77 @@
+import os
+import random
+import tempfile
+import unittest
+from contraction import contract, ch_query, contractionhierarchy
+from csr_graph import csrgraph
+from dijkstra import dijkstra, reconstruct_shortest_path
+from search_stats import searchstats
+from tests.helpers import random_graph, path_length
+
+class ContractionTestCase(unittest.TestCase):
+    def check_against_dijkstra(self, graph, hierarchy, seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            start, end = rng.randrange(150), rng.randrange(150)
+            if start == end:
+                continue
+            expected = dijkstra(graph, start, end)
+            result = ch_query(hierarchy, start, end)
+            if not expected:
+                self.assertEqual(result, [])
+                continue
+            path, visited = result
+            # every step of the unpacked path is an edge of the original graph
+            for u, v in zip(path, path[1:]):
+                self.assertTrue(graph.has_edge(u, v))
+            self.assertAlmostEqual(path_length(graph, path), path_length(graph, expected[0]))
+            self.assertEqual(reconstruct_shortest_path(visited, start, end), path)
+
+    def test_undirected(self):
+        graph = random_graph(1, 150, 400, directed=False)
+        hierarchy = contract(graph)
+        self.check_against_dijkstra(graph, hierarchy, 1)
+
+    def test_directed(self):
+        graph = random_graph(2, 150, 400)
+        hierarchy = contract(csrgraph.from_networkx(graph))
+        self.check_against_dijkstra(graph, hierarchy, 2)
+
+    def test_report(self):
+        hierarchy = contract(random_graph(3, 150, 400, directed=False))
+        self.assertGreater(hierarchy.shortcut_count, 0)
+        self.assertEqual(hierarchy.shortcut_count, len(hierarchy.middle))
+        self.assertGreaterEqual(hierarchy.preprocessing_time, 0)
+        self.assertEqual(sorted(hierarchy.rank), list(range(150)))
+
+    def test_save_and_load(self):
+        graph = random_graph(4, 150, 400, directed=False)
+        hierarchy = contract(graph)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'hierarchy.ch')
+            hierarchy.save(file_path)
+            loaded = contractionhierarchy.load(file_path)
+        self.assertEqual(loaded.shortcut_count, hierarchy.shortcut_count)
+        self.check_against_dijkstra(graph, loaded, 4)
+
+    def test_stats(self):
+        graph = random_graph(6, 150, 400, directed=False)
+        hierarchy = contract(graph)
+        stats = searchstats()
+        path, _ = ch_query(hierarchy, 3, 90, stats=stats)
+        self.assertEqual(ch_query(hierarchy, 3, 90)[0], path)
+        self.assertEqual(stats.searches, 1)
+        self.assertEqual(stats.pops, stats.settled)
+        self.assertGreater(stats.relaxed, 0)
+        # the upward searches settle far fewer nodes than Dijkstra
+        plain = searchstats()
+        dijkstra(csrgraph.from_networkx(graph), 3, 90, stats=plain)
+        self.assertLess(stats.settled, plain.settled)
+
+    def test_same_node_and_unknown_node(self):
+        hierarchy = contract(random_graph(5, 150, 400, directed=False))
+        self.assertEqual(ch_query(hierarchy, 3, 3), ([3], {}))
+        self.assertEqual(ch_query(hierarchy, 3, 'unknown'), [])
+
+if __name__ == '__main__':
+    unittest.main()
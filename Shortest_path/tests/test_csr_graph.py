@@ -0,0 +1,57 @@
+import unittest
+import networkx
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from ida_star import ida_star
+
+class CSRGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = networkx.Graph()
+        self.graph.add_edge('A', 'B', weight=1)
+        self.graph.add_edge('A', 'C', weight=4)
+        self.graph.add_edge('B', 'C', weight=2)
+        self.graph.add_edge('C', 'D', weight=1)
+
+    def test_from_networkx(self):
+        csr = csrgraph.from_networkx(self.graph)
+        self.assertEqual(len(csr), 4)
+        # undirected edges are stored in both directions
+        self.assertEqual(csr.edge_count(), 8)
+        self.assertEqual(sorted(csr.neighbors('C')), ['A', 'B', 'D'])
+        edges = dict(csr.edges_from(csr.index['A']))
+        self.assertEqual(edges, {csr.index['B']: 1.0, csr.index['C']: 4.0})
+
+    def test_from_edges(self):
+        csr = csrgraph.from_edges([('A', 'B', 1), ('B', 'C', 2)], directed=True,
+                                  positions={'A': (0, 0), 'B': (0, 1), 'C': (1, 1)})
+        self.assertEqual(csr.edge_count(), 2)
+        self.assertEqual(list(csr.neighbors('B')), ['C'])
+        self.assertEqual(list(csr.neighbors('C')), [])
+        self.assertEqual(csr.position(csr.index['C']), (1.0, 1.0))
+
+    def test_positions_from_labels(self):
+        graph = networkx.Graph()
+        graph.add_edge((60.0, 24.0), (60.1, 24.1), weight=1)
+        csr = csrgraph.from_networkx(graph)
+        self.assertEqual(csr.position(csr.index[(60.1, 24.1)]), (60.1, 24.1))
+
+    def test_dijkstra_on_csrgraph(self):
+        csr = csrgraph.from_networkx(self.graph)
+        path, visited = dijkstra(csr, 'A', 'D')
+        self.assertEqual(path, ['A', 'B', 'C', 'D'])
+        self.assertEqual(path, dijkstra(self.graph, 'A', 'D')[0])
+        self.assertEqual(visited['D'], 'C')
+
+    def test_dijkstra_no_path(self):
+        self.graph.add_node('E')
+        csr = csrgraph.from_networkx(self.graph)
+        self.assertEqual(dijkstra(csr, 'A', 'E'), [])
+        self.assertEqual(dijkstra(csr, 'A', 'unknown'), [])
+
+    def test_ida_star_on_csrgraph(self):
+        csr = csrgraph.from_networkx(self.graph)
+        self.assertEqual(ida_star(csr, 'A', 'D'), ['A', 'B', 'C', 'D'])
+        self.assertEqual(ida_star(self.graph, 'A', 'D'), ['A', 'B', 'C', 'D'])
+
+if __name__ == '__main__':
+    unittest.main()
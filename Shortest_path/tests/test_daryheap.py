@@ -0,0 +1,74 @@
+import random
+import unittest
+import networkx
+from dijkstra import daryheap, dijkstra
+
+class DaryHeapTestCase(unittest.TestCase):
+    def test_push_and_pop(self):
+        for arity in (2, 4, 8):
+            heap = daryheap(arity)
+            heap.push('A', 5)
+            heap.push('B', 3)
+            heap.push('C', 7)
+
+            self.assertFalse(heap.is_empty())
+            self.assertEqual(len(heap), 3)
+            self.assertEqual(heap.pop(), (3, 'B'))
+            self.assertEqual(heap.pop(), (5, 'A'))
+            self.assertEqual(heap.pop(), (7, 'C'))
+            self.assertIsNone(heap.pop())
+            self.assertTrue(heap.is_empty())
+
+    def test_update(self):
+        heap = daryheap()
+        heap.push('A', 5)
+        heap.push('B', 3)
+        heap.push('C', 7)
+        # decrease-key after a pop, where the old binaryheap used the wrong index
+        self.assertEqual(heap.pop(), (3, 'B'))
+        heap.update('C', 1)
+        heap.update('A', 6)
+
+        self.assertNotIn('B', heap)
+        self.assertIn('C', heap)
+        self.assertEqual(heap.pop(), (1, 'C'))
+        self.assertEqual(heap.pop(), (6, 'A'))
+        self.assertTrue(heap.is_empty())
+
+    def test_update_missing_node(self):
+        heap = daryheap()
+        with self.assertRaises(KeyError):
+            heap.update('A', 1)
+
+    def test_invalid_arity(self):
+        with self.assertRaises(ValueError):
+            daryheap(3)
+
+    def test_random_operations(self):
+        rng = random.Random(7)
+        for arity in (2, 4, 8):
+            heap = daryheap(arity, capacity=500)
+            keys = {}
+            for node in range(500):
+                keys[node] = rng.random()
+                heap.push(node, keys[node])
+            for node in rng.sample(range(500), 250):
+                keys[node] = rng.random()
+                heap.update(node, keys[node])
+
+            popped = []
+            while not heap.is_empty():
+                popped.append(heap.pop())
+            self.assertEqual(popped, sorted((key, node) for node, key in keys.items()))
+
+    def test_dijkstra_uses_decrease_key(self):
+        graph = networkx.Graph()
+        graph.add_edge('A', 'B', weight=10)
+        graph.add_edge('A', 'C', weight=1)
+        graph.add_edge('C', 'B', weight=1)
+        graph.add_edge('B', 'D', weight=1)
+        path, _ = dijkstra(graph, 'A', 'D')
+        self.assertEqual(path, ['A', 'C', 'B', 'D'])
+
+if __name__ == '__main__':
+    unittest.main()
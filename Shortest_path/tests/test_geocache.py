@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from geocache import geocodecache, normalize_address, MISSING
+from tests.helpers import Clock
+
+class GeocodeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'geocode.sqlite3')
+        self.clock = Clock()
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def geocoder(self, address):
+        self.calls.append(address)
+        return None if address.startswith('Invalid') else (60.17, 24.94)
+
+    def test_normalize_address(self):
+        self.assertEqual(normalize_address('  Helsinki ,Finland. '), 'helsinki, finland')
+        self.assertEqual(normalize_address('HELSINKI,   FINLAND'), 'helsinki, finland')
+
+    def test_repeated_lookup_uses_memory(self):
+        cache = geocodecache(self.file_path, clock=self.clock)
+        self.assertEqual(cache.lookup('Helsinki, Finland', self.geocoder), (60.17, 24.94))
+        self.assertEqual(cache.lookup('helsinki,  finland', self.geocoder), (60.17, 24.94))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_disk_store_survives_restart(self):
+        geocodecache(self.file_path, clock=self.clock).lookup('Helsinki', self.geocoder)
+        cache = geocodecache(self.file_path, clock=self.clock)
+        self.assertEqual(cache.lookup('Helsinki', self.geocoder), (60.17, 24.94))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(cache.disk_hits, 1)
+
+    def test_negative_cache_and_ttl(self):
+        cache = geocodecache(self.file_path, ttl=100, negative_ttl=10, clock=self.clock)
+        self.assertIsNone(cache.lookup('Invalid Address', self.geocoder))
+        self.assertIsNone(cache.lookup('Invalid Address', self.geocoder))
+        self.assertEqual(len(self.calls), 1)
+        # the not found entry expires first
+        self.clock.now += 50
+        cache.lookup('Invalid Address', self.geocoder)
+        self.assertEqual(len(self.calls), 2)
+        cache.lookup('Helsinki', self.geocoder)
+        self.clock.now += 150
+        self.assertIs(cache.get(normalize_address('Helsinki')), MISSING)
+
+    def test_missing(self):
+        cache = geocodecache(self.file_path, ttl=100, clock=self.clock)
+        cache.lookup('Helsinki', self.geocoder)
+        # the disk store counts, an expired entry does not
+        cache = geocodecache(self.file_path, ttl=100, clock=self.clock)
+        self.assertEqual(cache.missing(['helsinki', 'espoo']), ['espoo'])
+        self.assertEqual(cache.stats()['misses'], 0)
+        self.clock.now += 150
+        self.assertEqual(cache.missing(['helsinki']), ['helsinki'])
+
+    def test_errors_are_not_cached(self):
+        cache = geocodecache(None, clock=self.clock)
+        def failing(address):
+            raise TimeoutError("geocoder timed out")
+        with self.assertRaises(TimeoutError):
+            cache.lookup('Helsinki', failing)
+        self.assertEqual(cache.lookup('Helsinki', self.geocoder), (60.17, 24.94))
+
+    def test_lru_eviction(self):
+        cache = geocodecache(None, max_entries=2, clock=self.clock)
+        for address in ('A', 'B', 'A', 'C'):
+            cache.lookup(address, self.geocoder)
+        # B was the least recently used
+        self.assertEqual(cache.stats()['entries'], 2)
+        cache.lookup('B', self.geocoder)
+        self.assertEqual(self.calls, ['A', 'B', 'C', 'B'])
+
+    def test_shortest_path_geocode_uses_cache(self):
+        import shortest_path
+        cache = geocodecache(None)
+        with patch.object(shortest_path, 'geocode_cache', cache), \
+                patch.object(shortest_path, 'geocode_address', side_effect=self.geocoder):
+            self.assertEqual(shortest_path.geocode('Helsinki'), (60.17, 24.94))
+            self.assertEqual(shortest_path.geocode('Helsinki'), (60.17, 24.94))
+        self.assertEqual(len(self.calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import shortest_path
+from geocache import geocodecache
+from ratelimit import ratelimiter
+from tests.helpers import LocalGeocoder
+
+class GeocodeManyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.geocoder = LocalGeocoder(0.2)
+        self.patches = [
+            patch.object(shortest_path, 'geocode_cache', geocodecache(None)),
+            patch.object(shortest_path, 'geocode_address', side_effect=self.geocoder),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+
+    def test_lookups_run_concurrently(self):
+        started = time.perf_counter()
+        sequential = [shortest_path.geocode('Kamppi'), shortest_path.geocode('Pasila')]
+        sequential_time = time.perf_counter() - started
+        shortest_path.geocode_cache.clear()
+
+        started = time.perf_counter()
+        concurrent = shortest_path.geocode_many(['Kamppi', 'Pasila'])
+        concurrent_time = time.perf_counter() - started
+
+        self.assertEqual(concurrent, sequential)
+        self.assertGreater(sequential_time, 0.38)
+        self.assertLess(concurrent_time, 0.3)
+
+    def test_same_address_looked_up_once(self):
+        result = shortest_path.geocode_many(['Kamppi', 'Kamppi', 'Nowhere'])
+        self.assertEqual(result[0], result[1])
+        self.assertIsNone(result[2])
+        self.assertEqual(sorted(self.geocoder.calls), ['Kamppi', 'Nowhere'])
+
+    def test_timeout(self):
+        self.geocoder.delay = 0.5
+        started = time.perf_counter()
+        result = shortest_path.geocode_many(['Kamppi', 'Pasila'], timeout=0.1)
+        self.assertEqual(result, [None, None])
+        self.assertLess(time.perf_counter() - started, 0.4)
+
+class RateLimiterTestCase(unittest.TestCase):
+    def test_calls_are_spaced(self):
+        limiter = ratelimiter(20)
+        started = time.perf_counter()
+        threads = [threading.Thread(target=limiter.acquire) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 5 calls at 20 per second: the last one waits for 4 intervals
+        self.assertGreaterEqual(time.perf_counter() - started, 0.19)
+
+    def test_no_limit(self):
+        limiter = ratelimiter(None)
+        self.assertEqual(limiter.acquire(), 0.0)
+
+    def test_pool_respects_rate_limit(self):
+        # the real geocode_address waits for the limiter before calling the geocoder
+        calls = []
+        with patch.object(shortest_path, 'geocode_cache', geocodecache(None)), \
+                patch.object(shortest_path, 'geocode_limiter', ratelimiter(10)), \
+                patch.object(shortest_path.geolocator, 'geocode',
+                             side_effect=lambda address: calls.append(time.perf_counter())):
+            shortest_path.geocode_many(['A', 'B', 'C'])
+        calls.sort()
+        self.assertGreaterEqual(calls[2] - calls[0], 0.18)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import struct
+import tempfile
+import unittest
+import networkx
+import numpy
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from graph_file import save_graph, open_graph, open_spatial_index, read_header, VERSION
+from osm_loader import load_osm
+from spatial_index import spatialindex
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+def grid_graph(side):
+    graph = networkx.grid_2d_graph(side, side)
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = 1.0 + (u[0] * 7 + v[1] * 3) % 5
+    return graph
+
+class GraphFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.file_path = os.path.join(self.directory.name, 'road.graph')
+
+    def test_osm_graph_round_trip(self):
+        graph = load_osm(SMALL_OSM)
+        save_graph(graph, self.file_path)
+        loaded = open_graph(self.file_path)
+        # the arrays are used in place from the mapped file
+        self.assertIsInstance(loaded.offsets, memoryview)
+        self.assertIsInstance(loaded.lat, memoryview)
+        self.assertTrue(loaded.directed)
+        self.assertEqual(list(loaded.labels), graph.labels)
+        self.assertEqual(list(loaded.offsets), list(graph.offsets))
+        self.assertEqual(list(loaded.targets), list(graph.targets))
+        self.assertEqual(list(loaded.weights), list(graph.weights))
+        self.assertEqual(loaded.position(2), graph.position(2))
+        self.assertEqual(dijkstra(loaded, 6, 4)[0], [6, 3, 2, 1, 4])
+        header = read_header(self.file_path)
+        self.assertEqual((header['version'], header['node_count'], header['edge_count']),
+                         (VERSION, 6, 11))
+
+    def test_networkx_round_trip(self):
+        graph = grid_graph(6)
+        save_graph(graph, self.file_path)
+        loaded = open_graph(self.file_path)
+        self.assertFalse(loaded.directed)
+        # tuple labels are kept, and the labels are the coordinates
+        self.assertEqual(list(loaded.labels), list(graph.nodes))
+        back = loaded.to_networkx()
+        self.assertIsInstance(back, networkx.Graph)
+        self.assertFalse(back.is_directed())
+        self.assertEqual({(frozenset((u, v)), d['weight']) for u, v, d in back.edges(data=True)},
+                         {(frozenset((u, v)), d['weight']) for u, v, d in graph.edges(data=True)})
+        self.assertEqual(back.nodes[(2, 3)]['pos'], (2, 3))
+        for start, end in (((0, 0), (5, 5)), ((2, 4), (5, 0))):
+            self.assertEqual(dijkstra(loaded, start, end)[0], dijkstra(graph, start, end)[0])
+
+    def test_spatial_index_is_stored(self):
+        rng = numpy.random.default_rng(3)
+        points = rng.uniform(60, 61, (500, 2))
+        edges = [(i, i + 1, 1.0) for i in range(499)]
+        graph = csrgraph.from_edges(edges, positions=dict(enumerate(map(tuple, points))))
+        save_graph(graph, self.file_path)
+        loaded, index = open_spatial_index(self.file_path)
+        built = spatialindex.from_graph(graph)
+        queries = rng.uniform(60, 61, (50, 2))
+        numpy.testing.assert_array_equal(index.snap(queries)[0], built.snap(queries)[0])
+        self.assertEqual(index.nearest(points[17]), (17, 0.0))
+        self.assertEqual(loaded.labels[17], 17)
+
+    def test_graph_without_coordinates(self):
+        graph = csrgraph.from_edges([('a', 'b', 2.0), ('b', 'c', 3.0)], directed=True)
+        save_graph(graph, self.file_path)
+        loaded, index = open_spatial_index(self.file_path)
+        self.assertIsNone(index)
+        self.assertIsNone(loaded.lat)
+        self.assertEqual(dijkstra(loaded, 'a', 'c')[0], ['a', 'b', 'c'])
+
+    def test_labels(self):
+        labels = ['a', 2.5, (1, ('x', -3.0)), None, True, 'ä' * 3]
+        graph = csrgraph.from_edges([(u, v, 1.0) for u, v in zip(labels, labels[1:])])
+        save_graph(graph, self.file_path)
+        self.assertEqual(list(open_graph(self.file_path).labels), labels)
+        # labels are data, a label that JSON can not hold is refused
+        graph = csrgraph.from_edges([('a', frozenset('b'), 1.0)])
+        with self.assertRaises(ValueError):
+            save_graph(graph, self.file_path)
+
+    def test_damaged_file(self):
+        save_graph(load_osm(SMALL_OSM), self.file_path)
+        with open(self.file_path, 'r+b') as file:
+            file.seek(100)
+            byte = file.read(1)
+            file.seek(100)
+            file.write(bytes([byte[0] ^ 0xff]))
+        with self.assertRaises(ValueError):
+            open_graph(self.file_path)
+        # without the check the file still opens
+        open_graph(self.file_path, verify=False)
+
+    def test_wrong_files(self):
+        save_graph(load_osm(SMALL_OSM), self.file_path)
+        with open(self.file_path, 'rb') as file:
+            data = file.read()
+        other_path = os.path.join(self.directory.name, 'other.graph')
+        for damaged in (b'not a graph file' * 8,
+                        data[:8] + struct.pack('<I', VERSION + 1) + data[12:],
+                        data[:-8]):
+            with open(other_path, 'wb') as file:
+                file.write(damaged)
+            with self.assertRaises(ValueError):
+                open_graph(other_path)
+
+if __name__ == '__main__':
+    unittest.main()
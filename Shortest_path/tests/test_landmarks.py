@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import unittest
+import networkx
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from ida_star import ida_star
+from landmarks import select_landmarks, landmarkset, distances_from
+from straight_line import BLOCK_SIZE
+from tests.helpers import path_length
+
+def grid(side, seed=1):
+    rng = random.Random(seed)
+    graph = networkx.grid_2d_graph(side, side)
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = rng.uniform(1, 2)
+    return graph
+
+class LandmarksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = grid(30)
+        self.csr = csrgraph.from_networkx(self.graph)
+        self.landmarks = select_landmarks(self.csr, 6)
+
+    def test_farthest_point_selection(self):
+        self.assertEqual(len(self.landmarks.landmarks), 6)
+        self.assertEqual(len(set(self.landmarks.landmarks)), 6)
+        # the first landmarks of a grid are its corners
+        corners = {self.csr.index[node] for node in [(0, 0), (0, 29), (29, 0), (29, 29)]}
+        self.assertTrue(set(self.landmarks.landmarks[:2]) <= corners)
+
+    def test_lower_bound(self):
+        rng = random.Random(2)
+        for _ in range(10):
+            target = rng.randrange(len(self.csr))
+            # in an undirected graph d(v, target) = d(target, v)
+            true_distances = distances_from(self.csr, target)
+            table = self.landmarks.table(self.csr.labels[target])
+            self.assertTrue((table <= true_distances + 1e-9).all())
+            node = rng.randrange(len(self.csr))
+            self.assertAlmostEqual(self.landmarks.estimate(node, target), table[node])
+
+    def test_lazy_table(self):
+        target = self.csr.labels[100]
+        table = self.landmarks.table(target)
+        lazy = self.landmarks.lazy_table(target)
+        self.assertAlmostEqual(lazy[BLOCK_SIZE + 5], table[BLOCK_SIZE + 5])
+        # one block was computed, not the whole graph
+        self.assertEqual(set(lazy), set(range(BLOCK_SIZE, 2 * BLOCK_SIZE)))
+        self.assertAlmostEqual(lazy[len(self.csr) - 1], table[-1])
+        self.assertEqual([lazy[node] for node in range(len(self.csr))], table.tolist())
+
+    def test_astar_same_length_fewer_nodes(self):
+        start, end = (1, 2), (28, 27)
+        plain_path, plain_visited = dijkstra(self.csr, start, end)
+        path, visited = dijkstra(self.csr, start, end, self.landmarks)
+        self.assertAlmostEqual(path_length(self.graph, path), path_length(self.graph, plain_path))
+        self.assertLess(len(visited) * 3, len(plain_visited))
+        # networkx graphs take the same heuristic
+        path, _ = dijkstra(self.graph, start, end, self.landmarks)
+        self.assertAlmostEqual(path_length(self.graph, path), path_length(self.graph, plain_path))
+
+    def test_ida_star_with_landmarks(self):
+        start, end = (3, 4), (20, 25)
+        expected, _ = dijkstra(self.graph, start, end)
+        path = ida_star(self.csr, start, end, heuristic_function=self.landmarks)
+        self.assertAlmostEqual(path_length(self.graph, path), path_length(self.graph, expected))
+
+    def test_directed(self):
+        graph = networkx.DiGraph()
+        graph.add_edge('A', 'B', weight=1)
+        graph.add_edge('B', 'C', weight=1)
+        graph.add_edge('C', 'A', weight=5)
+        landmarks = select_landmarks(graph, 2)
+        self.assertLessEqual(landmarks('A', 'C'), 2)
+        self.assertLessEqual(landmarks('C', 'B'), 6)
+        self.assertEqual(dijkstra(graph, 'C', 'B', landmarks)[0], ['C', 'A', 'B'])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'landmarks.npz')
+            self.landmarks.save(file_path)
+            loaded = landmarkset.load(file_path, self.graph)
+            with self.assertRaises(ValueError):
+                landmarkset.load(file_path, grid(5))
+        self.assertEqual(loaded.landmarks, self.landmarks.landmarks)
+        self.assertEqual(loaded((0, 0), (29, 29)), self.landmarks((0, 0), (29, 29)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from mapstore import mapstore, map_key
+from shortest_path import app, plot_shortest_path
+from tests.helpers import Clock
+
+class MapStoreTestCase(unittest.TestCase):
+    def test_content_addressed(self):
+        store = mapstore()
+        key = store.put('<html>map</html>')
+        self.assertEqual(key, map_key(b'<html>map</html>'))
+        self.assertTrue(key.endswith('.html'))
+        self.assertEqual(store.put(b'<html>map</html>'), key)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.get(key), b'<html>map</html>')
+        self.assertNotEqual(store.put('<html>other</html>'), key)
+
+    def test_unknown_and_invalid_keys(self):
+        store = mapstore()
+        self.assertIsNone(store.get('0' * 64 + '.html'))
+        self.assertIsNone(store.get('../templates/index.html'))
+        self.assertEqual(store.stats()['misses'], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        store = mapstore(max_entries=2)
+        first = store.put('first')
+        second = store.put('second')
+        store.get(first)
+        third = store.put('third')
+        self.assertIsNone(store.get(second))
+        self.assertEqual(store.get(first), b'first')
+        self.assertEqual(store.get(third), b'third')
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_size_limit(self):
+        store = mapstore(max_bytes=25)
+        keys = [store.put(str(i) * 10) for i in range(5)]
+        stats = store.stats()
+        self.assertLessEqual(stats['bytes'], 25)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(store.get(keys[-1]), b'4' * 10)
+        self.assertIsNone(store.get(keys[0]))
+
+    def test_age_limit(self):
+        clock = Clock()
+        store = mapstore(max_age=60, clock=clock)
+        key = store.put('map')
+        clock.now += 59
+        self.assertEqual(store.get(key), b'map')
+        clock.now += 1
+        self.assertIsNone(store.get(key))
+        self.assertEqual(store.stats()['bytes'], 0)
+
+    def test_spill_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = mapstore(max_entries=1, spill_directory=directory, max_spill_bytes=10)
+            first = store.put('first')
+            second = store.put('second')
+            self.assertEqual(os.listdir(directory), [first])
+            # read back from disk, the file goes away as the map is in memory again
+            self.assertEqual(store.get(first), b'first')
+            self.assertEqual(store.stats()['spill_hits'], 1)
+            self.assertEqual(os.listdir(directory), [second])
+            # the spill directory has its own size limit
+            for i in range(5):
+                store.put(f'map {i}')
+            self.assertLessEqual(store.stats()['spilled_bytes'], 10)
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(directory, name))
+                                     for name in os.listdir(directory)), 10)
+            store.clear()
+            self.assertEqual(os.listdir(directory), [])
+            self.assertEqual(len(store), 0)
+
+class DisplayMapStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        self.store = mapstore()
+        patcher = patch('shortest_path.map_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_serves_from_store(self):
+        key = self.store.put('<html>route</html>')
+        response = self.app.get(f'/display_map/{key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/html')
+        self.assertEqual(response.data, b'<html>route</html>')
+        # the browser can revalidate with the key as ETag
+        response = self.app.get(f'/display_map/{key}', headers={'If-None-Match': f'"{key}"'})
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_map(self):
+        response = self.app.get('/display_map/' + '0' * 64 + '.html')
+        self.assertEqual(response.status_code, 404)
+
+    @patch('shortest_path.osrm_client')
+    def test_plot_puts_map_into_store(self, mock_osrm_client):
+        mock_osrm_client.route.return_value = [(60.17, 24.94), (60.18, 24.95)]
+        file_path, _ = plot_shortest_path((60.17, 24.94), (60.18, 24.95), [])
+        self.assertIn(file_path, self.store)
+        self.assertIn(b'leaflet', self.store.get(file_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from geo import haversine
+from graph_file import save_graph
+from matrix import distance_matrix, one_to_many, one_to_many_paths, matrix_pool
+from osm_loader import load_osm
+from spatial_index import spatialindex
+from shortest_path import app
+from tests.helpers import random_graph
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+def expected_matrix(graph, sources, targets):
+    matrix = numpy.full((len(sources), len(targets)), numpy.inf)
+    for i, source in enumerate(sources):
+        for j, target in enumerate(targets):
+            if source == target:
+                matrix[i, j] = 0.0
+                continue
+            result = dijkstra(graph, source, target)
+            if result:
+                path = result[0]
+                matrix[i, j] = sum(graph[u][v]['weight'] for u, v in zip(path, path[1:]))
+    return matrix
+
+class DistanceMatrixTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = random_graph(1, 120, 300)
+        self.csr = csrgraph.from_networkx(self.graph)
+        rng = random.Random(2)
+        self.sources = rng.sample(range(120), 5)
+        # a repeated target and the first source as a target
+        self.targets = rng.sample(range(120), 12) + [self.sources[0], self.sources[0]]
+        self.expected = expected_matrix(self.graph, self.sources, self.targets)
+
+    def test_matrix(self):
+        matrix = distance_matrix(self.csr, self.sources, self.targets)
+        self.assertEqual(matrix.shape, (5, 14))
+        numpy.testing.assert_allclose(matrix, self.expected)
+        self.assertTrue(numpy.isinf(self.expected).any())
+
+    def test_more_sources_than_targets(self):
+        # searched backward from the targets on the reversed graph
+        matrix = distance_matrix(self.graph, self.targets, self.sources)
+        numpy.testing.assert_allclose(matrix,
+                                      expected_matrix(self.graph, self.targets, self.sources))
+
+    def test_one_to_many(self):
+        index = self.csr.index
+        row = one_to_many(self.csr, index[self.sources[1]], [index[t] for t in self.targets])
+        numpy.testing.assert_allclose(row, self.expected[1])
+
+    def test_one_to_many_paths(self):
+        index = self.csr.index
+        labels = self.csr.labels
+        paths = one_to_many_paths(self.csr, index[self.sources[1]],
+                                  [index[t] for t in self.targets])
+        for (path, distance), target, expected in zip(paths, self.targets, self.expected[1]):
+            self.assertEqual(distance, expected)
+            if path is None:
+                continue
+            path = [labels[node_id] for node_id in path]
+            self.assertEqual((path[0], path[-1]), (self.sources[1], target))
+            self.assertAlmostEqual(sum(self.graph[u][v]['weight']
+                                       for u, v in zip(path, path[1:])), distance)
+
+    def test_process_pool(self):
+        numpy.testing.assert_allclose(
+            distance_matrix(self.csr, self.sources, self.targets, processes=2), self.expected)
+        numpy.testing.assert_allclose(
+            distance_matrix(self.csr, self.targets, self.sources, processes=2),
+            expected_matrix(self.graph, self.targets, self.sources))
+
+    def test_pool_opens_graph_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'road.graph')
+            save_graph(self.csr, file_path)
+            with matrix_pool(None, 2, file_path) as pool:
+                matrix = distance_matrix(self.csr, self.sources, self.targets, pool=pool)
+        numpy.testing.assert_allclose(matrix, self.expected)
+
+    def test_empty_and_unknown(self):
+        self.assertEqual(distance_matrix(self.csr, [], [1, 2]).shape, (0, 2))
+        with self.assertRaises(KeyError):
+            distance_matrix(self.csr, [1], ['nowhere'])
+
+class MatrixEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        road = load_osm(SMALL_OSM)
+        for name, value in (('road_graph', road), ('road_index', spatialindex.from_graph(road)),
+                            ('distance_pool', None)):
+            patcher = patch(f'shortest_path.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.road = road
+
+    def test_matrix(self):
+        # on node 6 and next to node 1, and on node 4
+        sources = [[60.171, 24.944], [60.1699, 24.94]]
+        targets = [[60.171, 24.94]]
+        response = self.app.post('/api/matrix', json={'sources': sources, 'targets': targets})
+        self.assertEqual(response.status_code, 200)
+        distances = response.get_json()['distances']
+        expected = distance_matrix(self.road, [6, 1], [4])
+        self.assertAlmostEqual(distances[0][0], expected[0][0])
+        self.assertAlmostEqual(distances[1][0],
+                               expected[1][0] + haversine(60.1699, 24.94, 60.17, 24.94))
+
+    def test_same_point(self):
+        response = self.app.post('/api/matrix', json={'sources': [[60.171, 24.944]],
+                                                      'targets': [[60.171, 24.944]]})
+        self.assertEqual(response.get_json()['distances'], [[0.0]])
+
+    def test_bad_requests(self):
+        for body in ({}, {'sources': [[1, 2]], 'targets': []},
+                     {'sources': [[1, 2]], 'targets': [[1, 'x']]},
+                     {'sources': [[1, 2, 3]], 'targets': [[1, 2]]}):
+            self.assertEqual(self.app.post('/api/matrix', json=body).status_code, 400)
+        with patch('shortest_path.MATRIX_MAX_CELLS', 3):
+            body = {'sources': [[60.17, 24.94]] * 2, 'targets': [[60.17, 24.94]] * 2}
+            self.assertEqual(self.app.post('/api/matrix', json=body).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
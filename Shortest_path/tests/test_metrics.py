@@ -0,0 +1,102 @@
+import threading
+import unittest
+from unittest.mock import patch
+from metrics import metricsregistry, histogram
+import shortest_path
+from shortest_path import app
+from tests.helpers import Clock
+
+class MetricsTestCase(unittest.TestCase):
+    def test_counter(self):
+        registry = metricsregistry()
+        requests = registry.counter('requests_total', 'Requests.', ('result',))
+        requests.inc('ok')
+        requests.inc('ok', amount=2)
+        requests.inc('say "no"\n')
+        self.assertEqual(requests.value('ok'), 3)
+        self.assertEqual(registry.render(),
+                         '# HELP requests_total Requests.\n'
+                         '# TYPE requests_total counter\n'
+                         'requests_total{result="ok"} 3\n'
+                         'requests_total{result="say \\"no\\"\\n"} 1\n')
+
+    def test_histogram(self):
+        clock = Clock(100.0)
+        registry = metricsregistry(clock=clock)
+        seconds = registry.histogram('stage_seconds', 'Stages.', ('stage',), buckets=(0.1, 1.0))
+        seconds.observe(0.05, 'search')
+        seconds.observe(0.1, 'search')
+        with seconds.time('search'):
+            clock.now += 2.5
+        self.assertEqual(seconds.count('search'), 3)
+        self.assertEqual(seconds.count('osrm'), 0)
+        self.assertEqual(registry.render().splitlines()[2:], [
+            'stage_seconds_bucket{stage="search",le="0.1"} 2',
+            'stage_seconds_bucket{stage="search",le="1.0"} 2',
+            'stage_seconds_bucket{stage="search",le="+Inf"} 3',
+            'stage_seconds_sum{stage="search"} 2.65',
+            'stage_seconds_count{stage="search"} 3'])
+
+    def test_timer_counts_failures(self):
+        seconds = histogram('stage_seconds', 'Stages.')
+        with self.assertRaises(KeyError):
+            with seconds.time():
+                raise KeyError('x')
+        self.assertEqual(seconds.count(), 1)
+
+    def test_threads(self):
+        requests = metricsregistry().counter('requests_total', 'Requests.')
+        def count():
+            for _ in range(10000):
+                requests.inc()
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(requests.value(), 40000)
+
+    def test_disabled(self):
+        registry = metricsregistry(enabled=False)
+        requests = registry.counter('requests_total', 'Requests.', ('result',))
+        seconds = registry.histogram('stage_seconds', 'Stages.', ('stage',))
+        requests.inc('ok')
+        with seconds.time('search'):
+            pass
+        self.assertIs(seconds.time('search'), seconds.time('osrm'))
+        self.assertEqual((requests.value('ok'), seconds.count('search')), (0, 0))
+        self.assertEqual(registry.render(), '')
+
+class MetricsEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+
+    @patch('shortest_path.osrm_client')
+    @patch('shortest_path.geocode', return_value=(0.0, 0.0))
+    def test_route_request_stages(self, _, osrm_client):
+        osrm_client.route.return_value = [(0.0, 0.0), (0.0, 0.0)]
+        geocoded = shortest_path.stage_seconds.count('geocode')
+        rendered = shortest_path.stage_seconds.count('render')
+        ok = shortest_path.route_requests.value('ok')
+        response = self.app.post('/', data={'start': 'a', 'end': 'b'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(shortest_path.stage_seconds.count('geocode'), geocoded + 1)
+        self.assertEqual(shortest_path.stage_seconds.count('render'), rendered + 1)
+        self.assertEqual(shortest_path.route_requests.value('ok'), ok + 1)
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        for stage in ('geocode', 'osrm', 'render'):
+            self.assertIn(f'shortest_path_stage_seconds_count{{stage="{stage}"}}', text)
+        self.assertIn('shortest_path_http_requests_total{endpoint="home",method="POST",'
+                      'status="302"}', text)
+
+    def test_disabled(self):
+        with patch('shortest_path.metrics', metricsregistry(enabled=False)):
+            self.assertEqual(self.app.get('/metrics').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import unittest
+from unittest.mock import patch
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra
+from geo import haversine
+from ida_star import ida_star
+from osm_loader import osmloader, load_osm, osmium
+from spatial_index import spatialindex
+from shortest_path import find_shortest_path
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+class OSMLoaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loader = osmloader()
+        self.graph = self.loader.load(SMALL_OSM)
+
+    def edges(self):
+        graph = self.graph
+        return {(graph.labels[u], graph.labels[v])
+                for u in range(len(graph)) for v, _ in graph.edges_from(u)}
+
+    def test_only_drivable_ways(self):
+        self.assertIsInstance(self.graph, csrgraph)
+        # footway, building, private road and the edge to the missing node are left out
+        self.assertEqual(sorted(self.graph.labels), [1, 2, 3, 4, 5, 6])
+        self.assertTrue(self.graph.directed)
+
+    def test_oneway(self):
+        self.assertEqual(self.edges(), {
+            (1, 2), (2, 1), (2, 3), (3, 2), (1, 4), (4, 1), (3, 6), (6, 3),
+            (4, 5), (5, 6),  # oneway=yes
+            (5, 2),          # oneway=-1
+        })
+
+    def test_lengths_and_positions(self):
+        graph = self.graph
+        node = graph.index[1]
+        self.assertEqual(graph.position(node), (60.17, 24.94))
+        for target, weight in graph.edges_from(node):
+            lat, lon = graph.position(target)
+            self.assertAlmostEqual(weight, haversine(60.17, 24.94, lat, lon))
+        # 0.002 degrees of longitude at 60 degrees north is about 111 m
+        self.assertAlmostEqual(dict(graph.edges_from(node))[graph.index[2]], 110.6, delta=0.5)
+
+    def test_algorithms_use_the_graph(self):
+        self.assertEqual(dijkstra(self.graph, 6, 4)[0], [6, 3, 2, 1, 4])
+        self.assertEqual(bidirectional_dijkstra(self.graph, 5, 1)[0], [5, 2, 1])
+        self.assertEqual(ida_star(self.graph, 3, 4), [3, 2, 1, 4])
+        self.assertEqual(dijkstra(load_osm(SMALL_OSM), 6, 4)[0], [6, 3, 2, 1, 4])
+
+    def test_stats(self):
+        stats = self.loader.stats()
+        self.assertEqual(stats['elements'], 20)
+        self.assertEqual(stats['nodes'], 10)
+        self.assertEqual(stats['ways'], 9)
+        self.assertEqual(stats['drivable_ways'], 6)
+        self.assertGreater(stats['seconds'], 0)
+        self.assertAlmostEqual(stats['elements_per_second'], 20 / stats['seconds'])
+
+    def test_app_road_graph(self):
+        road_index = spatialindex.from_graph(self.graph)
+        with patch('shortest_path.road_graph', self.graph), \
+                patch('shortest_path.road_index', road_index):
+            path = find_shortest_path((60.1711, 24.9441), (60.1699, 24.9399), 'dijkstra')
+        self.assertEqual(path, [(60.1711, 24.9441), (60.171, 24.944), (60.17, 24.944),
+                                (60.17, 24.942), (60.17, 24.94), (60.1699, 24.9399)])
+
+    @unittest.skipIf(osmium is not None, "osmium is installed")
+    def test_pbf_needs_osmium(self):
+        with self.assertRaises(ImportError):
+            self.loader.load('extract.osm.pbf')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import polyline
+from osrm import osrmclient
+
+ROUTE = [(60.1711, 24.9415), (60.1699, 24.9529), (60.3174, 24.9633)]
+
+class StandInOSRM(BaseHTTPRequestHandler):
+    # answers every route request with the same geometry, keeps connections alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        server.clients.add(self.client_address)
+        if server.failures > 0:
+            server.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(server.answer).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class OSRMClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInOSRM)
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.failures = 0
+        self.server.answer = {'routes': [{'geometry': polyline.encode(ROUTE)}]}
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = osrmclient(f"http://127.0.0.1:{self.server.server_port}/")
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_route(self):
+        route = self.client.route((60.1711, 24.9415), (60.3174, 24.9633))
+        self.assertEqual(route, ROUTE)
+        # longitude first in the OSRM url
+        self.assertEqual(self.server.requests,
+                         ['/route/v1/driving/24.9415,60.1711;24.9633,60.3174'])
+
+    def test_nearby_routes_come_from_cache(self):
+        self.client.route((60.1711, 24.9415), (60.3174, 24.9633))
+        self.client.route((60.171101, 24.941502), (60.317399, 24.9633))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.client.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_connection_is_reused(self):
+        for i in range(3):
+            self.client.route((60.17, 24.94 + i / 10), (60.31, 24.96))
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_retry_after_server_error(self):
+        self.server.failures = 1
+        self.assertEqual(self.client.route((60.17, 24.94), (60.31, 24.96)), ROUTE)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_missing_routes(self):
+        self.server.answer = {'routes': []}
+        with self.assertRaises(ValueError):
+            self.client.route((60.17, 24.94), (60.31, 24.96))
+        self.server.answer = {'routes': [{}]}
+        with self.assertRaises(ValueError):
+            self.client.route((60.18, 24.94), (60.31, 24.96))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import os
+import random
+import unittest
+from unittest.mock import patch
+import numpy
+import polyline
+from geo import point_distance
+from osm_loader import load_osm
+from path_geometry import pathgeometry, encode_polyline, path_weight
+from route_executor import search_road_route
+from routecache import routecache
+from spatial_index import spatialindex
+import shortest_path
+from shortest_path import app, plot_shortest_path
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+class PathGeometryTestCase(unittest.TestCase):
+    def test_encoded_polyline(self):
+        rng = random.Random(1)
+        points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(200)]
+        # small steps, like a road, and rounding exactly on a half
+        points += [(60.17 + i * 1e-5, 24.94 - i * 2.5e-6) for i in range(50)]
+        points += [(0.000005, -0.000015), (-0.000025, 0.000035)]
+        for precision in (5, 6):
+            self.assertEqual(encode_polyline(points, precision),
+                             polyline.encode(points, precision))
+        self.assertEqual(encode_polyline([(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]),
+                         '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(encode_polyline([]), '')
+
+    def test_segments(self):
+        points = [(60.17, 24.94), (60.17, 24.942), (60.171, 24.942)]
+        geometry = pathgeometry(points)
+        self.assertEqual(len(geometry), 3)
+        numpy.testing.assert_allclose(geometry.segments,
+                                      [point_distance(points[0], points[1]),
+                                       point_distance(points[1], points[2])])
+        self.assertAlmostEqual(geometry.distance, sum(geometry.segments))
+        self.assertEqual(geometry.points(), points)
+        self.assertEqual(geometry.flat().tolist(), [60.17, 24.94, 60.17, 24.942, 60.171, 24.942])
+        self.assertEqual(polyline.decode(geometry.polyline()), points)
+
+    def test_outputs(self):
+        geometry = pathgeometry([(60.17, 24.94), (60.171, 24.942)])
+        feature = geometry.geojson()
+        self.assertEqual(feature['geometry'], {'type': 'LineString',
+                                               'coordinates': [[24.94, 60.17], [24.942, 60.171]]})
+        self.assertEqual(feature['properties']['distance'], geometry.distance)
+        self.assertEqual(set(geometry.output('coordinates')), {'path', 'segments'})
+        self.assertEqual(set(geometry.output('polyline')), {'polyline', 'segments'})
+        self.assertEqual(geometry.output('geojson'), {'geojson': feature})
+        # a single point has no segments
+        self.assertEqual(pathgeometry([(60.17, 24.94)]).distance, 0.0)
+        with self.assertRaises(ValueError):
+            geometry.output('wkt')
+
+    def test_road_path(self):
+        road = load_osm(SMALL_OSM)
+        index = road.index
+        node_ids = [index[label] for label in (1, 2, 3)]
+        geometry = pathgeometry.from_nodes(road, node_ids)
+        self.assertEqual(geometry.points(), [road.position(node_id) for node_id in node_ids])
+        self.assertAlmostEqual(path_weight(road, node_ids), geometry.distance)
+
+    def test_search_road_route(self):
+        # the csrgraph route from the coordinate arrays is the one of the networkx graph
+        road = load_osm(SMALL_OSM)
+        start, end = (60.1711, 24.9441), (60.1699, 24.9399)
+        for algorithm in ('ida_star', 'dijkstra', 'bidirectional'):
+            coordinates, distance = search_road_route(road, spatialindex.from_graph(road),
+                                                      start, end, algorithm)
+            networkx_road = road.to_networkx()
+            expected = search_road_route(networkx_road, spatialindex.from_graph(networkx_road),
+                                         start, end, algorithm)
+            self.assertEqual(coordinates, expected[0])
+            self.assertAlmostEqual(distance, expected[1])
+
+class PathFormatEndpointTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+        road = load_osm(SMALL_OSM)
+        for name, value in (('road_graph', road), ('road_index', spatialindex.from_graph(road)),
+                            ('route_cache', routecache()), ('route_executor', None)):
+            patcher = patch(f'shortest_path.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pair = {'start': [60.1711, 24.9441], 'end': [60.1699, 24.9399]}
+
+    def route(self, path_format):
+        response = self.app.post('/api/routes', json={'pairs': [self.pair],
+                                                      'format': path_format})
+        return json.loads(response.get_data(as_text=True))
+
+    def test_formats(self):
+        plain = self.route('coordinates')
+        encoded = self.route('polyline')
+        feature = self.route('geojson')['geojson']
+        self.assertEqual(polyline.decode(encoded['polyline']),
+                         [tuple(point) for point in plain['path']])
+        self.assertEqual(encoded['segments'], plain['segments'])
+        self.assertAlmostEqual(sum(plain['segments']), plain['distance'])
+        self.assertEqual(feature['geometry']['coordinates'],
+                         [[lon, lat] for lat, lon in plain['path']])
+        self.assertLess(len(json.dumps(encoded['polyline'])), len(json.dumps(plain['path'])))
+        response = self.app.post('/api/routes', json={'pairs': [self.pair], 'format': 'wkt'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_map_draws_the_found_path(self):
+        path = [(60.1711, 24.9441), (60.171, 24.944), (60.1699, 24.9399)]
+        with patch('shortest_path.osrm_client') as osrm_client, \
+                patch('shortest_path.folium.PolyLine') as line, \
+                patch('shortest_path.MAP_GEOMETRY', 'path'):
+            plot_shortest_path(path[0], path[-1], path)
+            osrm_client.route.assert_not_called()
+            self.assertEqual(line.call_args[0][0], path)
+            with patch('shortest_path.MAP_GEOMETRY', 'osrm'):
+                plot_shortest_path(path[0], path[-1], path)
+            osrm_client.route.assert_called_once_with(path[0], path[-1])
+
+    @unittest.skipIf(any(os.environ.get(name) for name in
+                         ('MAP_GEOMETRY', 'ROAD_GRAPH_PATH', 'ROAD_OSM_PATH')),
+                     "a road network or map geometry is configured")
+    def test_map_geometry_default(self):
+        # the placeholder graph of the tests has no roads to draw, the map shows OSRM
+        self.assertEqual(shortest_path.MAP_GEOMETRY, 'osrm')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from graph_file import save_graph
+from matrix import one_to_many_paths
+from osm_loader import load_osm
+from route_executor import routeexecutor, search_road_route, saturated
+from spatial_index import spatialindex
+from shortest_path import app
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+START = (60.1711, 24.9441)
+END = (60.1699, 24.9399)
+
+def slow_search(graph, index, start_coordinates, end_coordinates, algorithm):
+    # stands for a long search, the workers inherit it when the pool forks
+    time.sleep(0.5)
+    return None, None
+
+class RouteExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = load_osm(SMALL_OSM)
+        self.index = spatialindex.from_graph(self.graph)
+
+    def executor(self, *args, **kwargs):
+        executor = routeexecutor(self.graph, self.index, *args, **kwargs)
+        self.addCleanup(executor.close)
+        return executor
+
+    def test_same_routes_as_in_process(self):
+        executor = self.executor(2)
+        for algorithm in ('ida_star', 'dijkstra', 'bidirectional'):
+            self.assertEqual(executor.search(START, END, algorithm),
+                             search_road_route(self.graph, self.index, START, END, algorithm))
+        with self.assertRaises(ValueError):
+            executor.search(START, END, 'teleport')
+        self.assertEqual(executor.stats()['completed'], 3)
+        self.assertEqual(executor.pending(), 0)
+
+    def test_paths(self):
+        executor = self.executor(1)
+        targets = [3, 5, 0]
+        self.assertEqual(executor.paths(0, targets), one_to_many_paths(self.graph, 0, targets))
+        self.assertEqual(executor.stats()['completed'], 1)
+        self.assertEqual(executor.pending(), 0)
+
+    def test_workers_open_graph_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'road.graph')
+            save_graph(self.graph, file_path)
+            executor = routeexecutor(None, None, 1, graph_path=file_path)
+            try:
+                route = executor.search(START, END, 'dijkstra')
+            finally:
+                executor.close()
+        self.assertEqual(route, search_road_route(self.graph, self.index, START, END, 'dijkstra'))
+
+    @patch('route_executor.search_road_route', slow_search)
+    def test_saturated(self):
+        executor = self.executor(1, max_pending=1)
+        first = threading.Thread(target=executor.search, args=(START, END, 'dijkstra'))
+        first.start()
+        while not executor.pending():
+            time.sleep(0.01)
+        with self.assertRaises(saturated):
+            executor.search(START, END, 'dijkstra')
+        first.join()
+        self.assertEqual(executor.search(START, END, 'dijkstra'), (None, None))
+        stats = executor.stats()
+        self.assertEqual((stats['rejected'], stats['completed'], stats['pending']), (1, 2, 0))
+
+    @patch('route_executor.search_road_route', slow_search)
+    def test_timeout(self):
+        executor = self.executor(1, timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            executor.search(START, END, 'dijkstra')
+        self.assertEqual(executor.stats()['timeouts'], 1)
+        # the late search keeps its place until it ends
+        self.assertEqual(executor.pending(), 1)
+        executor.close()
+        self.assertEqual(executor.pending(), 0)
+
+class RouteExecutorAppTestCase(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.app = app.test_client()
+
+    @patch('shortest_path.route_cache', MagicMock(get=MagicMock(return_value=None)))
+    @patch('shortest_path.geocode', return_value=(0.0, 0.0))
+    def test_busy_and_late_answers(self, _):
+        executor = MagicMock()
+        with patch('shortest_path.route_executor', executor):
+            executor.search.side_effect = saturated("busy")
+            response = self.app.post('/', data={'start': 'a', 'end': 'b'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], '1')
+            executor.search.side_effect = TimeoutError()
+            response = self.app.post('/', data={'start': 'a', 'end': 'b'})
+            self.assertEqual(response.status_code, 504)
+
+if __name__ == '__main__':
+    unittest.main()
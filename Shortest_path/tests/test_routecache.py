@@ -0,0 +1,127 @@
+import os
+import unittest
+from unittest.mock import patch
+from csr_graph import csrgraph
+from geo import point_distance
+from osm_loader import load_osm
+from routecache import routecache
+from spatial_index import spatialindex
+import shortest_path
+from shortest_path import app, find_route, find_shortest_path, reload_road_graph
+from tests.helpers import Clock
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+class RouteCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = object()
+
+    def test_hits_and_misses(self):
+        cache = routecache()
+        self.assertIsNone(cache.get(self.graph, (1, 2, 'dijkstra')))
+        value = ([(0.0, 0.0), (1.0, 1.0)], 5.0)
+        self.assertIs(cache.put(self.graph, (1, 2, 'dijkstra'), value), value)
+        self.assertIs(cache.get(self.graph, (1, 2, 'dijkstra')), value)
+        self.assertIsNone(cache.get(self.graph, (1, 2, 'ida_star')))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 2, 1))
+        self.assertAlmostEqual(stats['hit_rate'], 1 / 3)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = routecache(max_entries=2)
+        for key in ('a', 'b'):
+            cache.put(self.graph, key, key)
+        cache.get(self.graph, 'a')
+        cache.put(self.graph, 'c', 'c')
+        self.assertIsNone(cache.get(self.graph, 'b'))
+        self.assertEqual(cache.get(self.graph, 'a'), 'a')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired(self):
+        clock = Clock()
+        cache = routecache(max_age=60, clock=clock)
+        cache.get(self.graph, 'a')
+        cache.put(self.graph, 'a', 'route')
+        clock.now += 59
+        self.assertEqual(cache.get(self.graph, 'a'), 'route')
+        clock.now += 1
+        self.assertIsNone(cache.get(self.graph, 'a'))
+        self.assertEqual((len(cache), cache.stats()['evictions']), (0, 1))
+
+    def test_other_graph_invalidates(self):
+        cache = routecache()
+        cache.get(self.graph, 'a')
+        cache.put(self.graph, 'a', 'old route')
+        reloaded = object()
+        self.assertIsNone(cache.get(reloaded, 'a'))
+        # a search on the old graph that ends after the reload is not stored
+        cache.put(self.graph, 'b', 'old route')
+        self.assertIsNone(cache.get(reloaded, 'b'))
+        stats = cache.stats()
+        self.assertEqual((stats['invalidations'], stats['version'], stats['entries']), (1, 2, 0))
+
+class AppRouteCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        road = load_osm(SMALL_OSM)
+        self.cache = routecache()
+        for name, value in (('road_graph', road), ('road_index', spatialindex.from_graph(road)),
+                            ('route_cache', self.cache)):
+            patcher = patch(f'shortest_path.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_route(self):
+        start, end = (60.1711, 24.9441), (60.1699, 24.9399)
+        path, distance = find_route(start, end, 'dijkstra')
+        self.assertEqual(path, [start, (60.171, 24.944), (60.17, 24.944), (60.17, 24.942),
+                                (60.17, 24.94), end])
+        self.assertAlmostEqual(distance, sum(point_distance(u, v)
+                                             for u, v in zip(path, path[1:])))
+        with patch('shortest_path.search_road_route') as search:
+            self.assertEqual(find_route(start, end, 'dijkstra'), (path, distance))
+            # other points that snap to the same road nodes use the same search
+            nearby_start = (60.17112, 24.94408)
+            nearby_path, nearby_distance = find_route(nearby_start, end, 'dijkstra')
+            search.assert_not_called()
+        self.assertEqual(nearby_path, [nearby_start] + path[1:])
+        self.assertAlmostEqual(nearby_distance, distance - point_distance(start, path[1])
+                               + point_distance(nearby_start, path[1]))
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        # the algorithm is part of the key
+        self.assertEqual(find_shortest_path(start, end, 'bidirectional'), path)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_no_path_is_cached(self):
+        # a one way road from a to b
+        road = csrgraph.from_edges([('a', 'b', 100.0)], directed=True,
+                                   positions={'a': (60.0, 24.0), 'b': (60.001, 24.0)})
+        start, end = (60.001, 24.0), (60.0, 24.0)
+        patcher = patch.multiple('shortest_path', road_graph=road,
+                                 road_index=spatialindex.from_graph(road))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.assertEqual(find_shortest_path(start, end, 'dijkstra'), "No path found")
+        self.assertEqual(find_shortest_path(start, end, 'dijkstra'), "No path found")
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_reload_invalidates(self):
+        start, end = (60.1711, 24.9441), (60.1699, 24.9399)
+        find_route(start, end, 'dijkstra')
+        with patch('shortest_path.load_road_graph',
+                   return_value=(shortest_path.road_graph.reverse(), shortest_path.road_index)):
+            reload_road_graph()
+            self.assertEqual(len(self.cache), 0)
+            path, _ = find_route(end, start, 'dijkstra')
+        self.assertEqual(self.cache.stats()['misses'], 2)
+        self.assertEqual(path[0], end)
+
+    def test_stats_endpoint(self):
+        find_route((60.1711, 24.9441), (60.1699, 24.9399), 'dijkstra')
+        response = app.test_client().get('/api/stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['routes']['misses'], 1)
+        self.assertIn('maps', response.get_json())
+        self.assertIn('nodes', response.get_json()['road_graph'])
+
+if __name__ == '__main__':
+    unittest.main()
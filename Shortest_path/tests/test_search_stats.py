@@ -0,0 +1,97 @@
+import unittest
+import networkx
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra, binaryheap, daryheap
+from ida_star import ida_star, idastar
+from search_stats import searchstats, countedheap
+
+def line_graph():
+    # a - b - c - d, and a dead end b - x
+    graph = networkx.Graph()
+    graph.add_weighted_edges_from([('a', 'b', 1.0), ('b', 'c', 1.0), ('c', 'd', 1.0),
+                                   ('b', 'x', 5.0)])
+    return graph
+
+def grid(side):
+    graph = networkx.grid_2d_graph(side, side)
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = 1.0 + (u[0] * 7 + v[1] * 3) % 5 / 10
+    for node in graph.nodes:
+        graph.nodes[node]['pos'] = node
+    return graph
+
+class SearchStatsTestCase(unittest.TestCase):
+    def test_dijkstra_counts(self):
+        for graph in (line_graph(), csrgraph.from_networkx(line_graph())):
+            stats = searchstats()
+            path, _ = dijkstra(graph, 'a', 'c', stats=stats)
+            self.assertEqual(path, ['a', 'b', 'c'])
+            # a, b and c are settled, the edges of a and b are relaxed
+            self.assertEqual(stats.as_dict(), {
+                'searches': 1, 'settled': 3, 'relaxed': 4, 'pushes': 4, 'pops': 3,
+                'updates': 0, 'iterations': 0, 'reexpansions': 0, 'peak_queue': 2,
+                'peak_depth': 0})
+
+    def test_added_up_over_searches(self):
+        graph = csrgraph.from_networkx(grid(8))
+        stats = searchstats()
+        single = searchstats()
+        dijkstra(graph, (0, 0), (7, 7), stats=single)
+        for _ in range(3):
+            dijkstra(graph, (0, 0), (7, 7), stats=stats)
+        self.assertEqual(stats.searches, 3)
+        self.assertEqual(stats.settled, 3 * single.settled)
+        self.assertEqual(stats.peak_queue, single.peak_queue)
+        self.assertEqual(stats.per_search()['relaxed'], single.relaxed)
+        self.assertEqual(stats.pushes, stats.pops + 3 * (single.pushes - single.pops))
+        self.assertEqual(searchstats().merge(stats).merge(single).searches, 4)
+
+    def test_same_results_with_stats(self):
+        for graph in (grid(6), csrgraph.from_networkx(grid(6))):
+            for search in (dijkstra, bidirectional_dijkstra, ida_star):
+                stats = searchstats()
+                self.assertEqual(search(graph, (0, 1), (5, 4), stats=stats),
+                                 search(graph, (0, 1), (5, 4)))
+                self.assertEqual(stats.searches, 1)
+                self.assertGreater(stats.relaxed, stats.settled)
+
+    def test_bidirectional_settles_less(self):
+        graph = csrgraph.from_networkx(grid(12))
+        one_way = searchstats()
+        both_ways = searchstats()
+        dijkstra(graph, (0, 0), (11, 11), stats=one_way)
+        bidirectional_dijkstra(graph, (0, 0), (11, 11), stats=both_ways)
+        self.assertLess(both_ways.settled, one_way.settled)
+        self.assertEqual(both_ways.settled, both_ways.pops)
+
+    def test_ida_star(self):
+        graph = grid(6)
+        stats = searchstats()
+        engine = idastar(graph, stats=stats)
+        path = engine.run((0, 0), (5, 5))
+        self.assertEqual(len(path), 11)
+        self.assertEqual(stats.iterations, engine.iterations)
+        self.assertEqual(stats.settled, engine.expansions)
+        self.assertEqual(stats.reexpansions, engine.reexpansions)
+        self.assertGreaterEqual(stats.peak_depth, 10)
+        self.assertLess(stats.reexpansions, stats.settled)
+        self.assertEqual(stats.pushes, 0)
+        ida_star(graph, (0, 0), ('nowhere'), stats=stats)
+        self.assertEqual(stats.searches, 2)
+
+    def test_counted_heaps(self):
+        for heap in (binaryheap(), daryheap()):
+            stats = searchstats()
+            queue = countedheap(heap, stats)
+            for node, key in (('a', 3), ('b', 1), ('c', 2)):
+                queue.push(node, key)
+            queue.update('a', 0)
+            self.assertEqual(queue.pop(), (0, 'a'))
+            self.assertEqual(queue.pop(), (1, 'b'))
+            self.assertEqual(len(queue), 1)
+            self.assertEqual((stats.pushes, stats.pops, stats.updates, stats.peak_queue),
+                             (3, 2, 1, 3))
+            self.assertEqual(queue.popped, ['a', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
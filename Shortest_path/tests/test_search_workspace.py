@@ -0,0 +1,111 @@
+import random
+import threading
+import unittest
+from contraction import contract, ch_query
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra
+from ida_star import ida_star
+from search_workspace import searchworkspace, workspace
+from tests.helpers import random_graph, path_length
+
+class SearchWorkspaceTestCase(unittest.TestCase):
+    def test_generations(self):
+        space = searchworkspace(4)
+        first = space.begin()
+        space.stamps[2] = first
+        self.assertNotEqual(space.stamps[2], space.begin())
+        space.reserve(10)
+        self.assertEqual(space.capacity, 10)
+        self.assertEqual(len(space.position), 10)
+        space.reserve(5)
+        self.assertEqual(space.capacity, 10)
+
+    def test_reused_by_the_thread(self):
+        with workspace(10) as space:
+            generation = space.generation
+            # a search inside a search gets another workspace
+            with workspace(5) as inner:
+                self.assertIsNot(inner, space)
+        with workspace(20) as again:
+            self.assertIs(again, space)
+            self.assertEqual(again.generation, generation + 1)
+            self.assertGreaterEqual(again.capacity, 20)
+
+    def test_repeated_queries(self):
+        # every query on the reused lists gives the answer of the networkx search
+        graph = random_graph(1)
+        csr = csrgraph.from_networkx(graph)
+        rng = random.Random(2)
+        for _ in range(100):
+            start, end = rng.sample(range(200), 2)
+            expected = dijkstra(graph, start, end)
+            for search in (dijkstra, bidirectional_dijkstra):
+                found = search(csr, start, end)
+                self.assertEqual(bool(found), bool(expected))
+                if expected:
+                    self.assertAlmostEqual(path_length(graph, found[0]),
+                                           path_length(graph, expected[0]))
+
+    def test_other_graph_after_a_large_one(self):
+        large = csrgraph.from_networkx(random_graph(3, 500, 2000))
+        dijkstra(large, 0, 499)
+        # the stamps of the large search do not count in the small graph
+        small = csrgraph.from_edges([(0, 1, 1.0), (2, 3, 1.0)], directed=True)
+        self.assertEqual(dijkstra(small, 0, 3), [])
+        self.assertEqual(dijkstra(small, 0, 1)[0], [0, 1])
+
+    def test_positions_are_clean_after_a_failed_search(self):
+        def failing(node, end):
+            if node == 5:
+                raise RuntimeError("no estimate")
+            return 0.0
+        csr = csrgraph.from_networkx(random_graph(4))
+        with self.assertRaises(RuntimeError):
+            for end in range(200):
+                dijkstra(csr, 0, end, heuristic_function=failing)
+        with workspace(len(csr)) as space:
+            self.assertEqual(set(space.position), {-1})
+
+    def test_contraction_query(self):
+        graph = random_graph(5, 60, 180)
+        hierarchy = contract(csrgraph.from_networkx(graph))
+        rng = random.Random(6)
+        for _ in range(30):
+            start, end = rng.sample(range(60), 2)
+            expected = dijkstra(graph, start, end)
+            found = ch_query(hierarchy, start, end)
+            self.assertEqual(bool(found), bool(expected))
+            if expected:
+                self.assertAlmostEqual(path_length(graph, found[0]),
+                                       path_length(graph, expected[0]))
+
+    def test_concurrent_threads(self):
+        graph = random_graph(7)
+        csr = csrgraph.from_networkx(graph)
+        rng = random.Random(8)
+        pairs = [tuple(rng.sample(range(200), 2)) for _ in range(60)]
+        expected = [dijkstra(graph, start, end) for start, end in pairs]
+        failures = []
+
+        def run(offset):
+            for i in range(len(pairs)):
+                index = (i + offset) % len(pairs)
+                start, end = pairs[index]
+                for search in (dijkstra, bidirectional_dijkstra, ida_star):
+                    found = search(csr, start, end)
+                    path = found if search is ida_star else (found[0] if found else [])
+                    want = expected[index][0] if expected[index] else []
+                    if bool(path) != bool(want) or (
+                            want and abs(path_length(graph, path)
+                                         - path_length(graph, want)) > 1e-9):
+                        failures.append((search.__name__, start, end))
+
+        threads = [threading.Thread(target=run, args=(offset,)) for offset in range(0, 60, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+if __name__ == '__main__':
+    unittest.main()
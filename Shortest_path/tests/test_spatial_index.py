@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+import networkx
+import numpy
+from csr_graph import csrgraph
+from geo import point_distance
+from spatial_index import spatialindex, node_positions
+
+def brute_force(points, queries):
+    # equirectangular distances of (lat, lon) points, in degrees of latitude
+    scale = numpy.ones((len(queries), 1, 2))
+    scale[:, 0, 1] = numpy.cos(numpy.radians(queries[:, 0]))
+    return numpy.sqrt((((queries[:, None, :] - points[None, :, :]) * scale) ** 2).sum(axis=2))
+
+class SpatialIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.default_rng(7)
+        self.points = rng.uniform(60.0, 61.0, (3000, 2))
+        # many equal coordinates, like nodes on a straight road
+        self.points[:500, 0] = numpy.round(self.points[:500, 0], 1)
+        self.points[500:600] = self.points[600:700]
+        self.queries = rng.uniform(59.9, 61.1, (400, 2))
+        self.distances = brute_force(self.points, self.queries)
+
+    def test_nearest(self):
+        index = spatialindex(self.points, leaf_size=8)
+        for query, row in zip(self.queries[:100], self.distances):
+            label, distance = index.nearest(query)
+            self.assertAlmostEqual(distance, row.min())
+            self.assertAlmostEqual(row[label], row.min())
+
+    def test_k_nearest(self):
+        index = spatialindex(self.points, leaf_size=8)
+        for query, row in zip(self.queries[:100], self.distances):
+            found = index.k_nearest(query, 6)
+            self.assertEqual(len(found), 6)
+            numpy.testing.assert_allclose([distance for _, distance in found],
+                                          numpy.sort(row)[:6])
+            numpy.testing.assert_allclose([row[label] for label, _ in found],
+                                          numpy.sort(row)[:6])
+
+    def test_snap(self):
+        index = spatialindex(self.points)
+        # small batches, so several rounds of snapping are used
+        with patch('spatial_index.BATCH_SIZE', 64):
+            indexes, distances = index.snap(self.queries)
+        numpy.testing.assert_allclose(distances, self.distances.min(axis=1))
+        numpy.testing.assert_allclose(self.distances[numpy.arange(400), indexes],
+                                      self.distances.min(axis=1))
+
+    def test_small_and_empty(self):
+        index = spatialindex([(1.0, 200.0)], labels=['only'])
+        self.assertEqual(index.nearest((5.0, 203.0)), ('only', 5.0))
+        self.assertEqual(index.k_nearest((5.0, 203.0), 3), [('only', 5.0)])
+        empty = spatialindex([])
+        self.assertIsNone(empty.nearest((0.0, 0.0)))
+        indexes, distances = empty.snap([(0.0, 0.0)])
+        self.assertEqual(indexes.tolist(), [-1])
+        self.assertEqual(distances.tolist(), [numpy.inf])
+
+    def test_longitude_is_shorter(self):
+        # in Helsinki a degree of longitude is about half a degree of latitude: the node
+        # 0.0015 degrees east is nearer than the one 0.001 degrees north
+        query = (60.17, 24.94)
+        north, east = (60.171, 24.94), (60.17, 24.9415)
+        self.assertLess(point_distance(query, east), point_distance(query, north))
+        index = spatialindex([north, east], labels=['north', 'east'])
+        self.assertTrue(index.geographic)
+        self.assertEqual(index.nearest(query)[0], 'east')
+        indexes, _ = index.snap([query])
+        self.assertEqual(indexes.tolist(), [1])
+        # points that are not degrees keep the plane
+        planar = spatialindex([(100.0, 0.0), (0.0, 300.0)])
+        self.assertFalse(planar.geographic)
+        self.assertEqual(planar.nearest((40.0, 250.0)), (1, 64.03124237432849))
+
+    def test_from_graph(self):
+        graph = networkx.Graph()
+        graph.add_edge('a', 'b', weight=1)
+        graph.add_edge((3.0, 4.0), 'c', weight=1)
+        graph.nodes['a']['pos'] = (0.0, 0.0)
+        graph.nodes['b']['pos'] = (1.0, 1.0)
+        labels, points = node_positions(graph)
+        self.assertEqual(labels, ['a', 'b', (3.0, 4.0)])
+        self.assertEqual(points.shape, (3, 2))
+        index = spatialindex.from_graph(graph)
+        self.assertEqual(index.nearest((2.9, 3.9))[0], (3.0, 4.0))
+
+        positions = {'a': (0.0, 0.0), 'b': (1.0, 1.0), 'c': (2.0, 0.0)}
+        csr = csrgraph.from_edges([('a', 'b', 1.0), ('b', 'c', 1.0)], positions=positions)
+        index = spatialindex.from_graph(csr)
+        indexes, _ = index.snap([(1.9, 0.1), (0.1, 0.0)])
+        self.assertEqual([csr.labels[i] for i in indexes], ['c', 'a'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import random
+import unittest
+import numpy
+from csr_graph import csrgraph
+from dijkstra import dijkstra
+from geo import haversine
+from ida_star import idastar, heuristic
+from osm_loader import load_osm
+from path_geometry import path_weight
+from straight_line import straightline, BLOCK_SIZE
+
+SMALL_OSM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'small.osm')
+
+def road_grid(side=40, seed=1):
+    # a grid of roads in degrees, the edges in meters and up to 1.4 times the straight line
+    rng = numpy.random.default_rng(seed)
+    count = side * side
+    ids = numpy.arange(count).reshape(side, side)
+    lat = 60 + (numpy.arange(count) // side + rng.uniform(-0.3, 0.3, count)) * 0.0005
+    lon = 24 + (numpy.arange(count) % side + rng.uniform(-0.3, 0.3, count)) * 0.001
+    sources = numpy.concatenate((ids[:-1, :].ravel(), ids[:, :-1].ravel()))
+    targets = numpy.concatenate((ids[1:, :].ravel(), ids[:, 1:].ravel()))
+    weights = (haversine(lat[sources], lon[sources], lat[targets], lon[targets])
+               * rng.uniform(1, 1.4, len(sources)))
+    return csrgraph.from_arrays(list(range(count)), numpy.concatenate((sources, targets)),
+                                numpy.concatenate((targets, sources)),
+                                numpy.concatenate((weights, weights)), lat, lon, directed=False)
+
+class StraightLineTestCase(unittest.TestCase):
+    def test_lower_bound(self):
+        graph = road_grid()
+        line = straightline(graph)
+        self.assertEqual(line.metric, 'haversine')
+        self.assertGreaterEqual(line.scale, 0.99)
+        rng = random.Random(2)
+        for _ in range(20):
+            start, end = rng.sample(range(len(graph)), 2)
+            path = dijkstra(graph, start, end)[0]
+            self.assertLessEqual(line(start, end), path_weight(graph, path))
+        # consistent: no edge is shorter than the drop of the estimate along it
+        estimates = line.table(end)
+        for node in range(len(graph)):
+            for neighbor, weight in graph.edges_from(node):
+                self.assertLessEqual(estimates[node], weight + estimates[neighbor])
+
+    def test_lazy_table(self):
+        graph = road_grid()
+        line = straightline.of(graph)
+        self.assertIs(straightline.of(graph), line)
+        table = line.table(7)
+        lazy = line.lazy_table(7)
+        self.assertAlmostEqual(lazy[BLOCK_SIZE + 3], table[BLOCK_SIZE + 3])
+        # one block was computed, not the whole graph
+        self.assertEqual(set(lazy), set(range(BLOCK_SIZE, 2 * BLOCK_SIZE)))
+        self.assertEqual(lazy[len(graph) - 1], table[-1])
+        self.assertAlmostEqual(line.estimate(12, 7), table[12])
+        self.assertEqual(line.estimate(7, 7), 0.0)
+
+    def test_planar_and_no_coordinates(self):
+        nodes = [(0, 0), (300, 400), (0, 800)]
+        planar = csrgraph.from_edges([(nodes[0], nodes[1], 1000.0), (nodes[1], nodes[2], 500.0)],
+                                     positions={node: node for node in nodes})
+        line = straightline(planar)
+        self.assertEqual(line.metric, 'planar')
+        self.assertAlmostEqual(line.scale, 1.0)
+        self.assertAlmostEqual(line((0, 0), (0, 800)), 800.0, places=5)
+        plain = csrgraph.from_edges([('a', 'b', 1.0), ('b', 'c', 2.0)])
+        self.assertEqual(straightline(plain)('a', 'c'), 0.0)
+        self.assertEqual(straightline(plain).lazy_table('c')[2], 0.0)
+
+    def test_ida_star(self):
+        # the estimate in meters finds the same paths with far fewer expansions than the
+        # euclidean distance of the degrees
+        graph = road_grid()
+        def degrees(node, end):
+            return heuristic(graph.position(node), graph.position(end))
+        rng = random.Random(3)
+        for _ in range(5):
+            start, end = rng.sample(range(len(graph)), 2)
+            expected = path_weight(graph, dijkstra(graph, start, end)[0])
+            old = idastar(graph, heuristic_function=degrees)
+            old.run(start, end)
+            engine = idastar(graph)
+            path = engine.run(start, end)
+            self.assertAlmostEqual(engine.cost, expected)
+            self.assertAlmostEqual(path_weight(graph, path), expected)
+            self.assertAlmostEqual(old.cost, expected)
+            self.assertLess(engine.expansions, old.expansions)
+
+    def test_road_graph(self):
+        road = load_osm(SMALL_OSM)
+        line = straightline.of(road)
+        # osm edges are the haversine length of the segment
+        self.assertAlmostEqual(line.scale, 1.0)
+        labels = road.labels
+        for end in range(len(road)):
+            found = dijkstra(road, labels[0], labels[end])
+            if found:
+                path = idastar(road).run(labels[0], labels[end])
+                self.assertAlmostEqual(path_weight(road, [road.index[node] for node in path]),
+                                       path_weight(road, [road.index[node] for node in found[0]]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import threading
+import unittest
+from unittest.mock import patch
+import networkx
+from csr_graph import csrgraph
+from dijkstra import dijkstra, bidirectional_dijkstra
+from ida_star import ida_star
+from search_stats import searchstats
+from spatial_index import spatialindex
+from virtual_graph import virtualgraph, csrview, euclidean
+from shortest_path import find_shortest_path
+from tests.helpers import path_length
+
+def grid_graph(side):
+    # side x side road grid, node (x, y) is at position (x, y), edges of length 1
+    graph = networkx.grid_2d_graph(side, side)
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = 1.0
+    for node in graph.nodes:
+        graph.nodes[node]['pos'] = node
+    return graph
+
+class VirtualGraphTestCase(unittest.TestCase):
+    def test_endpoints_are_joined_to_nearest_nodes(self):
+        road = grid_graph(5)
+        view = virtualgraph(road, {'start': (0.1, 0.2), 'end': (3.9, 4.3)})
+        self.assertEqual(list(view.adj['start']), [(0, 0)])
+        self.assertEqual(list(view.adj['end']), [(4, 4)])
+        self.assertAlmostEqual(view['start'][(0, 0)]['weight'], euclidean((0.1, 0.2), (0, 0)))
+        self.assertIn('start', view.adj[(0, 0)])
+        self.assertEqual(view.nodes['end'], {'pos': (3.9, 4.3)})
+        self.assertEqual(view.position((2, 3)), (2, 3))
+        self.assertEqual(len(view), 27)
+        self.assertEqual(len(list(view.nodes)), 27)
+
+    def test_road_graph_is_not_changed(self):
+        road = grid_graph(5)
+        edges = sorted(road.edges(data=True))
+        view = virtualgraph(road, {'start': (0.1, 0.2), 'end': (3.9, 4.3)}, connections=3)
+        dijkstra(view, 'start', 'end')
+        ida_star(view, 'start', 'end')
+        self.assertNotIn('start', road)
+        self.assertNotIn('start', road.adj[(0, 0)])
+        self.assertEqual(sorted(road.edges(data=True)), edges)
+
+    def test_algorithms_on_networkx_and_csr_roads(self):
+        road = grid_graph(6)
+        endpoints = {'start': (0.2, 0.1), 'end': (5.1, 3.8)}
+        for graph in (road, csrgraph.from_networkx(road)):
+            view = virtualgraph(graph, endpoints)
+            expected = euclidean((0.2, 0.1), (0, 0)) + 9 + euclidean((5.1, 3.8), (5, 4))
+            path, _ = dijkstra(view, 'start', 'end')
+            self.assertAlmostEqual(path_length(view, path), expected)
+            path, _ = bidirectional_dijkstra(view, 'start', 'end')
+            self.assertAlmostEqual(path_length(view, path), expected)
+            path = ida_star(view, 'start', 'end')
+            self.assertAlmostEqual(path_length(view, path), expected)
+
+    def test_directed_road(self):
+        road = networkx.DiGraph()
+        road.add_edge('a', 'b', weight=1.0)
+        road.add_edge('b', 'c', weight=1.0)
+        positions = {'a': (0, 0), 'b': (1, 0), 'c': (2, 0)}
+        view = virtualgraph(csrgraph.from_edges(road.edges(data='weight'), True, positions),
+                            {'start': (0, 0.5), 'end': (2, 0.5)})
+        self.assertTrue(view.is_directed())
+        self.assertIn('start', view.pred['a'])
+        path, _ = bidirectional_dijkstra(view, 'start', 'end')
+        self.assertEqual(path, ['start', 'a', 'b', 'c', 'end'])
+
+    def test_label_clash(self):
+        road = grid_graph(2)
+        with self.assertRaises(ValueError):
+            virtualgraph(road, {(0, 0): (0.5, 0.5)})
+
+    def test_connections(self):
+        road = grid_graph(4)
+        view = virtualgraph(road, {'start': (2.2, 1.1)}, connections=2,
+                            index=spatialindex.from_graph(road))
+        self.assertEqual(list(view.adj['start']), [(2, 1), (3, 1)])
+
+def view_length(view, path):
+    ids = [view.index[node] for node in path]
+    return sum(min(weight for target, weight in view.edges_from(u) if target == v)
+               for u, v in zip(ids, ids[1:]))
+
+class CsrViewTestCase(unittest.TestCase):
+    def test_virtual_ids(self):
+        road = csrgraph.from_networkx(grid_graph(5))
+        view = csrview(road, {'start': (0.1, 0.2), 'end': (3.9, 4.3)})
+        # the road arrays are shared, not copied
+        self.assertIs(view.targets, road.targets)
+        self.assertEqual((view.index['start'], view.index['end']), (25, 26))
+        self.assertEqual(view.labels[26], 'end')
+        self.assertEqual(len(view), 27)
+        self.assertEqual(list(view.neighbors('start')), [(0, 0)])
+        self.assertIn('end', view.neighbors((4, 4)))
+        self.assertNotIn('end', road.neighbors((4, 4)))
+        self.assertEqual(view.position(26), (3.9, 4.3))
+        self.assertEqual(view.degree(view.index[(4, 4)]), 3)
+        self.assertAlmostEqual(dict(view.edges_from(25))[road.index[(0, 0)]],
+                               euclidean((0.1, 0.2), (0, 0)))
+        with self.assertRaises(ValueError):
+            csrview(road, {(0, 0): (0.5, 0.5)})
+
+    def test_same_routes_as_virtualgraph(self):
+        csr = csrgraph.from_networkx(grid_graph(6))
+        endpoints = {'start': (0.2, 0.1), 'end': (5.1, 3.8)}
+        dict_view = virtualgraph(csr, endpoints, connections=2)
+        expected = path_length(dict_view, dijkstra(dict_view, 'start', 'end')[0])
+        view = csrview(csr, endpoints, connections=2)
+        stats = searchstats()
+        for search in (dijkstra, bidirectional_dijkstra):
+            path, _ = search(view, 'start', 'end', stats=stats)
+            self.assertEqual((path[0], path[-1]), ('start', 'end'))
+            self.assertAlmostEqual(view_length(view, path), expected)
+        self.assertAlmostEqual(view_length(view, ida_star(view, 'start', 'end')), expected)
+        self.assertGreater(stats.relaxed, 0)
+
+    def test_directed_road(self):
+        road = networkx.DiGraph()
+        road.add_edge('a', 'b', weight=1.0)
+        road.add_edge('b', 'c', weight=1.0)
+        positions = {'a': (0, 0), 'b': (1, 0), 'c': (2, 0)}
+        view = csrview(csrgraph.from_edges(road.edges(data='weight'), True, positions),
+                       {'start': (0, 0.5), 'end': (2, 0.5)})
+        self.assertIn('start', view.reverse().neighbors('a'))
+        self.assertEqual(list(view.reverse().neighbors('b')), ['a'])
+        for search in (dijkstra, bidirectional_dijkstra):
+            path, _ = search(view, 'start', 'end')
+            self.assertEqual(path, ['start', 'a', 'b', 'c', 'end'])
+        self.assertEqual(ida_star(view, 'end', 'start'), [])
+
+class SharedRoadGraphTestCase(unittest.TestCase):
+    def test_concurrent_queries(self):
+        road = csrgraph.from_networkx(grid_graph(8))
+        arrays = (road.offsets.tobytes(), road.targets.tobytes(), road.weights.tobytes())
+        errors = []
+
+        def query(x):
+            start, end = (0.1, x + 0.1), (7.1, 7 - x - 0.1)
+            for algorithm in ('dijkstra', 'bidirectional', 'ida_star'):
+                path = find_shortest_path(start, end, algorithm)
+                if path[0] != start or path[-1] != end or path[1] != (0, x):
+                    errors.append((x, algorithm, path))
+
+        with patch('shortest_path.road_graph', road), \
+                patch('shortest_path.road_index', spatialindex.from_graph(road)):
+            threads = [threading.Thread(target=query, args=(x,)) for x in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual((road.offsets.tobytes(), road.targets.tobytes(),
+                          road.weights.tobytes()), arrays)
+
+    def test_missing_coordinates(self):
+        self.assertIsNone(find_shortest_path(None, (60.3, 24.96)))
+
+if __name__ == '__main__':
+    unittest.main()
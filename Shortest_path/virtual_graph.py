@@ -0,0 +1,298 @@
+"""
+This module contains the per-query view of the road graph.
+The road graph is loaded once and never changed. A query adds its start and end points as
+virtual nodes, joined to the nearest road nodes by virtual edges, and these live only in the
+virtualgraph object of that query. So queries can share one road graph without locks or copies.
+On a csrgraph, csrview does the same on integer ids: the virtual nodes get the ids after the
+road nodes and their edges are in small arrays of their own, so the searches keep running on
+the arrays of the road graph.
+"""
+from array import array
+from csr_graph import csrgraph
+from spatial_index import spatialindex
+
+
+def euclidean(point1, point2):
+    """
+    straight line distance between two (x, y) points, same measure as the IDA* heuristic
+    """
+    return ((point2[0] - point1[0]) ** 2 + (point2[1] - point1[1]) ** 2) ** 0.5
+
+
+class virtualgraph:
+    """
+    read-only view of a road graph (networkx graph or csrgraph) with extra virtual nodes.
+    endpoints maps a virtual node label to its (lat, lon), each one is joined both ways to its
+    connections nearest road nodes, the edge weight is distance(virtual position, road position).
+    index is a spatial_index.spatialindex of the road graph, built here when not given
+    (build it once and pass it in when the same road graph is used by many queries).
+    it has the parts of the networkx graph interface the search algorithms use
+    (in, nodes, adj, pred, neighbors, graph[node][neighbor], is_directed).
+    """
+    def __init__(self, graph, endpoints, distance=euclidean, connections=1, index=None):
+        if index is None:
+            index = spatialindex.from_graph(graph)
+        self.graph = graph
+        self.positions = {}
+        # node -> {neighbor: edge data} of the virtual edges, for virtual and road nodes
+        self.extra = {}
+        for label, position in endpoints.items():
+            if label in graph:
+                raise ValueError(f"virtual node {label!r} is already a node of the road graph")
+            self.positions[label] = position
+            self.extra.setdefault(label, {})
+            for road_node, _ in index.k_nearest(position, connections):
+                data = {'weight': distance(position, _road_position(graph, road_node))}
+                self.extra[label][road_node] = data
+                self.extra.setdefault(road_node, {})[label] = data
+        self.nodes = _nodeview(self)
+        self.adj = _adjacencyview(self, False)
+        self.pred = _adjacencyview(self, True) if self.is_directed() else self.adj
+
+    def __contains__(self, node):
+        return node in self.positions or node in self.graph
+
+    def __len__(self):
+        return len(self.graph) + len(self.positions)
+
+    def __getitem__(self, node):
+        return self.adj[node]
+
+    def is_directed(self):
+        """
+        same as the road graph
+        """
+        if isinstance(self.graph, csrgraph):
+            return self.graph.directed
+        return self.graph.is_directed()
+
+    def neighbors(self, node):
+        """
+        yields the neighbors of a node, virtual edges included
+        """
+        return iter(self.adj[node])
+
+    def position(self, node):
+        """
+        (lat, lon) of a virtual or road node, None if unknown
+        """
+        if node in self.positions:
+            return self.positions[node]
+        return _road_position(self.graph, node)
+
+
+class csrview(csrgraph):
+    """
+    per-query csrgraph of a road csrgraph with extra virtual nodes, endpoints and the edges
+    are the same as for virtualgraph. the offsets, targets and weights arrays of the road graph
+    are shared, not copied. the virtual nodes get the ids len(graph), len(graph) + 1, ...
+    extra[node id] is the (first, last) slice of extra_targets and extra_weights that holds the
+    edges of a node instead of the road arrays: the virtual nodes and the road nodes joined to
+    them (their road edges and the virtual edges). joins is the list of
+    (virtual id, road id, weight), every join is an edge both ways.
+    lat and lon are None, position() knows the road and the virtual nodes.
+    """
+    def __init__(self, graph, endpoints, distance=euclidean, connections=1, index=None,
+                 joins=None):
+        # joins given (the reverse view) are used as they are, the end points are not snapped
+        road_count = len(graph)
+        positions = {}
+        for label, position in endpoints.items():
+            if label in graph:
+                raise ValueError(f"virtual node {label!r} is already a node of the road graph")
+            positions[label] = position
+        if joins is None:
+            if index is None:
+                index = spatialindex.from_graph(graph)
+            joins = []
+            for node_id, position in enumerate(positions.values(), road_count):
+                for road_node, _ in index.k_nearest(position, connections):
+                    weight = distance(position, _road_position(graph, road_node))
+                    joins.append((node_id, graph.index[road_node], weight))
+        super().__init__(_viewlabels(graph.labels, list(positions)), graph.offsets,
+                         graph.targets, graph.weights, None, None, graph.directed)
+        self._index = _viewindex(graph.index, {label: node_id for node_id, label
+                                               in enumerate(positions, road_count)})
+        self.graph = graph
+        self.positions = positions
+        self.joins = joins
+        self.extra, self.extra_targets, self.extra_weights = _rows(graph, len(positions), joins)
+
+    def neighbors(self, node):
+        """
+        yields the neighbor labels of a node label, virtual edges included
+        """
+        labels = self.labels
+        for target, _ in self.edges_from(self.index[node]):
+            yield labels[target]
+
+    def edges_from(self, node_id):
+        """
+        yields (target id, weight) for each edge leaving the node id, virtual edges included
+        """
+        row = self.extra.get(node_id)
+        if row is None:
+            yield from self.graph.edges_from(node_id)
+            return
+        targets = self.extra_targets
+        weights = self.extra_weights
+        for i in range(*row):
+            yield targets[i], weights[i]
+
+    def degree(self, node_id):
+        """
+        number of edges leaving the node id, virtual edges included
+        """
+        row = self.extra.get(node_id)
+        if row is None:
+            return self.graph.degree(node_id)
+        return row[1] - row[0]
+
+    def reverse(self):
+        """
+        the same view on the reverse of the road graph, the virtual edges go both ways
+        """
+        if not self.directed:
+            return self
+        if self._reverse is None:
+            self._reverse = csrview(self.graph.reverse(), self.positions, joins=self.joins)
+        return self._reverse
+
+    def position(self, node_id):
+        """
+        (lat, lon) of a road or virtual node id, None if unknown
+        """
+        if node_id >= len(self.graph):
+            return self.positions[self.labels[node_id]]
+        return _road_position(self.graph, self.labels[node_id])
+
+
+def _rows(graph, virtual_count, joins):
+    # (extra, extra_targets, extra_weights) of a csrview: the rows of the virtual nodes and of
+    # the road nodes joined to them
+    road_count = len(graph)
+    rows = {road_count + i: [] for i in range(virtual_count)}
+    for virtual, road, weight in joins:
+        rows[virtual].append((road, weight))
+        if road not in rows:
+            rows[road] = list(graph.edges_from(road))
+        rows[road].append((virtual, weight))
+    extra = {}
+    extra_targets = array('q')
+    extra_weights = array('d')
+    for node_id, row in rows.items():
+        first = len(extra_targets)
+        extra[node_id] = (first, first + len(row))
+        for target, weight in row:
+            extra_targets.append(target)
+            extra_weights.append(weight)
+    return extra, extra_targets, extra_weights
+
+
+class _viewlabels:
+    # id -> label of a csrview, the road labels and then the virtual ones
+    __slots__ = ('road', 'virtual')
+
+    def __init__(self, road, virtual):
+        self.road = road
+        self.virtual = virtual
+
+    def __len__(self):
+        return len(self.road) + len(self.virtual)
+
+    def __getitem__(self, node_id):
+        road_count = len(self.road)
+        if node_id >= road_count:
+            return self.virtual[node_id - road_count]
+        return self.road[node_id]
+
+    def __iter__(self):
+        yield from self.road
+        yield from self.virtual
+
+
+class _viewindex:
+    # label -> id of a csrview, the virtual labels and then the road index
+    __slots__ = ('road', 'virtual')
+
+    def __init__(self, road, virtual):
+        self.road = road
+        self.virtual = virtual
+
+    def __contains__(self, label):
+        return label in self.virtual or label in self.road
+
+    def __getitem__(self, label):
+        node_id = self.virtual.get(label)
+        return self.road[label] if node_id is None else node_id
+
+    def get(self, label, default=None):
+        node_id = self.virtual.get(label)
+        return self.road.get(label, default) if node_id is None else node_id
+
+
+class _nodeview:
+    # graph.nodes: iterate the labels, nodes[label] is the node data with 'pos'
+    def __init__(self, view):
+        self._view = view
+
+    def __iter__(self):
+        graph = self._view.graph
+        yield from graph.labels if isinstance(graph, csrgraph) else graph.nodes
+        yield from self._view.positions
+
+    def __len__(self):
+        return len(self._view)
+
+    def __contains__(self, node):
+        return node in self._view
+
+    def __getitem__(self, node):
+        view = self._view
+        if node in view.positions:
+            return {'pos': view.positions[node]}
+        if isinstance(view.graph, csrgraph):
+            position = view.graph.position(view.graph.index[node])
+            return {} if position is None else {'pos': position}
+        return view.graph.nodes[node]
+
+
+class _adjacencyview:
+    # graph.adj (or graph.pred): adj[node] maps neighbor -> edge data
+    def __init__(self, view, reverse):
+        self._view = view
+        self._reverse = reverse
+
+    def __getitem__(self, node):
+        view = self._view
+        if node in view.positions:
+            return view.extra[node]
+        neighbors = _road_neighbors(view.graph, node, self._reverse)
+        extra = view.extra.get(node)
+        if extra:
+            # only the few road nodes next to a virtual node get a merged copy
+            neighbors = dict(neighbors)
+            neighbors.update(extra)
+        return neighbors
+
+
+def _road_neighbors(graph, node, reverse):
+    # neighbor -> edge data of a road node, without copying the networkx adjacency
+    if isinstance(graph, csrgraph):
+        if reverse:
+            graph = graph.reverse()
+        labels = graph.labels
+        return {labels[target]: {'weight': weight}
+                for target, weight in graph.edges_from(graph.index[node])}
+    return graph.pred[node] if reverse else graph.adj[node]
+
+
+def _road_position(graph, node):
+    # position of a road node: csrgraph coordinates, the 'pos' attribute or a (lat, lon) label
+    if isinstance(graph, csrgraph):
+        position = graph.position(graph.index[node]) if node in graph else None
+    else:
+        position = graph.nodes[node].get('pos') if node in graph else None
+    if position is None and isinstance(node, tuple) and len(node) == 2:
+        return node
+    return position